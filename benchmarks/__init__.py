@@ -0,0 +1,6 @@
+"""A benchmark suite for the GRIN interpreter, which times each phase of
+running a program (lexing, parsing, loading, compiling and running) on a set
+of reproducible workloads.
+
+Run from the repository root:  python -m benchmarks --help
+"""
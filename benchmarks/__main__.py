@@ -0,0 +1,68 @@
+"""Runs the benchmark suite.
+
+    python -m benchmarks                           run it, comparing with baseline.json
+    python -m benchmarks --save-baseline           run it and make it the baseline
+    python -m benchmarks --scale 0.1 --iterations 2   a quicker run
+"""
+import argparse
+import json
+import os
+import sys
+
+from benchmarks.suite import compare, run_suite
+from benchmarks.workloads import WORKLOADS
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+def main(argv = None) -> int:
+    parser = argparse.ArgumentParser(prog = 'python -m benchmarks', description = __doc__.splitlines()[0])
+    parser.add_argument('--scale', type = float, default = 1.0, help = 'how big to make the workloads')
+    parser.add_argument('--iterations', type = int, default = 5, help = 'timed runs of each phase')
+    parser.add_argument('--warmup', type = int, default = 1, help = 'untimed runs of each phase first')
+    parser.add_argument('--workload', action = 'append', choices = list(WORKLOADS),
+                        help = 'only run this workload (can be repeated)')
+    parser.add_argument('--phase', action = 'append', help = 'only time this phase (can be repeated)')
+    parser.add_argument('--baseline', default = BASELINE, help = 'the baseline JSON to compare with')
+    parser.add_argument('--threshold', type = float, default = 0.10,
+                        help = 'how much slower than the baseline counts as a regression (default: 0.10)')
+    parser.add_argument('--minimum', type = float, default = 0.001,
+                        help = 'leave out phases that took less than this many seconds in the baseline')
+    parser.add_argument('--save-baseline', action = 'store_true', help = 'save the results as the baseline')
+    parser.add_argument('--output', help = 'also write the results to this JSON file')
+    arguments = parser.parse_args(argv)
+
+    results = run_suite(arguments.scale, arguments.iterations, arguments.warmup, arguments.workload, arguments.phase)
+
+    if arguments.output:
+        with open(arguments.output, 'w', encoding = 'utf-8') as file:
+            json.dump(results, file, indent = 2)
+
+    if arguments.save_baseline:
+        with open(arguments.baseline, 'w', encoding = 'utf-8') as file:
+            json.dump(results, file, indent = 2)
+        print(f'Saved the baseline to {arguments.baseline}')
+        return 0
+
+    if not os.path.exists(arguments.baseline):
+        print(f'No baseline at {arguments.baseline} to compare with')
+        return 0
+
+    with open(arguments.baseline, encoding = 'utf-8') as file:
+        baseline = json.load(file)
+    if baseline.get('scale') != results['scale']:
+        print(f"The baseline was run at scale {baseline.get('scale')}, so it can't be compared with")
+        return 0
+
+    regressions = compare(results, baseline, arguments.threshold, arguments.minimum)
+    print()
+    if not regressions:
+        print(f'No regressions of more than {arguments.threshold:.0%} against the baseline')
+        return 0
+
+    for regression in regressions:
+        print(f'REGRESSION {regression.workload} / {regression.phase}: {regression.baseline:.4f}s -> '
+              f'{regression.current:.4f}s ({regression.slowdown():+.0%})')
+    return 1
+
+if __name__ == '__main__':
+    sys.exit(main())
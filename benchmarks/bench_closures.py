@@ -0,0 +1,82 @@
+"""Compares running GRIN statements through execute() against running the
+closures produced by Statement.compile(), on loop-heavy programs.
+
+Run from the repository root:  python benchmarks/bench_closures.py
+"""
+import contextlib
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from grin.interpreter import GrinInterpreter, create_statement
+from grin.parsing import parse
+from grin.statements import LabeledStatement
+from grin.token import GrinTokenKind
+
+PROGRAMS = {
+    "counting loop": [
+        'LET I 0',
+        'ADD I 1',
+        'GOTO 2 IF I < 200000',
+        'END',
+    ],
+    "arithmetic loop": [
+        'LET I 0',
+        'LET T 0',
+        'ADD I 1',
+        'LET X I',
+        'MULT X 3',
+        'SUB X 1',
+        'ADD T X',
+        'GOTO 3 IF I < 100000',
+        'END',
+    ],
+}
+
+def load(lines):
+    interpreter = GrinInterpreter()
+    for tokens in parse(lines):
+        label = None
+        if len(tokens) >= 2 and tokens[1].kind() == GrinTokenKind.COLON:
+            label = tokens[0].text()
+            tokens = tokens[2:]
+        interpreter.add_statement(LabeledStatement(label, create_statement(tokens)))
+    return interpreter
+
+def run_with_execute(interpreter):
+    """The run loop as it was before statements were compiled, with the
+    variables in a plain dict"""
+    variables = {}
+    interpreter.current_line = 0
+    while interpreter.current_line < len(interpreter.statements):
+        try:
+            result = interpreter.statements[interpreter.current_line].statement.execute(variables)
+            if result is None:
+                interpreter.current_line += 1
+            else:
+                interpreter.handle_control_flow(result)
+        except Exception as e:
+            print(f"Error at line {interpreter.current_line + 1}: {str(e)}")
+            break
+
+def best_of(runs, lines, runner):
+    best = float("inf")
+    for _ in range(runs):
+        interpreter = load(lines)
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            runner(interpreter)
+            best = min(best, time.perf_counter() - start)
+    return best
+
+def main():
+    for name, lines in PROGRAMS.items():
+        before = best_of(3, lines, run_with_execute)
+        after = best_of(3, lines, GrinInterpreter.run)
+        print(f"{name:16} execute(): {before:.3f}s  compiled: {after:.3f}s  speedup: {before / after:.2f}x")
+
+if __name__ == '__main__':
+    main()
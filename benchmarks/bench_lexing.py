@@ -0,0 +1,73 @@
+"""Measures how much faster grin.scanner lexes than grin.lexing, on the lines
+of large generated programs, and how much faster that makes parse().  Then
+measures how long grin.cache.load_program() takes to load a program from a
+TokenTable, and the most memory it uses meanwhile, against making a GrinToken
+of every token and parsing the program a line at a time.
+
+Run from the repository root:  python benchmarks/bench_lexing.py [LINES]
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import time
+import tracemalloc
+
+from grin import lexing, parsing, scanner
+from grin.cache import _labeled, load_program
+from grin.generator import generate
+
+def lex_all(to_tokens, lines):
+    for line_number, line in enumerate(lines, start = 1):
+        for _ in to_tokens(line, line_number):
+            pass
+
+def parse_all(to_tokens, lines):
+    parsing.to_tokens = to_tokens
+    try:
+        for _ in parsing.parse(lines):
+            pass
+    finally:
+        parsing.to_tokens = scanner.to_tokens
+
+def load_parsed(lines):
+    return [_labeled(tokens) for tokens in parsing.parse(lines)]
+
+def measure_load(load, lines):
+    """The time a load takes, and the most memory it had allocated at once"""
+    tracemalloc.start()
+    start = time.process_time()
+    load(lines)
+    elapsed = time.process_time() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak
+
+def best_of_interleaved(runs, lines, measure, lexers):
+    """The best time with each lexer, taking turns so that a noisy machine
+    slows them all down alike"""
+    best = [float("inf")] * len(lexers)
+    for _ in range(runs):
+        for position, to_tokens in enumerate(lexers):
+            start = time.process_time()
+            measure(to_tokens, lines)
+            best[position] = min(best[position], time.process_time() - start)
+    return best
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    lines = generate(size, 0).lines
+    print(f"{len(lines)} lines, {sum(map(len, lines))} characters")
+    for name, measure in (("lexing", lex_all), ("parsing", parse_all)):
+        old, new = best_of_interleaved(7, lines, measure, [lexing.to_tokens, scanner.to_tokens])
+        print(f"{name:8} grin.lexing: {old:.3f}s  grin.scanner: {new:.3f}s  speedup: {old / new:.2f}x")
+
+    old, new = best_of_interleaved(3, lines + ['.'], lambda load, lines: load(lines), [load_parsed, load_program])
+    print(f"loading  a line at a time: {old:.3f}s  from a TokenTable: {new:.3f}s  speedup: {old / new:.2f}x")
+    for name, load in (("a line at a time", load_parsed), ("from a TokenTable", load_program)):
+        elapsed, peak = measure_load(load, lines + ['.'])
+        print(f"traced   {name}: {peak / 2 ** 20:.1f} MiB at most, {peak / len(lines):.0f} bytes a line")
+
+if __name__ == '__main__':
+    main()
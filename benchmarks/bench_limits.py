@@ -0,0 +1,88 @@
+"""Measures what running with a step limit, a time limit and a GOSUB depth
+limit costs compared with running without any, on loop-heavy programs.  Both
+go through GrinInterpreter.step(), so both are also compared with the tight
+loop run() used before step() existed, which counted nothing.
+
+Run from the repository root:  python benchmarks/bench_limits.py
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import time
+
+from bench_closures import load
+
+PROGRAMS = {
+    "counting loop": [
+        'LET I 0',
+        'ADD I 1',
+        'GOTO 2 IF I < 500000',
+        'END',
+    ],
+    "arithmetic loop": [
+        'LET I 0',
+        'LET T 0',
+        'ADD I 1',
+        'LET X I',
+        'MULT X 3',
+        'SUB X 1',
+        'ADD T X',
+        'GOTO 3 IF I < 200000',
+        'END',
+    ],
+    "subroutine loop": [
+        'LET I 0',
+        'GOSUB STEP',
+        'GOTO 2 IF I < 200000',
+        'END',
+        'STEP: ADD I 1',
+        'RETURN',
+    ],
+}
+
+def run_tight(interpreter):
+    """run() as it was before step(), without limits"""
+    program = interpreter.compile(superinstructions = True)
+    end = len(program)
+    pc = 0
+    try:
+        while pc < end:
+            target = program[pc]()
+            if target is None:
+                pc += 1
+            else:
+                pc = target
+    except Exception as e:
+        pc = interpreter.report_error(pc, e)
+    interpreter.current_line = pc
+    interpreter.output.flush()
+
+def run_limited(interpreter):
+    interpreter.run(max_steps = 10 ** 9, time_limit = 3600.0, max_depth = 1000)
+
+def run_unlimited(interpreter):
+    interpreter.run()
+
+def best_of_interleaved(runs, lines, runners):
+    """The best time of each runner, taking turns so that a noisy machine
+    slows them all down alike"""
+    best = [float("inf")] * len(runners)
+    for _ in range(runs):
+        for position, runner in enumerate(runners):
+            interpreter = load(lines)
+            start = time.process_time()
+            runner(interpreter)
+            best[position] = min(best[position], time.process_time() - start)
+    return best
+
+def main():
+    for name, lines in PROGRAMS.items():
+        tight, unlimited, limited = best_of_interleaved(15, lines, [run_tight, run_unlimited, run_limited])
+        print(f"{name:16} tight loop: {tight:.3f}s  "
+              f"unlimited: {unlimited:.3f}s ({(unlimited / tight - 1) * 100:+.1f}%)  "
+              f"limited: {limited:.3f}s ({(limited / tight - 1) * 100:+.1f}%)")
+
+if __name__ == '__main__':
+    main()
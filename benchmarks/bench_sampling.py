@@ -0,0 +1,97 @@
+"""Measures what sampling a running program with SamplingProfiler costs,
+at a few sampling intervals.  The sampler runs on a thread of its own, so
+the time taken is measured on the wall clock, over runs of a second or more,
+along with the CPU time the sampling thread itself used, which is steadier.
+
+Run from the repository root:  python benchmarks/bench_sampling.py
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import time
+
+from bench_closures import load
+from grin.sampling import SamplingProfiler
+
+INTERVALS = [0.01, 0.005, 0.001]
+
+# The loops of bench_limits.py, run long enough that starting and stopping
+# the sampler doesn't count
+PROGRAMS = {
+    "counting loop": [
+        'LET I 0',
+        'ADD I 1',
+        'GOTO 2 IF I < 8000000',
+        'END',
+    ],
+    "arithmetic loop": [
+        'LET I 0',
+        'LET T 0',
+        'ADD I 1',
+        'LET X I',
+        'MULT X 3',
+        'SUB X 1',
+        'ADD T X',
+        'GOTO 3 IF I < 1500000',
+        'END',
+    ],
+    "subroutine loop": [
+        'LET I 0',
+        'GOSUB STEP',
+        'GOTO 2 IF I < 2500000',
+        'END',
+        'STEP: ADD I 1',
+        'RETURN',
+    ],
+}
+
+class TimedProfiler(SamplingProfiler):
+    """A SamplingProfiler that adds up the CPU time its thread uses"""
+    used = 0.0
+
+    def _sample_until_stopped(self):
+        start = time.thread_time()
+        super()._sample_until_stopped()
+        TimedProfiler.used += time.thread_time() - start
+
+def run_unsampled(interpreter):
+    interpreter.run()
+
+def sampled_at(interval):
+    def run_sampled(interpreter):
+        with TimedProfiler(interpreter, interval):
+            interpreter.run()
+    return run_sampled
+
+def best_of_interleaved(runs, lines, runners):
+    """The best wall-clock time of each runner, taking turns so that a noisy
+    machine slows them all down alike, and the share of all of each runner's
+    time that the sampling thread used"""
+    best = [float("inf")] * len(runners)
+    total = [0.0] * len(runners)
+    used = [0.0] * len(runners)
+    for _ in range(runs):
+        for position, runner in enumerate(runners):
+            interpreter = load(lines)
+            TimedProfiler.used = 0.0
+            start = time.perf_counter()
+            runner(interpreter)
+            elapsed = time.perf_counter() - start
+            best[position] = min(best[position], elapsed)
+            total[position] += elapsed
+            used[position] += TimedProfiler.used
+    return best, [used / total for used, total in zip(used, total)]
+
+def main():
+    for name, lines in PROGRAMS.items():
+        (unsampled, *sampled), (_, *shares) = best_of_interleaved(
+            9, lines, [run_unsampled] + [sampled_at(interval) for interval in INTERVALS])
+        results = '  '.join(
+            f"every {interval * 1000:g}ms: {(time / unsampled - 1) * 100:+.1f}% (sampler {share * 100:.2f}%)"
+            for interval, time, share in zip(INTERVALS, sampled, shares))
+        print(f"{name:16} unsampled: {unsampled:.3f}s  {results}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""Measures what fusing a LET and the arithmetic after it into one
+LET_ARITHMETIC closure saves, against running the two closures one at a time
+and against the generic closure that runs any run of statements in turn.
+Every other superinstruction is fused alike in all three.
+
+Run from the repository root:  python benchmarks/bench_superinstructions.py
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import time
+
+from bench_closures import load
+from grin.cfg import LET_ARITHMETIC, build_cfg, compile_superinstruction, find_superinstructions, _compile_sequence
+
+PROGRAMS = {
+    "arithmetic loop": [
+        'LET I 0',
+        'LET T 0',
+        'ADD I 1',
+        'LET X I',
+        'MULT X 3',
+        'SUB X 1',
+        'ADD T X',
+        'GOTO 3 IF I < 300000',
+        'END',
+    ],
+    "copy and add loop": [
+        'LET I 0',
+        'LET T 0',
+        'L: LET A I',
+        'ADD A 7',
+        'LET B A',
+        'SUB B 2',
+        'LET C B',
+        'MULT C 2',
+        'ADD T C',
+        'ADD I 1',
+        'GOTO "L" IF I < 200000',
+        'END',
+    ],
+    "variable operands": [
+        'LET I 0',
+        'LET T 0',
+        'L: LET X 5',
+        'ADD X I',
+        'LET Y X',
+        'MULT Y I',
+        'ADD T Y',
+        'ADD I 1',
+        'GOTO "L" IF I < 200000',
+        'END',
+    ],
+}
+
+def compile_with(interpreter, let_arithmetic):
+    """The program compiled with every superinstruction fused, except that
+    each LET_ARITHMETIC is compiled by let_arithmetic, or left unfused"""
+    context = interpreter.context()
+    program = interpreter.compile(context = context)
+    statements = [labeled.statement for labeled in interpreter.statements]
+    for superinstruction in find_superinstructions(build_cfg(interpreter.statements, interpreter.label_map)):
+        start, length = superinstruction.start, superinstruction.length
+        if superinstruction.kind != LET_ARITHMETIC:
+            program[start] = compile_superinstruction(superinstruction, statements, context)
+        elif let_arithmetic is not None:
+            program[start] = let_arithmetic(statements[start:start + length], start, context)
+    return program
+
+def unfused(interpreter):
+    return compile_with(interpreter, None)
+
+def generic(interpreter):
+    return compile_with(interpreter, _compile_sequence)
+
+def specialized(interpreter):
+    return interpreter.compile(superinstructions = True)
+
+def run(program):
+    pc = 0
+    end = len(program)
+    while pc < end:
+        target = program[pc]()
+        pc = pc + 1 if target is None else target
+
+def best_of_interleaved(runs, lines, compilers):
+    """The best time with each way of compiling, taking turns so that a
+    noisy machine slows them all down alike"""
+    best = [float("inf")] * len(compilers)
+    for _ in range(runs):
+        for position, compile in enumerate(compilers):
+            program = compile(load(lines))
+            start = time.perf_counter()
+            run(program)
+            best[position] = min(best[position], time.perf_counter() - start)
+    return best
+
+def main():
+    for name, lines in PROGRAMS.items():
+        apart, sequence, fused = best_of_interleaved(7, lines, [unfused, generic, specialized])
+        print(f"{name:18} unfused: {apart:.3f}s  generic: {sequence:.3f}s  LET_ARITHMETIC: {fused:.3f}s  "
+              f"speedup: {apart / fused:.2f}x")
+
+if __name__ == '__main__':
+    main()
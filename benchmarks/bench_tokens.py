@@ -0,0 +1,42 @@
+"""Measures how much memory tokens take, with tracemalloc: every token of a
+large generated program kept at once, as parse() gives them, and the
+statements grin.cache.load_program() makes of the program, which hold the
+tokens of their operands.
+
+Run from the repository root:  python benchmarks/bench_tokens.py [LINES]
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import gc
+import tracemalloc
+
+from grin.cache import load_program
+from grin.generator import generate
+from grin.parsing import parse
+
+def traced(make):
+    """What make() returns, and the bytes it allocated and still holds"""
+    gc.collect()
+    tracemalloc.start()
+    result = make()
+    held = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, held
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    lines = generate(size, 0).lines + ['.']
+
+    tokens, held = traced(lambda: [token for tokens in parse(lines) for token in tokens])
+    print(f"{len(tokens)} tokens from parse(): {held / len(tokens):.1f} bytes a token ({held / 2 ** 20:.1f} MiB)")
+    del tokens
+
+    statements, held = traced(lambda: load_program(lines))
+    print(f"{len(statements)} statements from load_program(): {held / len(statements):.1f} bytes a statement "
+          f"({held / 2 ** 20:.1f} MiB)")
+
+if __name__ == '__main__':
+    main()
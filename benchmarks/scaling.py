@@ -0,0 +1,72 @@
+"""Times loading and running generated programs of growing size, to find
+phases whose cost per line grows with the program instead of staying flat.
+
+    python -m benchmarks.scaling                         10k, 100k and 1M lines
+    python -m benchmarks.scaling --sizes 1000 10000 --seed 7
+
+Generated programs do about the same work per line whatever their size, so
+the time per line of every phase should stay roughly the same.
+"""
+import argparse
+import sys
+from typing import Dict, List, NamedTuple
+
+from grin.generator import generate
+from benchmarks.suite import PHASES, time_phase
+from benchmarks.workloads import Workload
+
+SIZES = [10000, 100000, 1000000]
+
+# process_line covers lexing, create_statement and adding the statement and
+# its label to the interpreter
+SCALING_PHASES = ['parse', 'process_line', 'compile', 'run']
+
+class Growth(NamedTuple):
+    phase: str
+    smaller: int
+    larger: int
+    growth: float  # How much the time per line grew, as a fraction
+
+def find_superlinear(per_line: Dict[str, Dict[int, float]], tolerance: float) -> List[Growth]:
+    """The phases whose time per line grew by more than tolerance (a fraction)
+    from one size to the next"""
+    found = []
+    for phase, times in per_line.items():
+        sizes = sorted(times)
+        for smaller, larger in zip(sizes, sizes[1:]):
+            growth = times[larger] / times[smaller] - 1 if times[smaller] > 0 else 0.0
+            if growth > tolerance:
+                found.append(Growth(phase, smaller, larger, growth))
+    return found
+
+def main(argv = None) -> int:
+    parser = argparse.ArgumentParser(prog = 'python -m benchmarks.scaling', description = __doc__.splitlines()[0])
+    parser.add_argument('--sizes', type = int, nargs = '+', default = SIZES, help = 'program sizes in lines')
+    parser.add_argument('--seed', type = int, default = 0)
+    parser.add_argument('--iterations', type = int, default = 1, help = 'timed runs of each phase')
+    parser.add_argument('--phase', action = 'append', choices = SCALING_PHASES, help = 'only time this phase')
+    parser.add_argument('--tolerance', type = float, default = 0.5,
+                        help = 'how much the time per line can grow between sizes (default: 0.5)')
+    arguments = parser.parse_args(argv)
+
+    phases = [phase for phase in PHASES if phase.name in (arguments.phase or SCALING_PHASES)]
+    per_line: Dict[str, Dict[int, float]] = {phase.name: {} for phase in phases}
+
+    for size in sorted(arguments.sizes):
+        workload = Workload(*generate(size, arguments.seed))
+        for phase in phases:
+            timing = time_phase(phase, workload, arguments.iterations, 0, size)
+            per_line[phase.name][size] = timing.best / size
+            print(f'{size:>9} lines  {phase.name:13} {timing.best:9.3f}s  {timing.best / size * 1e6:8.2f}us/line')
+
+    growths = find_superlinear(per_line, arguments.tolerance)
+    print()
+    if not growths:
+        print(f'No phase got more than {arguments.tolerance:.0%} slower per line as programs grew')
+        return 0
+    for growth in growths:
+        print(f'SUPER-LINEAR {growth.phase}: {growth.growth:+.0%} per line from {growth.smaller} to {growth.larger} lines')
+    return 1
+
+if __name__ == '__main__':
+    sys.exit(main())
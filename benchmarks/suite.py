@@ -0,0 +1,160 @@
+"""Times each phase of running the workloads, and compares the results with
+a baseline."""
+import gc
+import platform
+import statistics
+import time
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+from grin.interpreter import GrinInterpreter, create_statement
+from grin.input import ListInput
+from grin.scanner import to_tokens
+from grin.output import MemoryOutput
+from grin.parsing import parse
+from grin.profiler import profile
+from grin.token import GrinTokenKind
+import project3
+
+from benchmarks.workloads import WORKLOADS, Workload
+
+def load(workload: Workload) -> GrinInterpreter:
+    """Load a workload the way project3.py does"""
+    interpreter = GrinInterpreter(MemoryOutput(), ListInput(workload.inputs))
+    for line_number, line in enumerate(workload.lines, start = 1):
+        project3.process_line(line, line_number, interpreter)
+    return interpreter
+
+def _lex(lines: List[str]) -> None:
+    for line_number, line in enumerate(lines, start = 1):
+        for _ in to_tokens(line, line_number):
+            pass
+
+def _parse(lines: List[str]) -> None:
+    for _ in parse(lines):
+        pass
+
+def _process_lines(arguments: Any) -> None:
+    lines, interpreter = arguments
+    for line_number, line in enumerate(lines, start = 1):
+        project3.process_line(line, line_number, interpreter)
+
+def _statement_tokens(workload: Workload) -> List[Any]:
+    """The tokens of each statement, without their labels"""
+    statements = []
+    for tokens in parse(workload.lines):
+        if len(tokens) >= 2 and tokens[1].kind() == GrinTokenKind.COLON:
+            tokens = tokens[2:]
+        statements.append(tokens)
+    return statements
+
+def _create_statements(statements: List[Any]) -> None:
+    for tokens in statements:
+        create_statement(tokens)
+
+class Phase(NamedTuple):
+    name: str
+    unit: str
+    # Sets up what run() needs, outside of the timing
+    prepare: Callable[[Workload], Any]
+    run: Callable[[Any], Any]
+
+PHASES = [
+    Phase('lex', 'lines', lambda workload: workload.lines, _lex),
+    Phase('parse', 'lines', lambda workload: workload.lines, _parse),
+    Phase('process_line', 'lines',
+          lambda workload: (workload.lines, GrinInterpreter(MemoryOutput(), ListInput(workload.inputs))),
+          _process_lines),
+    Phase('create_statement', 'statements', _statement_tokens, _create_statements),
+    Phase('compile', 'statements', load, lambda interpreter: interpreter.compile(superinstructions = True)),
+    Phase('run', 'statements', load, lambda interpreter: interpreter.run()),
+]
+
+class Timing(NamedTuple):
+    best: float
+    median: float
+    units: int  # How many lines or statements one iteration handles
+    unit: str
+
+    def throughput(self) -> float:
+        return self.units / self.best if self.best > 0 else float('inf')
+
+def statements_run(workload: Workload) -> int:
+    """How many statements running the workload executes"""
+    return sum(line.count for line in profile(load(workload)).lines)
+
+def time_phase(phase: Phase, workload: Workload, iterations: int, warmup: int, units: int) -> Timing:
+    """Run a phase warmup times untimed, then iterations times, timing only
+    run() and with garbage collection held off while it runs"""
+    times = []
+    for iteration in range(warmup + iterations):
+        argument = phase.prepare(workload)
+        gc.collect()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            phase.run(argument)
+            elapsed = time.perf_counter() - start
+        finally:
+            gc.enable()
+        if iteration >= warmup:
+            times.append(elapsed)
+    return Timing(min(times), statistics.median(times), units, phase.unit)
+
+def run_suite(
+        scale: float = 1.0, iterations: int = 5, warmup: int = 1,
+        workloads: Optional[List[str]] = None, phases: Optional[List[str]] = None,
+        report: Callable[[str], None] = print) -> Dict[str, Any]:
+    """Time every phase of every workload, reporting each as it finishes,
+    and return the results in the form they are saved as a baseline"""
+    results: Dict[str, Dict[str, Dict[str, Any]]] = {}
+
+    for name, make in WORKLOADS.items():
+        if workloads and name not in workloads:
+            continue
+        workload = make(scale)
+        units = {'lines': len(workload.lines), 'statements': len(workload.lines)}
+        results[name] = {}
+
+        for phase in PHASES:
+            if phases and phase.name not in phases:
+                continue
+            if phase.name == 'run':
+                units = dict(units, statements = statements_run(workload))
+            timing = time_phase(phase, workload, iterations, warmup, units[phase.unit])
+            results[name][phase.name] = {
+                'best': timing.best,
+                'median': timing.median,
+                'throughput': timing.throughput(),
+                'unit': f'{timing.unit}/s',
+            }
+            report(f'{name:22} {phase.name:17} best {timing.best:9.4f}s  median {timing.median:9.4f}s  '
+                   f'{timing.throughput():>14,.0f} {timing.unit}/s')
+
+    return {
+        'python': platform.python_version(),
+        'scale': scale,
+        'results': results,
+    }
+
+class Regression(NamedTuple):
+    workload: str
+    phase: str
+    baseline: float
+    current: float
+
+    def slowdown(self) -> float:
+        return self.current / self.baseline - 1
+
+def compare(
+        current: Dict[str, Any], baseline: Dict[str, Any], threshold: float,
+        minimum: float = 0.001) -> List[Regression]:
+    """Find the phases whose best time is more than threshold (a fraction)
+    slower than the baseline's.  Phases that took less than minimum seconds
+    in the baseline are too short to time reliably, so are left out."""
+    regressions = []
+    for workload, phases in current['results'].items():
+        for phase, result in phases.items():
+            before = baseline['results'].get(workload, {}).get(phase)
+            if before is not None and before['best'] >= minimum and result['best'] > before['best'] * (1 + threshold):
+                regressions.append(Regression(workload, phase, before['best'], result['best']))
+    return regressions
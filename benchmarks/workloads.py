@@ -0,0 +1,78 @@
+"""The GRIN programs the benchmark suite runs.  Each is generated from a size,
+so the same scale always gives the same program."""
+from typing import Callable, Dict, List, NamedTuple
+
+class Workload(NamedTuple):
+    name: str
+    lines: List[str]
+    inputs: List[str]  # What INNUM and INSTR will read
+
+def counting_loop(scale: float) -> Workload:
+    count = int(200000 * scale)
+    return Workload('counting loop', [
+        'LET I 0',
+        'ADD I 1',
+        f'GOTO 2 IF I < {count}',
+        'END',
+    ], [])
+
+def gosub_recursion(scale: float) -> Workload:
+    repeats = max(1, int(400 * scale))
+    return Workload('gosub recursion', [
+        'LET R 0',
+        'OUTER: LET D 0',
+        'GOSUB DOWN',
+        'ADD R 1',
+        f'GOTO "OUTER" IF R < {repeats}',
+        'END',
+        'DOWN: ADD D 1',
+        'GOTO "BOTTOM" IF D > 100',
+        'GOSUB DOWN',
+        'BOTTOM: RETURN',
+    ], [])
+
+def print_heavy(scale: float) -> Workload:
+    count = int(50000 * scale)
+    return Workload('print heavy', [
+        'LET I 0',
+        'ADD I 1',
+        'PRINT I',
+        'PRINT "a line of output"',
+        f'GOTO 2 IF I < {count}',
+    ], [])
+
+def string_concatenation(scale: float) -> Workload:
+    count = int(50000 * scale)
+    return Workload('string concatenation', [
+        'INSTR S',
+        'LET I 0',
+        'ADD S "ab"',
+        'ADD I 1',
+        f'GOTO 3 IF I < {count}',
+        'PRINT I',
+    ], ['start'])
+
+def large_program(scale: float) -> Workload:
+    """A long program that runs straight through once, mostly there to give
+    the lexer, parser and loader something to chew on"""
+    lines = ['LET T 0']
+    for block in range(int(4000 * scale)):
+        variable = f'V{block % 50}'
+        lines.extend([
+            f'B{block}: LET {variable} {block}',
+            f'ADD {variable} 3.5',
+            f'MULT {variable} 2',
+            f'ADD T {variable}',
+            f'GOTO "B{block}" IF T < 0',
+            f'PRINT "finished block {block}"',
+        ])
+    lines.append('PRINT T')
+    return Workload('large program', lines, [])
+
+WORKLOADS: Dict[str, Callable[[float], Workload]] = {
+    'counting loop': counting_loop,
+    'gosub recursion': gosub_recursion,
+    'print heavy': print_heavy,
+    'string concatenation': string_concatenation,
+    'large program': large_program,
+}
@@ -13,8 +13,35 @@
 # __all__, as the provided modules do, specifying only their "exports" (i.e.,
 # the names that should become visible to a module that imports the 'grin'
 # package).
+#
+# grin.batch and grin.server are left out, since they bring in asyncio and
+# multiprocessing, which would slow down every "import grin"; they are
+# imported from there, or by "python -m grin" when it runs them.
+#
+# A few names are exported by two modules: to_tokens by grin.lexing and
+# grin.scanner, and compile_program and run by grin.transpiler and grin.vm.
+# The package has grin.lexing's to_tokens and neither compile_program nor
+# run, so that which one is meant is always plain; the others are imported
+# from their own modules.
 
+from grin.cache import *
+from grin.cfg import *
+from grin.checkpoint import *
+from grin.document import *
+from grin.exceptions import *
+from grin.generator import *
+from grin.input import *
+from grin.interpreter import *
 from grin.lexing import *
 from grin.location import *
+from grin.optimizer import *
+from grin.output import *
 from grin.parsing import *
+from grin.profiler import *
+from grin.sampling import *
+from grin.scanner import TokenTable, scan
+from grin.statements import *
+from grin.symbols import *
 from grin.token import *
+from grin.transpiler import TranslationError, Translation, CompiledProgram, translate
+from grin.vm import Bytecode, execute
@@ -0,0 +1,32 @@
+"""The grin command line:  python -m grin COMMAND ...
+
+    batch    run many GRIN programs across a pool of worker processes
+    serve    run GRIN programs sent as JSON lines, streaming their output back
+"""
+import argparse
+import importlib
+import sys
+from typing import List, Optional
+
+# Each command, the module that configures its parser and runs it, and its
+# help.  Only the module of the command being run is imported.
+_COMMANDS = {
+    'batch': ('grin.batch', 'run many GRIN programs across a pool of worker processes'),
+    'serve': ('grin.server', 'run GRIN programs sent as JSON lines on a Unix socket or standard input, '
+                             'streaming their output back'),
+}
+
+def main(argv: Optional[List[str]] = None) -> int:
+    if argv is None:
+        argv = sys.argv[1:]
+    parser = argparse.ArgumentParser(prog = 'grin', description = 'Tools for GRIN programs')
+    commands = parser.add_subparsers(dest = 'command', required = True)
+    for name, (module, help) in _COMMANDS.items():
+        command = commands.add_parser(name, help = help)
+        if argv[:1] == [name]:
+            importlib.import_module(module).configure(command)
+    arguments = parser.parse_args(argv)
+    return arguments.handler(arguments)
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,166 @@
+import argparse
+import concurrent.futures
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, TextIO
+from grin.input import ChainedInput, FileInput, InputSource
+
+# A program's standard input is the file next to it with this extension
+INPUT_EXTENSION = '.in'
+PROGRAM_EXTENSION = '.grin'
+
+class BatchJob(NamedTuple):
+    """A GRIN program to run, and the file its standard input comes from
+    (None for none).  As with project3.py, the program ends at a line
+    holding only '.', and anything after that in the program file is read
+    before the input file."""
+    program: str
+    stdin: Optional[str] = None
+
+class BatchResult(NamedTuple):
+    """What running a job printed, and how long it took.  error is set when
+    the job couldn't be run at all; errors in the GRIN program itself are
+    part of stdout, just as project3.py prints them."""
+    program: str
+    stdin: Optional[str]
+    stdout: str
+    stderr: str
+    error: Optional[str]
+    time: float
+    worker: int  # The id of the process that ran it
+
+    def to_json(self) -> Dict[str, Any]:
+        """The result as plain data, ready for json.dump()"""
+        return self._asdict()
+
+def find_jobs(directory: str) -> List[BatchJob]:
+    """The .grin programs in a directory, each with the .in file of the same
+    name, if there is one, as its input"""
+    jobs = []
+    for name in sorted(os.listdir(directory)):
+        stem, extension = os.path.splitext(name)
+        if extension == PROGRAM_EXTENSION:
+            stdin = os.path.join(directory, stem + INPUT_EXTENSION)
+            jobs.append(BatchJob(os.path.join(directory, name), stdin if os.path.exists(stdin) else None))
+    return jobs
+
+def read_manifest(path: str) -> List[BatchJob]:
+    """Read a manifest listing a program and, optionally, its input file on
+    each line.  Paths are relative to the manifest; blank lines and lines
+    starting with # are skipped."""
+    directory = os.path.dirname(os.path.abspath(path))
+    jobs = []
+    with open(path, encoding = 'utf-8') as file:
+        for line in file:
+            fields = line.split()
+            if not fields or fields[0].startswith('#'):
+                continue
+            if len(fields) > 2:
+                raise ValueError(f'Expected a program and at most one input file, not: {line.strip()}')
+            paths = [os.path.join(directory, field) for field in fields]
+            jobs.append(BatchJob(*paths))
+    return jobs
+
+def run_job(job: BatchJob, optimize: bool = False, cache: Optional[str] = None) -> BatchResult:
+    """Run one job through project3.py's pipeline, capturing what it prints.
+    With a cache directory, loaded programs are kept there as .grinc files."""
+    # project3 imports grin, so it can't be imported while grin is
+    import project3
+    from grin.interpreter import GrinInterpreter
+
+    stdout, stderr = io.StringIO(), io.StringIO()
+    error = None
+    files: List[FileInput] = []
+    start = time.perf_counter()
+    try:
+        files.append(FileInput(job.program))
+        if job.stdin is not None:
+            files.append(FileInput(job.stdin))
+        source: InputSource = ChainedInput(files)
+        with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+            if cache is not None:
+                program_lines = project3.read_program(source)
+                if program_lines:
+                    project3.execute_program(program_lines, optimize, source = source, cache = cache)
+            else:
+                interpreter = GrinInterpreter(input = source)
+                if project3.stream_program(interpreter, source):
+                    project3.run_program(interpreter, optimize)
+    except Exception as e:
+        error = f'{type(e).__name__}: {e}'
+    finally:
+        for file in files:
+            file.close()
+    elapsed = time.perf_counter() - start
+    return BatchResult(job.program, job.stdin, stdout.getvalue(), stderr.getvalue(), error, elapsed, os.getpid())
+
+def _start_worker() -> None:
+    import project3  # Once per worker, rather than on its first job
+
+def run_batch(
+        jobs: Iterable[BatchJob], workers: Optional[int] = None, optimize: bool = False,
+        cache: Optional[str] = None) -> Iterator[BatchResult]:
+    """Run jobs across a pool of worker processes, which are kept for the
+    whole batch, yielding each result as soon as its job finishes"""
+    with concurrent.futures.ProcessPoolExecutor(workers, initializer = _start_worker) as pool:
+        futures = [pool.submit(run_job, job, optimize, cache) for job in jobs]
+        for future in concurrent.futures.as_completed(futures):
+            yield future.result()
+
+def write_results(results: Iterable[BatchResult], file: TextIO) -> Dict[str, Any]:
+    """Write each result to a file as a line of JSON as it arrives, returning
+    totals for the whole batch"""
+    count = failed = 0
+    busy = 0.0
+    for result in results:
+        file.write(json.dumps(result.to_json()) + '\n')
+        file.flush()
+        count += 1
+        failed += result.error is not None
+        busy += result.time
+    return {'programs': count, 'failed': failed, 'time': busy}
+
+def configure(parser: argparse.ArgumentParser) -> None:
+    """Add the batch command's arguments to its parser"""
+    parser.add_argument('programs', metavar = 'DIRECTORY|MANIFEST',
+                        help = 'a directory of .grin programs, each with an optional .in file of input, '
+                               'or a manifest listing a program and its input file on each line')
+    parser.add_argument('-o', '--output', metavar = 'PATH',
+                        help = 'write the results to PATH as JSON lines (default: standard output)')
+    parser.add_argument('-j', '--workers', type = int, help = 'worker processes (default: one per CPU)')
+    parser.add_argument('--optimize', action = 'store_true', help = 'optimize each program first')
+    parser.add_argument('--cache', metavar = 'DIRECTORY',
+                        help = 'keep loaded programs in DIRECTORY, so loading them again is quicker')
+    parser.set_defaults(handler = main)
+
+def main(arguments: argparse.Namespace) -> int:
+    """Run a batch from the command line"""
+    if os.path.isdir(arguments.programs):
+        jobs = find_jobs(arguments.programs)
+    else:
+        jobs = read_manifest(arguments.programs)
+
+    start = time.perf_counter()
+    results = run_batch(jobs, arguments.workers, arguments.optimize, arguments.cache)
+    if arguments.output:
+        with open(arguments.output, 'w', encoding = 'utf-8') as file:
+            totals = write_results(results, file)
+    else:
+        totals = write_results(results, sys.stdout)
+
+    print(f"Ran {totals['programs']} program(s) in {time.perf_counter() - start:.2f}s "
+          f"({totals['time']:.2f}s of work), {totals['failed']} of which couldn't be run", file = sys.stderr)
+    return 1 if totals['failed'] else 0
+
+__all__ = [
+    BatchJob.__name__,
+    BatchResult.__name__,
+    find_jobs.__name__,
+    read_manifest.__name__,
+    run_job.__name__,
+    run_batch.__name__,
+]
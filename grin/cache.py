@@ -0,0 +1,474 @@
+import array
+import collections
+import gc
+import hashlib
+import marshal
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import threading
+import zlib
+from types import MappingProxyType
+from typing import Any, Dict, FrozenSet, Iterable, List, Mapping, NamedTuple, Optional, Tuple
+from grin.input import InputSource
+from grin.interpreter import GrinInterpreter, create_statement
+from grin.location import GrinLocation
+from grin.output import OutputSink
+from grin.parsing import _parse_line, parse
+from grin.scanner import TokenTable, scan
+from grin.statements import (
+    LabeledStatement, Statement, LetStatement, PrintStatement, InNumStatement, InStrStatement,
+    ArithmeticStatement, GotoStatement, GosubStatement, ReturnStatement, EndStatement
+)
+from grin.token import GrinToken, GrinTokenKind
+
+# Bump this whenever the statement classes or the way programs are loaded
+# change, so that .grinc files written before then are no longer used
+CACHE_VERSION = 2
+
+CACHE_EXTENSION = '.grinc'
+
+# What made the statements in a .grinc file, unless it says otherwise, since
+# loaders that check programs differently mustn't share them
+_LOADER = 'grin.cache.load_program'
+
+# A .grinc file is this, then the 32 byte key of the program it holds, then
+# a CRC-32 of the rest, so that a damaged file is never mistaken for a
+# program, then its statements, encoded
+_MAGIC = b'GRINC\r\n\0'
+_KEY_SIZE = hashlib.sha256().digest_size
+_CHECKSUM = struct.Struct('<I')
+_HEADER_SIZE = len(_MAGIC) + _KEY_SIZE + _CHECKSUM.size
+
+_KINDS = {kind.index(): kind for kind in GrinTokenKind}
+
+def cache_key(lines: List[str], loader: str = _LOADER) -> bytes:
+    """A hash of a program's source, the loader that made its statements,
+    the cache format and the Python that wrote it, since marshal's format
+    can change from one to the next"""
+    key = hashlib.sha256(f'{CACHE_VERSION} {sys.implementation.cache_tag} {loader}\n'.encode())
+    for line in lines:
+        key.update(line.encode('utf-8', 'surrogatepass'))
+        key.update(b'\n')
+    return key.digest()
+
+def cache_path(directory: str, lines: List[str], loader: str = _LOADER) -> str:
+    """Where in a cache directory the compiled form of a program goes"""
+    return os.path.join(directory, cache_key(lines, loader).hex() + CACHE_EXTENSION)
+
+# The keywords statements are stored as, in the order their codes refer to,
+# and how many tokens each has.  A GOTO has one more, or three more with a
+# condition.
+_KEYWORDS = ['LET', 'PRINT', 'INNUM', 'INSTR', 'ADD', 'SUB', 'MULT', 'DIV', 'GOTO', 'GOSUB', 'RETURN', 'END']
+_CODES = {keyword: code for code, keyword in enumerate(_KEYWORDS)}
+
+def statement_parts(statement: Statement) -> Tuple[str, List[Optional[GrinToken]]]:
+    """A statement's keyword and the tokens of its operands, in the order they
+    are written.  Raises ValueError for a kind of statement it doesn't know.
+    What a .grinc file and a checkpoint's program hash are made of."""
+    kind = type(statement)
+    if kind is LetStatement:
+        return 'LET', [statement.variable, statement.value]
+    elif kind is PrintStatement:
+        return 'PRINT', [statement.value]
+    elif kind is InNumStatement:
+        return 'INNUM', [statement.variable]
+    elif kind is InStrStatement:
+        return 'INSTR', [statement.variable]
+    elif kind is ArithmeticStatement:
+        return statement.operation, [statement.variable, statement.value]
+    elif kind is GotoStatement:
+        if statement.condition is None:
+            return 'GOTO', [statement.target]
+        return 'GOTO', [statement.target, statement.left, statement.right]
+    elif kind is GosubStatement:
+        return 'GOSUB', [statement.target]
+    elif kind is ReturnStatement:
+        return 'RETURN', []
+    elif kind is EndStatement:
+        return 'END', []
+    raise ValueError(f"Can't cache a {kind.__name__}")
+
+def encode(statements: List[LabeledStatement]) -> bytes:
+    """The statements of a loaded program, marshalled.  They are stored by
+    column rather than one by one: the statements' labels, keywords and GOTO
+    conditions, then every token's kind, text, value, line and column, with
+    the numbers packed into arrays and each distinct text stored once.
+    Raises ValueError for a kind of statement the cache doesn't know."""
+    labels = []
+    keywords = array.array('B')
+    conditions = []
+    kinds = array.array('B')
+    texts = array.array('I')
+    table: Dict[str, int] = {}
+    values = []
+    lines = array.array('I')
+    columns = array.array('I')
+
+    for labeled in statements:
+        keyword, tokens = statement_parts(labeled.statement)
+        labels.append(labeled.label)
+        keywords.append(_CODES[keyword])
+        if keyword == 'GOTO':
+            conditions.append(labeled.statement.condition)
+        for token in tokens:
+            location = token.location()
+            kinds.append(token.kind().index())
+            texts.append(table.setdefault(token.text(), len(table)))
+            values.append(token.value())
+            lines.append(location.line())
+            columns.append(location.column())
+
+    return marshal.dumps((
+        labels, keywords.tobytes(), conditions, kinds.tobytes(), texts.tobytes(), list(table),
+        values, lines.tobytes(), columns.tobytes()))
+
+def decode(data: Any) -> List[LabeledStatement]:
+    """The statements that encode() marshalled, from any bytes-like object.
+    None of the objects made can be part of a reference cycle, so the
+    garbage collector, which would otherwise keep stopping to look through
+    them all, is held off until they are made."""
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return _decode(data)
+    finally:
+        if enabled:
+            gc.enable()
+
+def _decode(data: Any) -> List[LabeledStatement]:
+    labels, keywords, conditions, kinds, texts, table, values, lines, columns = marshal.loads(data)
+    tokens = iter([
+        GrinToken(kind = _KINDS[kind], text = table[text], location = GrinLocation(line, column), value = value)
+        for kind, text, value, line, column in zip(
+            kinds, _unpack(texts), values, _unpack(lines), _unpack(columns))
+    ])
+    conditions = iter(conditions)
+
+    statements = []
+    for label, code in zip(labels, keywords):
+        keyword = _KEYWORDS[code]
+        if keyword == 'LET':
+            statement = LetStatement(next(tokens), next(tokens))
+        elif keyword == 'PRINT':
+            statement = PrintStatement(next(tokens))
+        elif keyword == 'INNUM':
+            statement = InNumStatement(next(tokens))
+        elif keyword == 'INSTR':
+            statement = InStrStatement(next(tokens))
+        elif keyword == 'GOTO':
+            condition = next(conditions)
+            if condition is None:
+                statement = GotoStatement(next(tokens))
+            else:
+                statement = GotoStatement(next(tokens), condition, next(tokens), next(tokens))
+        elif keyword == 'GOSUB':
+            statement = GosubStatement(next(tokens))
+        elif keyword == 'RETURN':
+            statement = ReturnStatement()
+        elif keyword == 'END':
+            statement = EndStatement()
+        else:
+            statement = ArithmeticStatement(keyword, next(tokens), next(tokens))
+        statements.append(LabeledStatement(label, statement))
+    return statements
+
+def _unpack(packed: bytes) -> array.array:
+    numbers = array.array('I')
+    numbers.frombytes(packed)
+    return numbers
+
+def write_cache(path: str, lines: List[str], statements: List[LabeledStatement], loader: str = _LOADER) -> None:
+    """Write the statements a loader made of a program to a .grinc file.
+    Like a .pyc, it is written elsewhere and then moved into place, so that
+    anyone reading it never sees it half written."""
+    encoded = encode(statements)
+    data = _MAGIC + cache_key(lines, loader) + _CHECKSUM.pack(zlib.crc32(encoded)) + encoded
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok = True)
+    descriptor, temporary = tempfile.mkstemp(dir = directory, suffix = '.tmp')
+    try:
+        with os.fdopen(descriptor, 'wb') as file:
+            file.write(data)
+        os.replace(temporary, path)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+
+def read_cache(path: str, lines: List[str], loader: str = _LOADER) -> Optional[List[LabeledStatement]]:
+    """The statements of a program from its .grinc file, or None if there is
+    no such file, it can't be decoded, or it was written for a different
+    source, loader, cache format or Python"""
+    try:
+        with open(path, 'rb') as file, mmap.mmap(file.fileno(), 0, access = mmap.ACCESS_READ) as mapped:
+            key_end = len(_MAGIC) + _KEY_SIZE
+            if mapped[:key_end] != _MAGIC + cache_key(lines, loader):
+                return None
+            (checksum,) = _CHECKSUM.unpack(mapped[key_end:_HEADER_SIZE])
+            with memoryview(mapped)[_HEADER_SIZE:] as view:
+                if zlib.crc32(view) != checksum:
+                    return None
+                return decode(view)
+    except Exception:
+        # A missing, empty, truncated or otherwise unreadable file is a miss,
+        # and so is one whose columns don't fit together, however it fails
+        return None
+
+def load_program(lines: Iterable[str]) -> List[LabeledStatement]:
+    """Lex, parse and create the statements of a program, up to its '.'
+    line.  Raises GrinParseError, GrinLexError or ValueError if it isn't
+    valid.
+
+    The program is lexed by scan(), a block of lines at a time, and the
+    statements on lines of the usual shapes are made straight from the
+    TokenTable, with GrinTokens only for their operands.  Any other line is
+    parsed the way parse() would, which raises the same error it would
+    have."""
+    if not isinstance(lines, list):
+        lines = list(lines)
+    if any('\n' in line for line in lines):
+        # scan() would take it for two lines
+        return [_labeled(tokens) for tokens in parse(lines)]
+    statements = []
+    for block in range(0, len(lines), _BLOCK_LINES):
+        table = scan('\n'.join(lines[block:block + _BLOCK_LINES]), block + 1)
+        for index in range(table.line_count):
+            statement = _table_statement(table, index)
+            if statement is None:
+                tokens = _parse_line(lines[block + index], block + index + 1)
+                if len(tokens) == 1 and tokens[0].kind() == GrinTokenKind.DOT:
+                    return statements
+                statement = _labeled(tokens)
+            statements.append(statement)
+    return statements
+
+# How many lines load_program() lexes at once, which bounds the memory its
+# TokenTables take to a few megabytes
+_BLOCK_LINES = 65536
+
+def _labeled(tokens: List[GrinToken]) -> LabeledStatement:
+    label = None
+    if len(tokens) >= 2 and tokens[1].kind() == GrinTokenKind.COLON:
+        label = tokens[0].text()
+        tokens = tokens[2:]
+    return LabeledStatement(label, create_statement(tokens))
+
+_IDENTIFIER = GrinTokenKind.IDENTIFIER.index()
+_COLON = GrinTokenKind.COLON.index()
+_VARIABLE = frozenset([_IDENTIFIER])
+_VALUE = frozenset(kind.index() for kind in (
+    GrinTokenKind.LITERAL_INTEGER, GrinTokenKind.LITERAL_FLOAT, GrinTokenKind.LITERAL_STRING,
+    GrinTokenKind.IDENTIFIER))
+_TARGET = frozenset(kind.index() for kind in (
+    GrinTokenKind.LITERAL_INTEGER, GrinTokenKind.LITERAL_STRING, GrinTokenKind.IDENTIFIER))
+_IF = frozenset([GrinTokenKind.IF.index()])
+_COMPARISON = frozenset(kind.index() for kind in (
+    GrinTokenKind.EQUAL, GrinTokenKind.NOT_EQUAL, GrinTokenKind.LESS_THAN,
+    GrinTokenKind.LESS_THAN_OR_EQUAL, GrinTokenKind.GREATER_THAN, GrinTokenKind.GREATER_THAN_OR_EQUAL))
+
+# The kinds of token that may follow each keyword, by the keyword's kind and
+# how many tokens the statement has, for every statement both parse() and
+# create_statement() accept
+_SHAPES: Dict[Tuple[int, int], Tuple[FrozenSet[int], ...]] = {
+    **{(GrinTokenKind[keyword].index(), 3): (_VARIABLE, _VALUE) for keyword in ('LET', 'ADD', 'SUB', 'MULT', 'DIV')},
+    (GrinTokenKind.PRINT.index(), 2): (_VALUE,),
+    (GrinTokenKind.INNUM.index(), 2): (_VARIABLE,),
+    (GrinTokenKind.INSTR.index(), 2): (_VARIABLE,),
+    (GrinTokenKind.GOTO.index(), 2): (_TARGET,),
+    (GrinTokenKind.GOTO.index(), 6): (_TARGET, _IF, _VALUE, _COMPARISON, _VALUE),
+    (GrinTokenKind.GOSUB.index(), 2): (_TARGET,),
+    (GrinTokenKind.RETURN.index(), 1): (),
+    (GrinTokenKind.END.index(), 1): (),
+}
+
+def _table_statement(table: TokenTable, line: int) -> Optional[LabeledStatement]:
+    # The statement on a line of a TokenTable, or None if it has an error or
+    # isn't one of the shapes above
+    if line in table.errors:
+        return None
+    kinds = table.kinds
+    first, end = table.first_tokens[line], table.first_tokens[line + 1]
+    label = None
+    if end - first >= 2 and kinds[first + 1] == _COLON and kinds[first] == _IDENTIFIER:
+        label = table.token_text(first)
+        first += 2
+    shape = _SHAPES.get((kinds[first], end - first)) if first < end else None
+    if shape is None:
+        return None
+    for index, allowed in enumerate(shape, first + 1):
+        if kinds[index] not in allowed:
+            return None
+
+    token = table.token
+    keyword = _KINDS[kinds[first]].name
+    if keyword == 'LET':
+        statement = LetStatement(token(first + 1), token(first + 2))
+    elif keyword == 'PRINT':
+        statement = PrintStatement(token(first + 1))
+    elif keyword == 'INNUM':
+        statement = InNumStatement(token(first + 1))
+    elif keyword == 'INSTR':
+        statement = InStrStatement(token(first + 1))
+    elif keyword == 'GOTO':
+        if end - first == 2:
+            statement = GotoStatement(token(first + 1))
+        else:
+            statement = GotoStatement(token(first + 1), table.token_text(first + 4), token(first + 3), token(first + 5))
+    elif keyword == 'GOSUB':
+        statement = GosubStatement(token(first + 1))
+    elif keyword == 'RETURN':
+        statement = ReturnStatement()
+    elif keyword == 'END':
+        statement = EndStatement()
+    else:
+        statement = ArithmeticStatement(keyword, token(first + 1), token(first + 2))
+    return LabeledStatement(label, statement)
+
+_POINTER = struct.calcsize('P')
+
+def _instance_size(instance: Any, attributes: int) -> int:
+    # getsizeof() leaves out the attributes' values, and asking for __dict__
+    # to measure them would make instances that don't have one yet bigger
+    return sys.getsizeof(instance) + _POINTER * (attributes + 1)
+
+def approximate_size(statements: Iterable[LabeledStatement]) -> int:
+    """Roughly how many bytes the objects making up the statements take"""
+    size = 0
+    shared = set()  # The ids of texts and values, which tokens often share
+    for labeled in statements:
+        _, tokens = statement_parts(labeled.statement)
+        size += _instance_size(labeled, 2) + _instance_size(labeled.statement, len(tokens) + 1)
+        for token in tokens:
+            # Tokens and locations have __slots__, which getsizeof() counts
+            size += sys.getsizeof(token) + sys.getsizeof(token.location())
+            for thing in (token.text(), token.value()):
+                if id(thing) not in shared:
+                    shared.add(id(thing))
+                    size += sys.getsizeof(thing)
+    return size
+
+class LoadedProgram(NamedTuple):
+    """A loaded program, which any number of runs can share.  The statements
+    are never changed by running them, and every interpreter made by
+    interpreter() gets its own list of them, label map, variables and
+    return stack."""
+    key: bytes
+    statements: Tuple[LabeledStatement, ...]
+    label_map: Mapping[str, int]
+    size: int  # Roughly how many bytes it takes
+
+    @classmethod
+    def of(cls, key: bytes, statements: Iterable[LabeledStatement]) -> 'LoadedProgram':
+        statements = tuple(statements)
+        label_map = {labeled.label: index for index, labeled in enumerate(statements) if labeled.label}
+        return cls(key, statements, MappingProxyType(label_map), approximate_size(statements))
+
+    def interpreter(self, output: Optional[OutputSink] = None, input: Optional[InputSource] = None) -> GrinInterpreter:
+        """A fresh interpreter, ready to run the program"""
+        interpreter = GrinInterpreter(output, input)
+        interpreter.statements = list(self.statements)
+        interpreter.label_map = dict(self.label_map)
+        return interpreter
+
+class CacheStats(NamedTuple):
+    hits: int
+    misses: int
+    evictions: int
+    entries: int
+    size: int  # Roughly how many bytes the cached programs take
+
+class ProgramCache:
+    """Keeps the programs loaded most recently, by a hash of their source,
+    so that loading the same source again costs only the hash.  It holds at
+    most max_entries programs and, if max_bytes is given, programs taking
+    roughly that many bytes in all, forgetting the least recently used
+    first.  With a directory, programs it doesn't hold are looked for there
+    as .grinc files, and written there once loaded, if they can be.  It can
+    be shared between threads."""
+    def __init__(self, max_entries: int = 128, max_bytes: Optional[int] = None, directory: Optional[str] = None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self._programs: 'collections.OrderedDict[bytes, LoadedProgram]' = collections.OrderedDict()
+        self._size = 0
+        self._hits = self._misses = self._evictions = 0
+        self._lock = threading.Lock()
+
+    def load(self, lines: List[str]) -> LoadedProgram:
+        """The loaded program for these lines, loading it if it isn't cached.
+        Programs that fail to load raise as load_program() does and aren't
+        cached."""
+        key = cache_key(lines)
+        with self._lock:
+            program = self._programs.get(key)
+            if program is not None:
+                self._programs.move_to_end(key)
+                self._hits += 1
+                return program
+            self._misses += 1
+
+        # Loading is done without the lock, so that other programs can be
+        # looked up meanwhile
+        program = LoadedProgram.of(key, self._load(lines))
+
+        with self._lock:
+            if key not in self._programs and self._fits(program):
+                self._programs[key] = program
+                self._size += program.size
+                self._evict()
+        return program
+
+    def _load(self, lines: List[str]) -> List[LabeledStatement]:
+        if self.directory is None:
+            return load_program(lines)
+        path = cache_path(self.directory, lines)
+        statements = read_cache(path, lines)
+        if statements is None:
+            statements = load_program(lines)
+            try:
+                write_cache(path, lines, statements)
+            except OSError:
+                # The cache only saves time, so a directory that can't be
+                # written to, or a full disk, is no reason for loading to fail
+                pass
+        return statements
+
+    def _fits(self, program: LoadedProgram) -> bool:
+        return self.max_entries > 0 and (self.max_bytes is None or program.size <= self.max_bytes)
+
+    def _evict(self) -> None:
+        while len(self._programs) > self.max_entries \
+                or (self.max_bytes is not None and self._size > self.max_bytes):
+            _, program = self._programs.popitem(last = False)
+            self._size -= program.size
+            self._evictions += 1
+
+    def clear(self) -> None:
+        """Forget every program, keeping the counts"""
+        with self._lock:
+            self._programs.clear()
+            self._size = 0
+
+    def stats(self) -> CacheStats:
+        with self._lock:
+            return CacheStats(self._hits, self._misses, self._evictions, len(self._programs), self._size)
+
+    def __len__(self) -> int:
+        return len(self._programs)
+
+__all__ = [
+    CacheStats.__name__,
+    LoadedProgram.__name__,
+    ProgramCache.__name__,
+    approximate_size.__name__,
+    load_program.__name__,
+    cache_key.__name__,
+    cache_path.__name__,
+    statement_parts.__name__,
+    encode.__name__,
+    decode.__name__,
+    write_cache.__name__,
+    read_cache.__name__,
+]
@@ -0,0 +1,453 @@
+import bisect
+import itertools
+import operator
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+from grin.statements import (
+    CompiledStatement, LabeledStatement, ProgramContext, StatementFault,
+    LetStatement, PrintStatement, ArithmeticStatement, GotoStatement, GosubStatement,
+    ReturnStatement, EndStatement
+)
+from grin.symbols import UNDEFINED
+from grin.token import GrinToken, GrinTokenKind
+
+class BasicBlock:
+    """A run of statements that is only ever entered at its first statement
+    and only ever left after its last one"""
+    def __init__(self, number: int, start: int, end: int):
+        self.number = number
+        self.start = start
+        self.end = end  # One past the last statement
+        self.successors: List['BasicBlock'] = []
+        self.falls_off_end = False  # Whether leaving it can end the program
+        self._predecessors: List['BasicBlock'] = []
+        # Every RETURN block leads to every block after a GOSUB, and every
+        # dynamic GOTO block to every block.  Rather than adding each of those
+        # edges, whose number grows with the square of the program's length,
+        # such blocks share one successors list, and the blocks it leads to
+        # keep the list of blocks that share it here
+        self._shared_predecessors: List[List['BasicBlock']] = []
+
+    @property
+    def predecessors(self) -> List['BasicBlock']:
+        """The blocks that can lead to this one, in order"""
+        if not self._shared_predecessors:
+            return self._predecessors
+        return sorted(itertools.chain(self._predecessors, *self._shared_predecessors), key = lambda block: block.number)
+
+    def indices(self) -> range:
+        """The indices of the statements in the block"""
+        return range(self.start, self.end)
+
+    def __len__(self) -> int:
+        return self.end - self.start
+
+    def __repr__(self) -> str:
+        return f'BasicBlock({self.number}, {self.start}, {self.end})'
+
+class ControlFlowGraph:
+    """The basic blocks of a loaded program and the edges between them"""
+    def __init__(self, statements: List[Any], blocks: List[BasicBlock], has_dynamic_jumps: bool):
+        self.statements = statements
+        self.blocks = blocks
+        # When a GOTO's target is held in a variable, any statement could be
+        # jumped to, so every statement starts its own block
+        self.has_dynamic_jumps = has_dynamic_jumps
+        self._starts = [block.start for block in blocks]
+
+    def leaders(self) -> List[int]:
+        """The index of the first statement of every block"""
+        return list(self._starts)
+
+    def block_of(self, index: int) -> BasicBlock:
+        """The block that contains the statement at index"""
+        return self.blocks[bisect.bisect_right(self._starts, index) - 1]
+
+    def reachable(self) -> Set[int]:
+        """The numbers of the blocks that can be reached from the start of the
+        program"""
+        if not self.blocks:
+            return set()
+
+        seen = {0}
+        walked = set()  # The ids of shared successors lists already walked
+        pending = [self.blocks[0]]
+        while pending:
+            successors = pending.pop().successors
+            if id(successors) in walked:
+                continue
+            walked.add(id(successors))
+            for successor in successors:
+                if successor.number not in seen:
+                    seen.add(successor.number)
+                    pending.append(successor)
+        return seen
+
+def jump_destination(statement: Any, context: ProgramContext) -> Optional[int]:
+    """The index a GOTO or GOSUB with a literal target lands on, or None if it
+    isn't one or its target doesn't exist"""
+    if isinstance(statement, GosubStatement):
+        return context.label_map.get(statement.target.text())
+    elif isinstance(statement, GotoStatement) and statement.target.kind() != GrinTokenKind.IDENTIFIER:
+        target = statement.target.value()
+        if not isinstance(target, (int, str)):
+            return None
+        try:
+            return context.resolve_jump(str(target))
+        except RuntimeError:
+            return None
+    return None
+
+def _is_dynamic_jump(statement: Any) -> bool:
+    return isinstance(statement, GotoStatement) and statement.target.kind() == GrinTokenKind.IDENTIFIER
+
+def _can_jump(statement: Any) -> bool:
+    """Whether a GOTO can ever leave its block other than by falling through;
+    conditions other than <, > and = never jump"""
+    return not statement.condition or statement.condition in ('<', '>', '=')
+
+def _static_targets(last: Any, block: BasicBlock, context: ProgramContext) -> List[int]:
+    """Where control can go after a block that doesn't end in a RETURN or a
+    dynamic GOTO"""
+    targets = []
+    if isinstance(last, GotoStatement):
+        if _can_jump(last):
+            destination = jump_destination(last, context)
+            if destination is not None:
+                targets.append(destination)
+        if last.condition:
+            targets.append(block.end)
+    elif isinstance(last, GosubStatement):
+        destination = jump_destination(last, context)
+        if destination is not None:
+            targets.append(destination)
+    elif not isinstance(last, EndStatement):
+        targets.append(block.end)
+    return targets
+
+def build_cfg(statements: List[LabeledStatement], label_map: Dict[str, int]) -> ControlFlowGraph:
+    """Split a loaded program into basic blocks and connect them"""
+    program = [labeled.statement for labeled in statements]
+    count = len(program)
+    context = ProgramContext(label_map, count, [])
+    has_dynamic_jumps = any(_is_dynamic_jump(statement) for statement in program)
+
+    if has_dynamic_jumps:
+        leaders = set(range(count))
+    else:
+        leaders = {0} if count else set()
+        for index, statement in enumerate(program):
+            if isinstance(statement, (GotoStatement, GosubStatement, ReturnStatement, EndStatement)):
+                leaders.add(index + 1)
+            destination = jump_destination(statement, context)
+            if destination is not None:
+                leaders.add(destination)
+
+    starts = sorted(leader for leader in leaders if leader < count)
+    blocks = [BasicBlock(number, start, end)
+              for number, (start, end) in enumerate(zip(starts, starts[1:] + [count]))]
+    cfg = ControlFlowGraph(program, blocks, has_dynamic_jumps)
+
+    def edges_to(targets: Iterable[int]) -> Tuple[bool, List[BasicBlock]]:
+        """Whether the targets include leaving the program, and the blocks
+        they start"""
+        ordered = sorted(set(targets))
+        falls_off_end = bool(ordered) and ordered[-1] >= count
+        return falls_off_end, [cfg.block_of(target) for target in ordered if target < count]
+
+    def share_edges(sources: List[BasicBlock], targets: Iterable[int]) -> None:
+        """Connect every one of sources to every one of targets"""
+        falls_off_end, successors = edges_to(targets)
+        for block in sources:
+            block.falls_off_end = falls_off_end
+            block.successors = successors
+        for successor in successors:
+            successor._shared_predecessors.append(sources)
+
+    returns = []
+    dynamic_jumps = []
+
+    for block in blocks:
+        last = program[block.end - 1]
+        if isinstance(last, ReturnStatement):
+            returns.append(block)
+        elif _is_dynamic_jump(last):
+            dynamic_jumps.append(block)
+        else:
+            block.falls_off_end, block.successors = edges_to(_static_targets(last, block, context))
+            for successor in block.successors:
+                successor._predecessors.append(block)
+
+    if returns:
+        share_edges(returns, (index + 1 for index, statement in enumerate(program)
+                              if isinstance(statement, GosubStatement)))
+    if dynamic_jumps:
+        share_edges(dynamic_jumps, range(count + 1))
+
+    return cfg
+
+class Superinstruction(NamedTuple):
+    """A run of statements in one block that is executed by a single fused
+    closure"""
+    kind: str
+    start: int
+    length: int
+
+# The kinds of superinstruction, in the order they are looked for
+ARITHMETIC_BRANCH = 'ARITHMETIC_BRANCH'  # e.g. ADD I 1 then GOTO L IF I < N
+LET_ARITHMETIC = 'LET_ARITHMETIC'        # e.g. LET X Y then MULT X 2
+PRINT_RUN = 'PRINT_RUN'                  # Two or more PRINTs in a row
+
+_ARITHMETIC_OPERATIONS = {
+    'ADD': operator.iadd,
+    'SUB': operator.isub,
+    'MULT': operator.imul,
+}
+
+_COMPARISONS = {
+    '<': operator.lt,
+    '>': operator.gt,
+    '=': operator.eq,
+}
+
+def _is_variable(token: GrinToken) -> bool:
+    return token.kind() == GrinTokenKind.IDENTIFIER
+
+def _is_arithmetic_branch(first: Any, second: Any) -> bool:
+    return type(first) is ArithmeticStatement and first.operation in _ARITHMETIC_OPERATIONS \
+        and type(second) is GotoStatement and second.condition in _COMPARISONS \
+        and not _is_variable(second.target) \
+        and _is_variable(second.left) and second.left.text() == first.variable.text()
+
+def _is_let_arithmetic(first: Any, second: Any) -> bool:
+    return type(first) is LetStatement and type(second) is ArithmeticStatement \
+        and second.operation in _ARITHMETIC_OPERATIONS and second.variable.text() == first.variable.text() \
+        and (_is_variable(first.value) or _is_variable(second.value))
+
+def find_superinstructions(cfg: ControlFlowGraph) -> List[Superinstruction]:
+    """Find the statement runs worth fusing, without overlaps and never
+    crossing from one block into another"""
+    program = cfg.statements
+    fused: Set[int] = set()
+    found: List[Superinstruction] = []
+
+    def add(kind: str, start: int, length: int) -> None:
+        found.append(Superinstruction(kind, start, length))
+        fused.update(range(start, start + length))
+
+    for kind, matches in ((ARITHMETIC_BRANCH, _is_arithmetic_branch), (LET_ARITHMETIC, _is_let_arithmetic)):
+        for block in cfg.blocks:
+            for index in range(block.start, block.end - 1):
+                if index not in fused and index + 1 not in fused \
+                        and matches(program[index], program[index + 1]):
+                    add(kind, index, 2)
+
+    for block in cfg.blocks:
+        index = block.start
+        while index < block.end:
+            end = index
+            while end < block.end and end not in fused and type(program[end]) is PrintStatement:
+                end += 1
+            if end - index >= 2:
+                add(PRINT_RUN, index, end - index)
+            index = end + 1 if end == index else end
+
+    return sorted(found, key = lambda superinstruction: superinstruction.start)
+
+def _compile_arithmetic_branch(
+        arithmetic: ArithmeticStatement, goto: GotoStatement, index: int,
+        context: ProgramContext) -> CompiledStatement:
+    destination = jump_destination(goto, context)
+    if destination is None:
+        # The jump would fail, so leave the error to the GOTO's own closure
+        return _compile_sequence([arithmetic, goto], index, context)
+
+    name = arithmetic.variable.text()
+    slot = context.symbols.slot(name)
+    values = context.symbols.values
+    apply = _ARITHMETIC_OPERATIONS[arithmetic.operation]
+    compare = _COMPARISONS[goto.condition]
+    fall_through = index + 2
+
+    if not _is_variable(arithmetic.value) and not _is_variable(goto.right):
+        operand = arithmetic.value.value()
+        limit = goto.right.value()
+
+        def arithmetic_then_branch() -> int:
+            value = values[slot]
+            if value is UNDEFINED:
+                raise RuntimeError(f"Variable '{name}' not defined")
+            value = apply(value, operand)
+            values[slot] = value
+            try:
+                taken = compare(value, limit)
+            except Exception as e:
+                raise StatementFault(1, e)
+            return destination if taken else fall_through
+
+        return arithmetic_then_branch
+
+    update = arithmetic.compile(index, context)
+    right = GotoStatement._compile_operand(goto.right, context.symbols)
+
+    def arithmetic_then_branch_variable() -> int:
+        update()
+        try:
+            taken = compare(values[slot], right())
+        except Exception as e:
+            raise StatementFault(1, e)
+        return destination if taken else fall_through
+
+    return arithmetic_then_branch_variable
+
+def _compile_let_arithmetic(
+        let: LetStatement, arithmetic: ArithmeticStatement, index: int,
+        context: ProgramContext) -> CompiledStatement:
+    target = context.symbols.slot(let.variable.text())
+    values = context.symbols.values
+    apply = _ARITHMETIC_OPERATIONS[arithmetic.operation]
+    end = index + 2
+
+    if not _is_variable(arithmetic.value):
+        # The LET's value is a variable, since two literals aren't fused
+        operand = arithmetic.value.value()
+        name = let.value.text()
+        source = context.symbols.slot(name)
+
+        def let_then_arithmetic() -> int:
+            value = values[source]
+            if value is UNDEFINED:
+                raise RuntimeError(f"Variable '{name}' not defined")
+            try:
+                values[target] = apply(value, operand)
+            except Exception as e:
+                values[target] = value  # The LET still happened
+                raise StatementFault(1, e)
+            return end
+
+        return let_then_arithmetic
+
+    # The operand is read once the LET is done, since it may be the same
+    # variable
+    operand_name = arithmetic.value.text()
+    operand_slot = context.symbols.slot(operand_name)
+
+    if not _is_variable(let.value):
+        constant = let.value.value()
+
+        def let_literal_then_arithmetic_variable() -> int:
+            values[target] = constant
+            operand = values[operand_slot]
+            if operand is UNDEFINED:
+                raise StatementFault(1, RuntimeError(f"Variable '{operand_name}' not defined"))
+            try:
+                values[target] = apply(constant, operand)
+            except Exception as e:
+                raise StatementFault(1, e)
+            return end
+
+        return let_literal_then_arithmetic_variable
+
+    name = let.value.text()
+    source = context.symbols.slot(name)
+
+    def let_then_arithmetic_variable() -> int:
+        value = values[source]
+        if value is UNDEFINED:
+            raise RuntimeError(f"Variable '{name}' not defined")
+        values[target] = value
+        operand = values[operand_slot]
+        if operand is UNDEFINED:
+            raise StatementFault(1, RuntimeError(f"Variable '{operand_name}' not defined"))
+        try:
+            values[target] = apply(value, operand)
+        except Exception as e:
+            raise StatementFault(1, e)
+        return end
+
+    return let_then_arithmetic_variable
+
+def _compile_sequence(statements: List[Any], index: int, context: ProgramContext) -> CompiledStatement:
+    """Run statements one after another, as the run loop would"""
+    first = statements[0].compile(index, context)
+    rest = [(offset, statement.compile(index + offset, context))
+            for offset, statement in enumerate(statements[1:], start = 1)]
+    end = index + len(statements)
+
+    def sequence() -> Optional[int]:
+        target = first()
+        if target is not None:
+            return target
+        for offset, compiled in rest:
+            try:
+                target = compiled()
+            except Exception as e:
+                raise StatementFault(offset, e)
+            if target is not None:
+                return target
+        return end
+
+    return sequence
+
+def _compile_print_run(prints: List[PrintStatement], index: int, context: ProgramContext) -> CompiledStatement:
+    values = context.symbols.values
+    write = context.output.write
+    # (slot, name) for a variable, (None, text) for a literal
+    items = [(context.symbols.slot(statement.value.text()), statement.value.text())
+             if _is_variable(statement.value) else (None, f'{statement.value.value()}\n')
+             for statement in prints]
+    end = index + len(prints)
+
+    def print_run() -> int:
+        for offset, (slot, item) in enumerate(items):
+            # A sink can fail too, such as at an output limit
+            try:
+                if slot is None:
+                    write(item)
+                else:
+                    value = values[slot]
+                    if value is UNDEFINED:
+                        raise RuntimeError(f"Variable '{item}' not defined")
+                    write(f'{value}\n')
+            except Exception as e:
+                raise StatementFault(offset, e)
+        return end
+
+    return print_run
+
+def compile_superinstruction(
+        superinstruction: Superinstruction, statements: List[Any],
+        context: ProgramContext) -> CompiledStatement:
+    """Compile a superinstruction into one closure.  It follows the same
+    protocol as a compiled statement, except that when anything after its
+    first statement fails, the error is wrapped in a StatementFault saying
+    which statement it was."""
+    start, length = superinstruction.start, superinstruction.length
+    fused = statements[start:start + length]
+
+    if superinstruction.kind == ARITHMETIC_BRANCH:
+        return _compile_arithmetic_branch(fused[0], fused[1], start, context)
+    elif superinstruction.kind == LET_ARITHMETIC:
+        return _compile_let_arithmetic(fused[0], fused[1], start, context)
+    elif superinstruction.kind == PRINT_RUN:
+        return _compile_print_run(fused, start, context)
+    else:
+        return _compile_sequence(fused, start, context)
+
+def fuse(program: List[CompiledStatement], cfg: ControlFlowGraph, context: ProgramContext) -> int:
+    """Replace the compiled statement at the start of every superinstruction
+    with its fused closure, returning how many were fused.  The statements
+    inside a superinstruction keep their own closures, so jumping straight
+    to one of them still works."""
+    superinstructions = find_superinstructions(cfg)
+    for superinstruction in superinstructions:
+        program[superinstruction.start] = compile_superinstruction(superinstruction, cfg.statements, context)
+    return len(superinstructions)
+
+__all__ = [
+    BasicBlock.__name__,
+    ControlFlowGraph.__name__,
+    Superinstruction.__name__,
+    build_cfg.__name__,
+    find_superinstructions.__name__,
+    compile_superinstruction.__name__,
+]
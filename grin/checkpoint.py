@@ -0,0 +1,161 @@
+import hashlib
+import marshal
+import os
+import struct
+import tempfile
+import zlib
+from typing import Any, Dict, List, NamedTuple, Optional
+from grin.cache import statement_parts
+from grin.exceptions import GrinLimitError
+from grin.interpreter import GrinInterpreter, FINISHED
+
+# Bump this whenever what a checkpoint holds changes
+CHECKPOINT_VERSION = 2
+
+CHECKPOINT_INTERVAL = 1_000_000  # Steps
+
+# A checkpoint is this, then a CRC-32 of the rest, then its fields, marshalled
+_MAGIC = b'GRINS\r\n\0'
+_CHECKSUM = struct.Struct('<I')
+_HEADER_SIZE = len(_MAGIC) + _CHECKSUM.size
+
+class Checkpoint(NamedTuple):
+    """Where a running program had got to: which program it is, the index of
+    the statement it runs next, how many steps it had taken and lines of
+    input it had read, its return stack and its variables.  What it printed
+    isn't part of it."""
+    program: bytes  # program_hash() of the program
+    line: int
+    steps: int
+    lines_read: int
+    return_stack: List[int]
+    variables: Dict[str, Any]
+
+    def to_bytes(self) -> bytes:
+        """The checkpoint, marshalled, which takes microseconds for all but
+        the biggest programs"""
+        data = marshal.dumps((CHECKPOINT_VERSION, *self))
+        return _MAGIC + _CHECKSUM.pack(zlib.crc32(data)) + data
+
+    @staticmethod
+    def from_bytes(data: bytes) -> 'Checkpoint':
+        """The checkpoint to_bytes() marshalled.  Raises ValueError if it
+        isn't one, is damaged or was written by another version."""
+        if data[:len(_MAGIC)] != _MAGIC or len(data) < _HEADER_SIZE:
+            raise ValueError('Not a GRIN checkpoint')
+        (checksum,) = _CHECKSUM.unpack(data[len(_MAGIC):_HEADER_SIZE])
+        if zlib.crc32(data[_HEADER_SIZE:]) != checksum:
+            raise ValueError('The checkpoint is damaged')
+        try:
+            version, *fields = marshal.loads(data[_HEADER_SIZE:])
+        except (EOFError, TypeError) as e:
+            raise ValueError('The checkpoint is damaged') from e
+        if version != CHECKPOINT_VERSION:
+            raise ValueError(f'The checkpoint is from version {version}, not {CHECKPOINT_VERSION}')
+        return Checkpoint(*fields)
+
+def program_hash(interpreter: GrinInterpreter) -> bytes:
+    """A hash of the statements an interpreter has loaded, which a checkpoint
+    can only be restored into the same program as.  Only what they do goes
+    into it, not where in the source they were."""
+    key = hashlib.sha256()
+    for labeled in interpreter.statements:
+        keyword, tokens = statement_parts(labeled.statement)
+        texts = [labeled.label or '', keyword] + [token.text() if token is not None else '' for token in tokens]
+        # A GOTO's comparison isn't one of its tokens
+        texts.append(getattr(labeled.statement, 'condition', None) or '')
+        key.update('\0'.join(texts).encode('utf-8', 'surrogatepass'))
+        key.update(b'\n')
+    return key.digest()
+
+def take_checkpoint(interpreter: GrinInterpreter, program: Optional[bytes] = None) -> Checkpoint:
+    """Where an interpreter's program has got to, between calls to step().
+    Pass the program_hash() to save working it out again every time."""
+    return Checkpoint(
+        program if program is not None else program_hash(interpreter), interpreter.current_line,
+        interpreter.steps, interpreter.lines_read, list(interpreter.return_stack), dict(interpreter.variables))
+
+def restore(
+        interpreter: GrinInterpreter, checkpoint: Checkpoint, max_steps: Optional[int] = None,
+        time_limit: Optional[float] = None, max_depth: Optional[int] = None) -> None:
+    """Start an interpreter's program as start() does, then put it back where
+    the checkpoint says it had got to, ready for step().  Steps taken before
+    count towards max_steps, but time spent before doesn't count towards
+    time_limit.  Raises ValueError if the checkpoint is of another program."""
+    if checkpoint.program != program_hash(interpreter):
+        raise ValueError('The checkpoint is of a different program')
+    interpreter.start(max_steps, time_limit, max_depth)
+    interpreter.return_stack[:] = checkpoint.return_stack
+    interpreter.variables = checkpoint.variables
+    interpreter.current_line = checkpoint.line
+    interpreter.steps = checkpoint.steps
+    interpreter.lines_read = checkpoint.lines_read
+
+def write_checkpoint(path: str, checkpoint: Checkpoint) -> None:
+    """Write a checkpoint to a file, elsewhere first and then moved into place,
+    so that one being written when the process is killed never replaces the
+    last good one"""
+    directory = os.path.dirname(path) or '.'
+    descriptor, temporary = tempfile.mkstemp(dir = directory, suffix = '.tmp')
+    try:
+        with os.fdopen(descriptor, 'wb') as file:
+            file.write(checkpoint.to_bytes())
+        os.replace(temporary, path)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+
+def read_checkpoint(path: str) -> Optional[Checkpoint]:
+    """The checkpoint in a file, or None if there is no such file or it isn't
+    a checkpoint this version can read"""
+    try:
+        with open(path, 'rb') as file:
+            return Checkpoint.from_bytes(file.read())
+    except (OSError, ValueError):
+        return None
+
+def run_with_checkpoints(
+        interpreter: GrinInterpreter, path: str, interval: int = CHECKPOINT_INTERVAL,
+        max_steps: Optional[int] = None, time_limit: Optional[float] = None,
+        max_depth: Optional[int] = None) -> bool:
+    """Run a program as run() does, writing a checkpoint to path every
+    interval steps.  If path already holds one for this program, it carries
+    on from there instead of from the start, first skipping the lines of
+    input it had read; it returns whether it did.  The file is removed once
+    the program has finished or gone past a limit."""
+    program = program_hash(interpreter)
+    checkpoint = read_checkpoint(path)
+    resumed = checkpoint is not None and checkpoint.program == program
+    if resumed:
+        for _ in range(checkpoint.lines_read):
+            interpreter.input.readline()
+        restore(interpreter, checkpoint, max_steps, time_limit, max_depth)
+    else:
+        interpreter.start(max_steps, time_limit, max_depth)
+
+    try:
+        while interpreter.step(interval, wait = True) != FINISHED:
+            write_checkpoint(path, take_checkpoint(interpreter, program))
+    except GrinLimitError:
+        _remove(path)
+        raise
+    finally:
+        interpreter.output.flush()
+    _remove(path)
+    return resumed
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+__all__ = [
+    Checkpoint.__name__,
+    program_hash.__name__,
+    take_checkpoint.__name__,
+    restore.__name__,
+    write_checkpoint.__name__,
+    read_checkpoint.__name__,
+    run_with_checkpoints.__name__,
+]
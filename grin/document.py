@@ -0,0 +1,281 @@
+import random
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+from grin.interpreter import GrinInterpreter, create_statement
+from grin.location import GrinLocation
+from grin.parsing import _parse_line
+from grin.statements import LabeledStatement
+from grin.token import GrinToken, GrinTokenKind
+
+class _Line(NamedTuple):
+    """What lexing and parsing a line's text found, as if it were line 1"""
+    tokens: Optional[List[GrinToken]]  # None if the line has an error
+    label: Optional[str]
+    statement: Optional[LabeledStatement]  # None for errors and the '.' line
+    dot: bool
+
+_ERROR = _Line(None, None, None, False)
+
+def _read_line(text: str) -> _Line:
+    try:
+        tokens = _parse_line(text, 1)
+        if len(tokens) == 1 and tokens[0].kind() == GrinTokenKind.DOT:
+            return _Line(tokens, None, None, True)
+        label = None
+        body = tokens
+        if len(tokens) >= 2 and tokens[1].kind() == GrinTokenKind.COLON:
+            label = tokens[0].text()
+            body = tokens[2:]
+        return _Line(tokens, label, LabeledStatement(label, create_statement(body)), False)
+    except Exception:
+        return _ERROR
+
+class _Node:
+    """A line's place in a document: a node of a treap that keeps the lines
+    in order and how many lines are under each node, so that a line's index
+    is worked out from its node, rather than stored and moved along every
+    time lines come or go before it"""
+    __slots__ = ('left', 'right', 'parent', 'size', 'priority')
+
+    def __init__(self):
+        self.left: Optional[_Node] = None
+        self.right: Optional[_Node] = None
+        self.parent: Optional[_Node] = None
+        self.size = 1
+        self.priority = random.random()
+
+def _size(node: Optional[_Node]) -> int:
+    return node.size if node is not None else 0
+
+def _update(node: _Node) -> None:
+    node.size = 1 + _size(node.left) + _size(node.right)
+    if node.left is not None:
+        node.left.parent = node
+    if node.right is not None:
+        node.right.parent = node
+
+def _merge(left: Optional[_Node], right: Optional[_Node]) -> Optional[_Node]:
+    # The lines of left followed by those of right
+    if left is None:
+        return right
+    if right is None:
+        return left
+    if left.priority > right.priority:
+        left.right = _merge(left.right, right)
+        _update(left)
+        return left
+    right.left = _merge(left, right.left)
+    _update(right)
+    return right
+
+def _split(node: Optional[_Node], count: int) -> Tuple[Optional[_Node], Optional[_Node]]:
+    # The first count lines, and the rest
+    if node is None:
+        return None, None
+    if _size(node.left) >= count:
+        left, node.left = _split(node.left, count)
+        _update(node)
+        return left, node
+    node.right, right = _split(node.right, count - _size(node.left) - 1)
+    _update(node)
+    return node, right
+
+def _build(nodes: List[_Node]) -> Optional[_Node]:
+    # The lines in order, in one pass: each node goes above the ones before
+    # it with lower priorities, which are then done with
+    stack: List[_Node] = []
+    for node in nodes:
+        last = None
+        while stack and stack[-1].priority < node.priority:
+            last = stack.pop()
+            _update(last)
+        node.left = last
+        if stack:
+            stack[-1].right = node
+        stack.append(node)
+    root = None
+    while stack:
+        root = stack.pop()
+        _update(root)
+    return root
+
+def _index(node: _Node) -> int:
+    index = _size(node.left)
+    while node.parent is not None:
+        if node is node.parent.right:
+            index += _size(node.parent.left) + 1
+        node = node.parent
+    return index
+
+def _position(nodes: List[_Node], index: int) -> int:
+    # Where the first of nodes, which are in order, at or after index is
+    low, high = 0, len(nodes)
+    while low < high:
+        middle = (low + high) // 2
+        if _index(nodes[middle]) < index:
+            low = middle + 1
+        else:
+            high = middle
+    return low
+
+class GrinDocument:
+    """A GRIN program being edited, which keeps the statement and label map
+    parse() and create_statement() would give it up to date as lines are
+    changed.  Every distinct line of text is lexed and parsed once, however
+    many lines have it, so an edit costs what lexing and parsing the lines
+    it brings in costs, plus a few steps for each line it changes that grow
+    with the logarithm of the document's length.  The labels, errors and
+    '.' lines after an edit don't move, because where they are is worked
+    out from their lines' places in a treap when it is asked for.
+
+    As with parse(), every line is a line of the program, including empty
+    ones, which are errors, and the program ends at the first '.' line.
+    Statements are shared between lines with the same text, so the
+    locations of their tokens aren't meaningful; tokens() gives those."""
+    def __init__(self, lines: Iterable[str] = ()):
+        self._lines: List[str] = []
+        self._read: List[_Line] = []
+        self._nodes: List[_Node] = []  # The place of every line
+        self._root: Optional[_Node] = None
+        self._cache: Dict[str, _Line] = {}
+        # The statement on every line, None where there isn't one
+        self.statements: List[Optional[LabeledStatement]] = []
+        # The lines where each label is used, the lines that don't parse,
+        # and the '.' lines, each in order
+        self._labels: Dict[str, List[_Node]] = {}
+        self._errors: List[_Node] = []
+        self._dots: List[_Node] = []
+        self.edit(0, 0, list(lines))
+
+    def __len__(self) -> int:
+        return len(self._lines)
+
+    def __getitem__(self, index: int) -> str:
+        return self._lines[index]
+
+    @property
+    def end(self) -> int:
+        """The index of the '.' line the program ends at, or the number of
+        lines if there isn't one"""
+        return _index(self._dots[0]) if self._dots else len(self._lines)
+
+    @property
+    def label_map(self) -> Dict[str, int]:
+        """The index of the statement each label before the first '.' jumps
+        to, which is its last use before there, as
+        GrinInterpreter.add_statement() would have it"""
+        end = self.end
+        label_map = {}
+        for label, nodes in self._labels.items():
+            position = _position(nodes, end)
+            if position:
+                label_map[label] = _index(nodes[position - 1])
+        return label_map
+
+    def edit(self, start: int, end: int, lines: List[str]) -> None:
+        """Replace the lines from start up to end with lines, which inserts
+        them if start and end are the same and deletes the lines if there are
+        none"""
+        if not 0 <= start <= end <= len(self._lines):
+            raise IndexError(f'Lines {start} to {end} are not in a document of {len(self._lines)} lines')
+        read = [self._cached(text) for text in lines]
+        for index in range(start, end):
+            self._forget(index, self._read[index])
+
+        nodes = [_Node() for _ in lines]
+        before, rest = _split(self._root, start)
+        _, after = _split(rest, end - start)
+        self._root = _merge(_merge(before, _build(nodes)), after)
+        if self._root is not None:
+            self._root.parent = None
+        self._lines[start:end] = lines
+        self._read[start:end] = read
+        self._nodes[start:end] = nodes
+        self.statements[start:end] = [line.statement for line in read]
+
+        for index, (node, line) in enumerate(zip(nodes, read), start):
+            self._remember(index, node, line)
+        self._prune()
+
+    def _cached(self, text: str) -> _Line:
+        line = self._cache.get(text)
+        if line is None:
+            line = self._cache[text] = _read_line(text)
+        return line
+
+    def _marks(self, line: _Line) -> Optional[List[_Node]]:
+        # Where a line is kept track of, if it is
+        if line.label is not None:
+            return self._labels.setdefault(line.label, [])
+        elif line.tokens is None:
+            return self._errors
+        elif line.dot:
+            return self._dots
+        return None
+
+    def _forget(self, index: int, line: _Line) -> None:
+        marks = self._marks(line)
+        if marks is not None:
+            del marks[_position(marks, index)]
+            if not marks and line.label is not None:
+                del self._labels[line.label]
+
+    def _remember(self, index: int, node: _Node, line: _Line) -> None:
+        marks = self._marks(line)
+        if marks is not None:
+            marks.insert(_position(marks, index), node)
+
+    def _prune(self) -> None:
+        # Forget text no line has any more, once there is a lot of it, which
+        # costs about as much as reading the lines that made it did
+        if len(self._cache) > 2 * len(self._lines) + 1024:
+            self._cache = dict(zip(self._lines, self._read))
+
+    def tokens(self, index: int) -> List[GrinToken]:
+        """The tokens on a line, as parse() would give them.  Raises the
+        GrinLexError or GrinParseError that parse() would if it has an
+        error."""
+        tokens = self._read[index].tokens
+        if tokens is None:
+            # Raises the error, unless it was create_statement() that had one
+            return _parse_line(self._lines[index], index + 1)
+        elif index == 0:
+            return list(tokens)
+        return [GrinToken(
+                    kind = token.kind(), text = token.text(),
+                    location = GrinLocation(index + 1, token.location().column()), value = token.value())
+                for token in tokens]
+
+    def error(self, index: int) -> Optional[Exception]:
+        """The error on a line, if there is one"""
+        if self._read[index].tokens is not None:
+            return None
+        try:
+            tokens = _parse_line(self._lines[index], index + 1)
+            if len(tokens) >= 2 and tokens[1].kind() == GrinTokenKind.COLON:
+                tokens = tokens[2:]
+            create_statement(tokens)
+        except Exception as e:
+            return e
+        return None
+
+    def errors(self) -> List[Tuple[int, Exception]]:
+        """The index and error of every line of the program, up to its end,
+        that has one"""
+        end = self.end
+        indices = [_index(node) for node in self._errors[:_position(self._errors, end)]]
+        return [(index, self.error(index)) for index in indices]
+
+    def load(self, interpreter: GrinInterpreter) -> None:
+        """Load the program into an interpreter, as if its lines were read
+        by parse() and their statements added one by one.  Raises the error
+        on the first line that has one, if any does."""
+        end = self.end
+        if self._errors and _index(self._errors[0]) < end:
+            raise self.error(_index(self._errors[0]))
+        interpreter.statements = self.statements[:end]
+        interpreter.label_map = self.label_map
+        interpreter.line_map = None
+
+__all__ = [
+    GrinDocument.__name__,
+]
@@ -1,2 +1,30 @@
+from typing import Optional
+
 class GrinRuntimeError(Exception):
     pass
+
+class GrinLimitError(GrinRuntimeError):
+    """Raised when a running program goes past one of the limits it was run
+    with.  Records which limit it was, the line execution stopped at and how
+    many steps had been taken by then."""
+    def __init__(self, limit: str, reason: str, line: Optional[int] = None, steps: Optional[int] = None):
+        super().__init__(reason if line is None else f'{reason} at line {line}')
+        self.limit = limit  # One of STEP_LIMIT, TIME_LIMIT, DEPTH_LIMIT and OUTPUT_LIMIT
+        self.reason = reason
+        self.line = line
+        self.steps = steps
+
+# The kinds of limit
+STEP_LIMIT = 'steps'
+TIME_LIMIT = 'time'
+DEPTH_LIMIT = 'depth'
+OUTPUT_LIMIT = 'output'  # Raised by output sinks that cap or time out what is printed
+
+__all__ = [
+    GrinRuntimeError.__name__,
+    GrinLimitError.__name__,
+    'STEP_LIMIT',
+    'TIME_LIMIT',
+    'DEPTH_LIMIT',
+    'OUTPUT_LIMIT',
+]
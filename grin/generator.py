@@ -0,0 +1,206 @@
+"""Generates random but valid GRIN programs of any size, for testing the
+interpreter on programs too big to write by hand and finding out how it
+scales.  The same seed and settings always give the same program.
+
+Every generated program terminates without an error:
+
+  * Loops never nest, count a variable nothing else changes, and jump back
+    a fixed number of times.
+  * Subroutines are in levels.  One at level d only calls one at level d + 1,
+    so no chain of GOSUBs is longer than the depth asked for.
+  * Other jumps only skip forward.
+  * DIV only divides by non-zero literals, numbers never grow much faster
+    than the program runs, and strings never get longer than a few words.
+  * The program comes with exactly the input its INNUMs and INSTRs read.
+"""
+import random
+from typing import List, NamedTuple, Optional
+
+class GeneratedProgram(NamedTuple):
+    name: str
+    lines: List[str]  # Without a '.' line
+    inputs: List[str]  # What INNUM and INSTR will read
+
+_WORDS = ['alpha', 'bravo', 'charlie', 'delta', 'echo', 'foxtrot', 'golf', 'hotel']
+
+class _Generator:
+    def __init__(
+            self, seed: int, label_density: float, gosub_depth: int, loop_trips: int,
+            loop_density: float, io_ratio: float, input_ratio: float, variables: int):
+        self.random = random.Random(seed)
+        self.label_density = label_density
+        self.gosub_depth = gosub_depth
+        self.loop_trips = loop_trips
+        self.loop_density = loop_density
+        self.io_ratio = io_ratio
+        self.input_ratio = input_ratio
+        self.variables = variables
+        self.labels = 0
+        self.subroutines: List[List[str]] = []  # The labels of each level's subroutines
+        self.inputs: List[str] = []
+
+    def label(self) -> str:
+        self.labels += 1
+        return f'L{self.labels}'
+
+    def number(self) -> str:
+        return str(self.random.randint(-9, 9)) if self.random.random() < 0.8 else f'{self.random.uniform(-9, 9):.2f}'
+
+    def numeric(self) -> str:
+        return f'W{self.random.randrange(self.variables)}'
+
+    def string(self) -> str:
+        return f'S{self.random.randrange(self.variables)}'
+
+    def statement(self, reads: bool = True, single: bool = False) -> List[str]:
+        """A statement that doesn't jump, or a LET and another statement that
+        depends on it unless single is set.  Reads only when reads is set."""
+        random = self.random
+        if random.random() < self.io_ratio:
+            if reads and random.random() < self.input_ratio:
+                if random.random() < 0.5:
+                    return [f'INNUM {self.numeric()}']
+                return [f'INSTR {self.string()}']
+            choice = random.random()
+            if choice < 0.4:
+                return [f'PRINT {self.numeric()}']
+            if choice < 0.7:
+                return [f'PRINT {self.string()}']
+            return [f'PRINT "{random.choice(_WORDS)}"']
+
+        choice = random.random()
+        if single or choice < 0.45:
+            return [f'{random.choice(["ADD", "SUB"])} {self.numeric()} {self.number()}']
+        if choice < 0.6:
+            return [f'ADD T {self.numeric()}']
+        if choice < 0.7:
+            return [f'DIV {self.numeric()} {random.choice(["2", "3", "-4", "2.5"])}']
+        variable = self.numeric()
+        if choice < 0.85:
+            return [f'LET {variable} {self.number()}', f'MULT {variable} {self.number()}']
+        variable = self.string()
+        return [f'LET {variable} "{random.choice(_WORDS)}"', f'ADD {variable} "{random.choice(_WORDS)}"']
+
+    def read_inputs(self, lines: List[str]) -> None:
+        """Add the input that running these lines once reads"""
+        for line in lines:
+            keyword = line.split(':')[-1].split()[0]
+            if keyword == 'INNUM':
+                self.inputs.append(self.number())
+            elif keyword == 'INSTR':
+                self.inputs.append(self.random.choice(_WORDS))
+
+    def gosub(self, level: int) -> List[str]:
+        return [f'GOSUB {self.random.choice(self.subroutines[level])}']
+
+    def skip(self) -> List[str]:
+        """A conditional jump forward over a few statements"""
+        target = self.label()
+        skipped = []
+        for _ in range(self.random.randint(1, 3)):
+            skipped.extend(self.statement(reads = False))
+        condition = f'{self.numeric()} {self.random.choice("<>=")} {self.number()}'
+        landing = self.statement(reads = False, single = True)[0]
+        return [f'GOTO "{target}" IF {condition}', *skipped, f'{target}: {landing}']
+
+    def loop(self) -> List[str]:
+        """A loop that runs its body loop_trips times"""
+        head = self.label()
+        body = []
+        for _ in range(self.random.randint(2, 5)):
+            body.extend(self.statement())
+        if self.subroutines and self.random.random() < 0.3:
+            body.extend(self.gosub(0))
+        body[0] = f'{head}: {body[0]}'
+        for _ in range(self.loop_trips):
+            self.read_inputs(body)
+        return ['LET C 0', *body, 'ADD C 1', f'GOTO "{head}" IF C < {self.loop_trips}']
+
+    def chunk(self) -> List[str]:
+        random = self.random
+        choice = random.random()
+        if choice < self.loop_density:
+            return self.loop()
+        if choice < self.loop_density + 0.05:
+            return self.skip()
+        if self.subroutines and choice < self.loop_density + 0.1:
+            return self.gosub(0)
+        lines = self.statement()
+        self.read_inputs(lines)
+        return lines
+
+    def subroutine(self, label: str, level: int) -> List[str]:
+        lines = []
+        for _ in range(self.random.randint(1, 4)):
+            lines.extend(self.statement(reads = False))
+        if level + 1 < self.gosub_depth:
+            lines.extend(self.gosub(level + 1))
+        lines.append('RETURN')
+        lines[0] = f'{label}: {lines[0]}'
+        return lines
+
+    def sprinkle_labels(self, lines: List[str]) -> List[str]:
+        """Label label_density of the lines that don't already have one"""
+        return [
+            f'{self.label()}: {line}' if ':' not in line and self.random.random() < self.label_density else line
+            for line in lines
+        ]
+
+    def program(self, size: int, subroutines: int) -> GeneratedProgram:
+        self.subroutines = [
+            [f'P{level}X{index}' for index in range(subroutines)] for level in range(self.gosub_depth)
+        ]
+        tail = []
+        for level, labels in enumerate(self.subroutines):
+            for label in labels:
+                tail.extend(self.subroutine(label, level))
+
+        lines = ['LET T 0', 'LET C 0']
+        for index in range(self.variables):
+            lines.extend([f'LET W{index} {index}', f'LET S{index} "{_WORDS[index % len(_WORDS)]}"'])
+
+        body_size = size - len(lines) - len(tail) - 1
+        body: List[str] = []
+        while True:
+            inputs = len(self.inputs)
+            chunk = self.chunk()
+            if len(body) + len(chunk) > body_size:
+                del self.inputs[inputs:]
+                break
+            body.extend(chunk)
+        while len(body) < body_size:
+            # Fill up to exactly the size asked for
+            body.extend(self.statement(reads = False, single = True))
+
+        lines.extend(self.sprinkle_labels(body))
+        lines.append('END')
+        lines.extend(tail)
+        return GeneratedProgram(f'generated {len(lines)} lines', lines, self.inputs)
+
+def generate(
+        size: int, seed: int = 0, label_density: float = 0.1, gosub_depth: int = 3,
+        loop_trips: int = 10, loop_density: float = 0.02, io_ratio: float = 0.1,
+        input_ratio: float = 0.2, variables: int = 10, subroutines: Optional[int] = None) -> GeneratedProgram:
+    """Generate a program of size lines from seed.
+
+    label_density is the share of lines given a label of their own, on top
+    of those that jumps need.  gosub_depth is how deep GOSUBs nest (0 for
+    none), with subroutines of them at each level, by default one for every
+    thousand lines.  loop_density is the share of the program's pieces that
+    are loops, each running loop_trips times.  io_ratio is the share of
+    statements that are PRINT, INNUM or INSTR, and input_ratio the share of
+    those that read.  variables is how many numeric and string variables
+    there are of each."""
+    if subroutines is None:
+        subroutines = max(1, size // 1000)
+    generator = _Generator(
+        seed, label_density, gosub_depth, loop_trips, loop_density, io_ratio, input_ratio, variables)
+    program = generator.program(size, subroutines)
+    if len(program.lines) != size:
+        raise ValueError(f'{size} lines is too few for these settings, which need {len(program.lines)}')
+    return program
+
+__all__ = [
+    GeneratedProgram.__name__,
+    generate.__name__,
+]
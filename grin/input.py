@@ -0,0 +1,115 @@
+import sys
+from typing import BinaryIO, Iterable, Iterator, List, Optional
+
+class InputSource:
+    """Where a program and the input it reads come from.  readline() returns
+    the next line without its newline, raising EOFError when there are no
+    more, just as input() does."""
+    def readline(self) -> str:
+        raise NotImplementedError()
+
+    def __iter__(self) -> Iterator[str]:
+        while True:
+            try:
+                yield self.readline()
+            except EOFError:
+                return
+
+class ConsoleInput(InputSource):
+    """Reads each line with input(), which is best for interactive sessions"""
+    def readline(self) -> str:
+        return input()
+
+class StreamInput(InputSource):
+    """Reads a binary stream in large chunks and splits the lines itself.
+    With no stream, it reads sys.stdin.buffer."""
+    def __init__(self, stream: Optional[BinaryIO] = None, chunk_size: int = 65536, encoding: str = 'utf-8'):
+        self._stream = stream
+        self._chunk_size = chunk_size
+        self._encoding = encoding
+        self._lines: List[str] = []
+        self._position = 0
+        self._partial = b''  # The start of a line whose end hasn't been read
+        self._exhausted = False
+
+    def readline(self) -> str:
+        while self._position == len(self._lines):
+            if self._exhausted:
+                raise EOFError('EOF when reading a line')
+            self._fill()
+
+        line = self._lines[self._position]
+        self._position += 1
+        return line
+
+    def _fill(self) -> None:
+        stream = self._stream if self._stream is not None else sys.stdin.buffer
+        # read1() returns whatever is available rather than waiting for a
+        # whole chunk, so reading from a terminal or a pipe doesn't stall
+        read = getattr(stream, 'read1', stream.read)
+        chunk = read(self._chunk_size)
+
+        if not chunk:
+            self._exhausted = True
+            data, self._partial = self._partial, b''
+            if not data:
+                self._lines, self._position = [], 0
+                return
+            data += b'\n'
+        else:
+            data = self._partial + chunk
+            end = data.rfind(b'\n') + 1
+            data, self._partial = data[:end], data[end:]
+
+        text = data.decode(self._encoding)
+        if '\r' in text:
+            text = text.replace('\r\n', '\n')
+        self._lines = text.split('\n')
+        self._lines.pop()  # The empty string after the last newline
+        self._position = 0
+
+class FileInput(StreamInput):
+    """Reads the lines of a file in large chunks"""
+    def __init__(self, path: str, chunk_size: int = 65536, encoding: str = 'utf-8'):
+        self._file = open(path, 'rb')
+        super().__init__(self._file, chunk_size, encoding)
+
+    def close(self) -> None:
+        self._file.close()
+
+class ListInput(InputSource):
+    """Hands out lines that are already in memory"""
+    def __init__(self, lines: Iterable[str]):
+        self._lines = list(lines)
+        self._position = 0
+
+    def readline(self) -> str:
+        if self._position == len(self._lines):
+            raise EOFError('EOF when reading a line')
+        line = self._lines[self._position]
+        self._position += 1
+        return line
+
+class ChainedInput(InputSource):
+    """Reads each of several sources to its end in turn, as if they were
+    one, like cat does"""
+    def __init__(self, sources: Iterable[InputSource]):
+        self._sources = list(sources)
+        self._current = 0
+
+    def readline(self) -> str:
+        while self._current < len(self._sources):
+            try:
+                return self._sources[self._current].readline()
+            except EOFError:
+                self._current += 1
+        raise EOFError('EOF when reading a line')
+
+__all__ = [
+    InputSource.__name__,
+    ConsoleInput.__name__,
+    StreamInput.__name__,
+    FileInput.__name__,
+    ListInput.__name__,
+    ChainedInput.__name__,
+]
@@ -1,20 +1,103 @@
-from typing import Dict, Any, List, Optional
+import collections
+import itertools
+import math
+import operator
+import sys
+import time
+from typing import Deque, Dict, Any, FrozenSet, Generator, List, Optional, Tuple
+from grin.cfg import build_cfg, fuse
+from grin.exceptions import GrinLimitError, STEP_LIMIT, TIME_LIMIT, DEPTH_LIMIT
+from grin.input import InputSource, ConsoleInput
+from grin.optimizer import OptimizationReport, optimize
+from grin.output import OutputSink, BufferedOutput
+from grin.symbols import SymbolTable, Variables
 from grin.token import GrinToken, GrinTokenKind
 from grin.statements import (
-    Statement, LabeledStatement, LetStatement, PrintStatement,
-    InNumStatement, InStrStatement, ArithmeticStatement,
+    Statement, LabeledStatement, CompiledStatement, ProgramContext, StatementFault,
+    LetStatement, PrintStatement, InNumStatement, InStrStatement, ArithmeticStatement,
     GotoStatement, GosubStatement, ReturnStatement, EndStatement
 )
 
+# The clock is read once every this many steps, which is also how many
+# step() runs by default
+_CHECK_INTERVAL = 4096
+
+class _Finished(Exception):
+    """Raised when a program run by step() reaches its end"""
+    pass
+
+def _finish() -> None:
+    raise _Finished()
+
+class _InputNeeded(Exception):
+    """Raised by INNUM and INSTR in a stepped program that has no input"""
+    pass
+
+class _SessionInput(InputSource):
+    """Where INNUM and INSTR read from in a program run with step(): the
+    lines fed to it, then, while run() is running it, its input source.
+    Otherwise, a statement reading with none left suspends the program."""
+    def __init__(self):
+        self.lines: Deque[str] = collections.deque()
+        self.source: Optional[InputSource] = None
+        self.error: Optional[Exception] = None  # Raised by the next read
+        self.count = 0  # How many lines have been read
+
+    def readline(self) -> str:
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+        elif self.lines:
+            line = self.lines.popleft()
+        elif self.source is not None:
+            line = self.source.readline()
+        else:
+            raise _InputNeeded()
+        self.count += 1
+        return line
+
+# Why step() stopped
+RUNNING = 'running'  # It ran all of the steps it was asked to
+WAITING = 'waiting'  # It needs a line of input
+FINISHED = 'finished'  # The program ended
+
 class GrinInterpreter:
     """GRIN language interpreter"""
     
-    def __init__(self):
-        self.variables: Dict[str, Any] = {}
+    def __init__(self, output: Optional[OutputSink] = None, input: Optional[InputSource] = None):
+        # Where PRINT goes; by default, a buffer in front of sys.stdout that
+        # is flushed when the program stops or reads input
+        self.output = output if output is not None else BufferedOutput()
+        # Where INNUM and INSTR read from; by default, input()
+        self.input = input if input is not None else ConsoleInput()
+        self.symbols = SymbolTable()
         self.statements: List[LabeledStatement] = []
         self.current_line = 0
         self.return_stack: List[int] = []
         self.label_map: Dict[str, int] = {}
+        # Once optimized, the index each statement had as it was loaded
+        self.line_map: Optional[List[int]] = None
+        # The program being run by step(), the limits it was started with,
+        # the indices of its GOSUBs that can be taken, how many steps it has
+        # taken and how much time it has left
+        self._program: Optional[List[CompiledStatement]] = None
+        self._limits: Tuple[Optional[int], Optional[float], Optional[int]] = (None, None, None)
+        self._calls: FrozenSet[int] = frozenset()
+        self._steps = 0
+        self._time_left = math.inf
+        self._finished = False  # Whether that program has ended
+        self._input = _SessionInput()
+
+    @property
+    def variables(self) -> Variables:
+        """A dict-compatible view of the variables, which live in slots"""
+        return Variables(self.symbols)
+
+    @variables.setter
+    def variables(self, variables: Dict[str, Any]) -> None:
+        view = Variables(self.symbols)
+        view.clear()
+        view.update(variables)
 
     def add_statement(self, statement: LabeledStatement) -> None:
         """Add a statement to the program and update label map if needed"""
@@ -22,47 +105,239 @@ class GrinInterpreter:
             self.label_map[statement.label] = len(self.statements)
         self.statements.append(statement)
 
+    def optimize(self) -> OptimizationReport:
+        """Rewrite the program with constants propagated and unreachable
+        statements removed.  Errors are still reported against the line
+        numbers the program was loaded with."""
+        program = optimize(self.statements, self.label_map)
+        if self.line_map is not None:
+            program = program._replace(line_map = [self.line_map[index] for index in program.line_map])
+        self.statements = program.statements
+        self.label_map = program.label_map
+        self.line_map = program.line_map
+        return program.report
+
+    def line_number(self, index: int) -> int:
+        """The line number to report for the statement at index"""
+        if self.line_map is None or index >= len(self.line_map):
+            return index + 1
+        return self.line_map[index] + 1
+
+    def context(self) -> ProgramContext:
+        """The program context statements are compiled against"""
+        return ProgramContext(
+            self.label_map, len(self.statements), self.return_stack, self.symbols, self.output, self.input)
+
     def handle_control_flow(self, result: str) -> None:
-        """Handle control flow instructions"""
-        if result == "END":
-            self.current_line = len(self.statements)  # Force program end
-        elif result == "RETURN":
-            if not self.return_stack:
-                raise RuntimeError("RETURN without GOSUB")
-            self.current_line = self.return_stack.pop()
-        elif result.startswith("GOSUB:"):
-            label = result[6:]
-            if label not in self.label_map:
-                raise RuntimeError(f"Label '{label}' not found")
-            self.return_stack.append(self.current_line + 1)
-            self.current_line = self.label_map[label]
-        else:  # GOTO
-            try:
-                target = int(result)
-                if target <= 0 or target > len(self.statements) + 1:
-                    raise RuntimeError(f"Invalid GOTO target: {target}")
-                self.current_line = target - 1  # Adjust for 0-based index
-            except ValueError:
-                if result not in self.label_map:
-                    raise RuntimeError(f"Label '{result}' not found")
-                self.current_line = self.label_map[result]
-
-    def run(self) -> None:
-        """Execute the program"""
+        """Handle a control flow string returned by Statement.execute()"""
+        self.current_line = self.context().follow(self.current_line, result)
+
+    def compile(
+            self, superinstructions: bool = False, context: Optional[ProgramContext] = None
+            ) -> List[CompiledStatement]:
+        """Compile every statement into a closure, once, before running.
+        Literal GOTO and GOSUB targets are resolved to indices here, and
+        every variable is given its slot.  With superinstructions, common
+        runs of statements are also fused into single closures.  The
+        statements are compiled against context, or self.context()."""
+        if context is None:
+            context = self.context()
+        program = [labeled.statement.compile(index, context)
+                   for index, labeled in enumerate(self.statements)]
+        if superinstructions:
+            fuse(program, build_cfg(self.statements, self.label_map), context)
+        return program
+
+    def run(
+            self, max_steps: Optional[int] = None, time_limit: Optional[float] = None,
+            max_depth: Optional[int] = None) -> None:
+        """Execute the program.  If max_steps (statements run), time_limit
+        (seconds) or max_depth (GOSUBs not yet returned from) is given, a
+        GrinLimitError is raised when the program goes past it.  This is
+        step() run to the end, with INNUM and INSTR waiting on self.input
+        rather than suspending the program."""
+        self.start(max_steps, time_limit, max_depth)
+        try:
+            while self.step(sys.maxsize, wait = True) != FINISHED:
+                pass
+        finally:
+            self.output.flush()
+
+    def start(
+            self, max_steps: Optional[int] = None, time_limit: Optional[float] = None,
+            max_depth: Optional[int] = None) -> None:
+        """Compile the program and get it ready to run from its first
+        statement with step(), with the same limits as run().  Only the time
+        spent in step() counts towards time_limit."""
+        self._input = _SessionInput()
+        context = self.context()
+        context.input = self._input
+        # A superinstruction runs as one step, so with a step limit nothing is
+        # fused, and every statement run counts
+        program = self.compile(superinstructions = max_steps is None, context = context)
+        program.append(_finish)  # Every way of ending the program lands here
+        self._program = program
+        self._limits = (max_steps, time_limit, max_depth)
+        self._calls = frozenset(
+            index for index, labeled in enumerate(self.statements)
+            if isinstance(labeled.statement, GosubStatement) and labeled.statement.target.text() in self.label_map)
+        self._steps = 0
+        self._time_left = time_limit if time_limit is not None else math.inf
+        self._finished = False
         self.current_line = 0
-        while self.current_line < len(self.statements):
+
+    @property
+    def steps(self) -> int:
+        """How many steps the program run by step() has taken"""
+        return self._steps
+
+    @steps.setter
+    def steps(self, steps: int) -> None:
+        self._steps = steps
+
+    @property
+    def lines_read(self) -> int:
+        """How many lines of input the program run by step() has read"""
+        return self._input.count
+
+    @lines_read.setter
+    def lines_read(self, count: int) -> None:
+        self._input.count = count
+
+    def feed(self, line: str) -> None:
+        """Give a line of input to the program, for when it next reads one"""
+        self._input.lines.append(line)
+
+    def step(self, count: int = _CHECK_INTERVAL, wait: bool = False) -> str:
+        """Run at most count more steps of the program started by start(),
+        which is started with no limits if it hasn't been, and say why it
+        stopped:  RUNNING when it used up its steps, WAITING when it needs a
+        line of input, which is given with feed(), and FINISHED when it has
+        ended, after which it runs nothing more and is FINISHED until
+        start() is called again.  With wait, a program with no input fed to
+        it reads from self.input, as run() does, rather than stop WAITING.
+        Output is flushed unless it is still RUNNING.
+
+        Steps are counted by running the loop a chunk of steps at a time with
+        a for loop, which costs less than a while loop counting each one; the
+        clock is read between chunks.  A GOSUB adds at most one return address
+        a step, so with a depth limit no chunk is longer than the room left
+        on the return stack, and the depth is checked between chunks too.
+        Without a step limit, a superinstruction counts as one step; with one,
+        start() fuses nothing, so that every statement run is a step."""
+        if self._program is None:
+            if self._finished:
+                return FINISHED
+            self.start()
+        self._input.source = self.input if wait else None
+        program = self._program
+        max_steps, time_limit, max_depth = self._limits
+        calls, return_stack = self._calls, self.return_stack
+        budget = max_steps if max_steps is not None else sys.maxsize
+        stop = min(budget, self._steps + count)
+        started = time.monotonic()
+        deadline = started + self._time_left
+        pc, steps, chunk = self.current_line, self._steps, 0
+        countdown = itertools.repeat(None, 0)
+        status = RUNNING
+        try:
+            while True:
+                if steps == budget:
+                    if program[pc] is _finish:
+                        # It ended with the last step it was allowed
+                        status = FINISHED
+                        break
+                    raise GrinLimitError(STEP_LIMIT, f'Step limit of {max_steps} reached')
+                elif steps == stop:
+                    break
+                elif time.monotonic() > deadline:
+                    raise GrinLimitError(TIME_LIMIT, f'Time limit of {time_limit}s reached')
+
+                chunk = min(stop - steps, _CHECK_INTERVAL)
+                if max_depth is not None:
+                    room = max_depth - len(return_stack)
+                    if room <= 0:
+                        if pc in calls:
+                            raise GrinLimitError(DEPTH_LIMIT, f'GOSUB depth limit of {max_depth} exceeded')
+                        # A step at a time, until a RETURN makes room
+                        room = 1
+                    chunk = min(chunk, room)
+                # repeat() is used rather than range() so that no integers
+                # are created; how far it got can still be worked out
+                countdown = itertools.repeat(None, chunk)
+                for _ in countdown:
+                    target = program[pc]()
+                    if target is None:
+                        pc += 1
+                    else:
+                        pc = target
+                steps += chunk
+        except _Finished:
+            steps += chunk - operator.length_hint(countdown) - 1  # Ending isn't a step
+            status = FINISHED
+        except Exception as e:
+            if isinstance(e, StatementFault) and isinstance(e.error, (GrinLimitError, _InputNeeded)):
+                # Partway through a superinstruction, such as at one of its
+                # PRINTs; the statements in it can also be run on their own
+                pc += e.offset
+                e = e.error
+            if not isinstance(e, (GrinLimitError, _InputNeeded)):
+                pc = self.report_error(pc, e)
+                status = FINISHED
+            else:
+                if not (isinstance(e, GrinLimitError) and e.limit in (STEP_LIMIT, TIME_LIMIT, DEPTH_LIMIT)):
+                    # Stopped by a statement rather than between chunks, and
+                    # it doesn't count as a step; one waiting for input is run
+                    # again once there is some
+                    steps += chunk - operator.length_hint(countdown) - 1
+                if isinstance(e, GrinLimitError):
+                    status = FINISHED
+                    raise GrinLimitError(e.limit, e.reason, self.line_number(pc), steps)
+                status = WAITING
+        finally:
+            self.current_line = pc
+            self._steps = steps
+            self._time_left -= time.monotonic() - started
+            if status == FINISHED:
+                self._program = None
+                self._finished = True
+            if status != RUNNING:
+                self.output.flush()
+        return status
+
+    def session(
+            self, count: int = _CHECK_INTERVAL, max_steps: Optional[int] = None,
+            time_limit: Optional[float] = None, max_depth: Optional[int] = None
+            ) -> Generator[str, Optional[str], None]:
+        """Run the program as a generator, which yields RUNNING after every
+        count steps, so that other work can be done in between, and
+        WAITING when the program needs a line of input, which is then sent
+        in with send().  Throwing an exception into it while it is WAITING,
+        such as an EOFError, makes the statement reading input fail with it.
+        It returns when the program ends."""
+        self.start(max_steps, time_limit, max_depth)
+        while True:
+            status = self.step(count)
+            if status == FINISHED:
+                return
             try:
-                result = self.statements[self.current_line].statement.execute(self.variables)
-                
-                if result is None:
-                    self.current_line += 1
-                else:
-                    self.handle_control_flow(result)
-                    
+                line = yield status
             except Exception as e:
-                print(f"Error at line {self.current_line + 1}: {str(e)}")
-                break
+                if status != WAITING:
+                    raise
+                self._input.error = e
+            else:
+                if status == WAITING and line is not None:
+                    self.feed(line)
 
+    def report_error(self, pc: int, error: Exception) -> int:
+        """Print the error that stopped the program at pc, returning the index
+        of the statement that actually failed.  For use by run loops."""
+        if isinstance(error, StatementFault):
+            pc += error.offset
+            error = error.error
+        self.output.write(f"Error at line {self.line_number(pc)}: {str(error)}\n")
+        return pc
 
 def create_statement(tokens: List[GrinToken]) -> Statement:
     """Create appropriate statement object based on tokens"""
@@ -114,3 +389,11 @@ def create_statement(tokens: List[GrinToken]) -> Statement:
             return statement_type(tokens[1], tokens[2])
     else:  # If it's a lambda function
         return statement_type(tokens)
+
+__all__ = [
+    GrinInterpreter.__name__,
+    create_statement.__name__,
+    'RUNNING',
+    'WAITING',
+    'FINISHED',
+]
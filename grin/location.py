@@ -13,6 +13,7 @@
 
 class GrinLocation:
     """Describes a location within the text of a Grin program"""
+    __slots__ = ('_line', '_column')
 
     def __init__(self, line, column):
         if int(line) < 1:
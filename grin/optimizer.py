@@ -0,0 +1,219 @@
+import operator
+from typing import Any, Dict, List, NamedTuple, Tuple
+from grin.cfg import build_cfg, ControlFlowGraph
+from grin.location import GrinLocation
+from grin.statements import (
+    LabeledStatement, LetStatement, PrintStatement, InNumStatement, InStrStatement,
+    ArithmeticStatement, GotoStatement, GosubStatement, ReturnStatement, EndStatement
+)
+from grin.token import GrinToken, GrinTokenKind
+
+class OptimizationReport:
+    """What the optimizer did, in terms of the line numbers of the program as
+    it was loaded"""
+    def __init__(self):
+        self.removed: List[Tuple[int, str]] = []
+        self.folded: List[Tuple[int, str, str]] = []
+        self.propagated: List[Tuple[int, str, str]] = []
+
+    def __str__(self) -> str:
+        lines = [f'Removed {len(self.removed)} unreachable statement(s)']
+        lines.extend(f'  line {line}: {text}' for line, text in self.removed)
+        lines.append(f'Folded {len(self.folded)} statement(s)')
+        lines.extend(f'  line {line}: {before} -> {after}' for line, before, after in self.folded)
+        lines.append(f'Propagated constants into {len(self.propagated)} statement(s)')
+        lines.extend(f'  line {line}: {before} -> {after}' for line, before, after in self.propagated)
+        return '\n'.join(lines)
+
+class OptimizedProgram(NamedTuple):
+    statements: List[LabeledStatement]
+    label_map: Dict[str, int]
+    # For each optimized statement, the index it had before optimizing
+    line_map: List[int]
+    report: OptimizationReport
+
+_FOLDABLE_OPERATIONS = {
+    'ADD': operator.iadd,
+    'SUB': operator.isub,
+    'MULT': operator.imul,
+}
+
+_KEYWORDS = {
+    LetStatement: 'LET',
+    PrintStatement: 'PRINT',
+    InNumStatement: 'INNUM',
+    InStrStatement: 'INSTR',
+    GotoStatement: 'GOTO',
+    GosubStatement: 'GOSUB',
+    ReturnStatement: 'RETURN',
+    EndStatement: 'END',
+}
+
+def describe(statement: Any) -> str:
+    """The statement, written out roughly as it would appear in a program"""
+    if isinstance(statement, ArithmeticStatement):
+        return f'{statement.operation} {statement.variable.text()} {statement.value.text()}'
+    elif isinstance(statement, GotoStatement) and statement.condition:
+        return f'GOTO {statement.target.text()} IF {statement.left.text()} ' \
+            f'{statement.condition} {statement.right.text()}'
+
+    parts = [_KEYWORDS.get(type(statement), type(statement).__name__)]
+    for attribute in ('variable', 'value', 'target'):
+        token = getattr(statement, attribute, None)
+        if token is not None:
+            parts.append(token.text())
+    return ' '.join(parts)
+
+def _literal(value: Any, location: GrinLocation) -> GrinToken:
+    """A token for a literal value, as if it had been written in the program"""
+    if isinstance(value, str):
+        return GrinToken(kind = GrinTokenKind.LITERAL_STRING, text = f'"{value}"', location = location, value = value)
+    elif isinstance(value, float):
+        return GrinToken(kind = GrinTokenKind.LITERAL_FLOAT, text = repr(value), location = location, value = value)
+    else:
+        return GrinToken(kind = GrinTokenKind.LITERAL_INTEGER, text = str(value), location = location, value = value)
+
+def _is_variable(token: GrinToken) -> bool:
+    return token.kind() == GrinTokenKind.IDENTIFIER
+
+class _Propagator:
+    def __init__(self, report: OptimizationReport):
+        self._report = report
+        self._known: Dict[str, Any] = {}
+
+    def run(self, statements: List[Any], cfg: ControlFlowGraph) -> List[Any]:
+        """Propagate constants through each block, starting afresh at every
+        block since it might be entered from anywhere"""
+        result = list(statements)
+        for block in cfg.blocks:
+            self._known = {}
+            for index in block.indices():
+                result[index] = self._statement(index, statements[index])
+        return result
+
+    def _substitute(self, token: GrinToken) -> GrinToken:
+        if _is_variable(token) and token.text() in self._known:
+            return _literal(self._known[token.text()], token.location())
+        return token
+
+    def _operand(self, token: GrinToken) -> Tuple[bool, Any]:
+        if not _is_variable(token):
+            return True, token.value()
+        elif token.text() in self._known:
+            return True, self._known[token.text()]
+        return False, None
+
+    def _statement(self, index: int, statement: Any) -> Any:
+        kind = type(statement)
+
+        if kind is LetStatement:
+            name = statement.variable.text()
+            value = self._substitute(statement.value)
+            if _is_variable(value):
+                self._known.pop(name, None)
+                return statement
+            self._known[name] = value.value()
+            return self._replace(index, statement, LetStatement(statement.variable, value), self._report.propagated)
+        elif kind is ArithmeticStatement:
+            return self._arithmetic(index, statement)
+        elif kind is PrintStatement:
+            return self._replace(index, statement, PrintStatement(self._substitute(statement.value)), self._report.propagated)
+        elif kind is GotoStatement and statement.condition:
+            replacement = GotoStatement(
+                statement.target, statement.condition,
+                self._substitute(statement.left), self._substitute(statement.right))
+            return self._replace(index, statement, replacement, self._report.propagated)
+        elif kind in (InNumStatement, InStrStatement):
+            self._known.pop(statement.variable.text(), None)
+            return statement
+        elif kind in (GotoStatement, GosubStatement, ReturnStatement, EndStatement):
+            return statement
+        else:
+            # Something we don't know the effects of
+            self._known = {}
+            return statement
+
+    def _arithmetic(self, index: int, statement: ArithmeticStatement) -> Any:
+        name = statement.variable.text()
+        known_operand, operand = self._operand(statement.value)
+
+        if known_operand and name in self._known:
+            current = self._known[name]
+            try:
+                if statement.operation == 'DIV':
+                    if operand == 0:
+                        raise ZeroDivisionError()  # Leave it to fail when it runs
+                    result = current / operand
+                else:
+                    result = _FOLDABLE_OPERATIONS[statement.operation](current, operand)
+            except Exception:
+                pass
+            else:
+                self._known[name] = result
+                folded = LetStatement(statement.variable, _literal(result, statement.variable.location()))
+                return self._replace(index, statement, folded, self._report.folded)
+
+        self._known.pop(name, None)
+        replacement = ArithmeticStatement(statement.operation, statement.variable, self._substitute(statement.value))
+        return self._replace(index, statement, replacement, self._report.propagated)
+
+    def _replace(self, index: int, before: Any, after: Any, record: List[Tuple[int, str, str]]) -> Any:
+        before_text, after_text = describe(before), describe(after)
+        if before_text == after_text:
+            return before
+        record.append((index + 1, before_text, after_text))
+        return after
+
+def _renumber_goto(statement: GotoStatement, renumber: Dict[int, int]) -> GotoStatement:
+    """Rewrite a literal GOTO's target so that it still lands on the same
+    statement once others have been removed"""
+    token = statement.target
+    if _is_variable(token):
+        return statement
+
+    try:
+        line = int(token.value())
+    except (TypeError, ValueError):
+        return statement  # A label, which the label map takes care of
+
+    if line not in renumber:
+        return statement  # An invalid target, which must stay invalid
+    elif isinstance(token.value(), str):
+        target = _literal(str(renumber[line]), token.location())
+    else:
+        target = _literal(renumber[line], token.location())
+    return GotoStatement(target, statement.condition, statement.left, statement.right)
+
+def optimize(statements: List[LabeledStatement], label_map: Dict[str, int]) -> OptimizedProgram:
+    """Propagate constants through straight-line code, fold arithmetic whose
+    operands are all known, and remove statements that can never run"""
+    report = OptimizationReport()
+    cfg = build_cfg(statements, label_map)
+    propagated = _Propagator(report).run([labeled.statement for labeled in statements], cfg)
+
+    reachable = cfg.reachable()
+    kept = [index for index in range(len(statements)) if cfg.block_of(index).number in reachable]
+    report.removed = [(index + 1, describe(statements[index].statement))
+                      for index in range(len(statements)) if cfg.block_of(index).number not in reachable]
+
+    # GOTO line numbers are absolute, so they are renumbered to match; a GOTO
+    # to the line just past the end still means the end
+    new_index = {old: new for new, old in enumerate(kept)}
+    renumber = {old + 1: new + 1 for old, new in new_index.items()}
+    renumber[len(statements) + 1] = len(kept) + 1
+
+    optimized = []
+    for index in kept:
+        statement = propagated[index]
+        if isinstance(statement, GotoStatement):
+            statement = _renumber_goto(statement, renumber)
+        optimized.append(LabeledStatement(statements[index].label, statement))
+
+    optimized_labels = {label: new_index[index] for label, index in label_map.items() if index in new_index}
+    return OptimizedProgram(optimized, optimized_labels, kept, report)
+
+__all__ = [
+    OptimizationReport.__name__,
+    OptimizedProgram.__name__,
+    optimize.__name__,
+]
@@ -0,0 +1,79 @@
+import sys
+from typing import List, Optional, TextIO
+
+class OutputSink:
+    """Where the output of a running program goes.  Statements call write()
+    with text that already ends in a newline; flush() is called before the
+    program reads input and when it stops."""
+    def write(self, text: str) -> None:
+        raise NotImplementedError()
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.flush()
+
+class BufferedOutput(OutputSink):
+    """Collects output and writes it to a stream in large pieces.  With no
+    stream, it writes to whatever sys.stdout is when it flushes."""
+    def __init__(self, stream: Optional[TextIO] = None, buffer_size: int = 65536):
+        self._stream = stream
+        self._buffer_size = buffer_size
+        self._parts: List[str] = []
+        self._size = 0
+
+    def write(self, text: str) -> None:
+        self._parts.append(text)
+        self._size += len(text)
+        if self._size >= self._buffer_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if self._parts:
+            stream = self._stream if self._stream is not None else sys.stdout
+            stream.write(''.join(self._parts))
+            stream.flush()
+            self._parts.clear()
+            self._size = 0
+
+class UnbufferedOutput(OutputSink):
+    """Writes every line as soon as it is printed, for interactive sessions.
+    With no stream, it writes to whatever sys.stdout is at the time."""
+    def __init__(self, stream: Optional[TextIO] = None):
+        self._stream = stream
+
+    def write(self, text: str) -> None:
+        stream = self._stream if self._stream is not None else sys.stdout
+        stream.write(text)
+        stream.flush()
+
+class MemoryOutput(OutputSink):
+    """Keeps all of the output in memory, for batch jobs and tests"""
+    def __init__(self):
+        self._parts: List[str] = []
+
+    def write(self, text: str) -> None:
+        self._parts.append(text)
+
+    def getvalue(self) -> str:
+        """Everything written so far"""
+        return ''.join(self._parts)
+
+class FileOutput(BufferedOutput):
+    """Buffers output into a file, which close() closes"""
+    def __init__(self, path: str, buffer_size: int = 65536):
+        self._file = open(path, 'w', encoding = 'utf-8')
+        super().__init__(self._file, buffer_size)
+
+    def close(self) -> None:
+        self.flush()
+        self._file.close()
+
+__all__ = [
+    OutputSink.__name__,
+    BufferedOutput.__name__,
+    UnbufferedOutput.__name__,
+    MemoryOutput.__name__,
+    FileOutput.__name__,
+]
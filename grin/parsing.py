@@ -14,7 +14,7 @@
 # and it should not be necessary to change it.
 
 from typing import Callable, Iterable, NoReturn
-from grin.lexing import to_tokens
+from grin.scanner import to_tokens
 from grin.location import GrinLocation
 from grin.token import GrinTokenKind, GrinToken
 
@@ -0,0 +1,143 @@
+import json
+import time
+from typing import Any, Dict, List, Optional, TextIO
+from grin.interpreter import GrinInterpreter
+from grin.optimizer import describe
+from grin.statements import GosubStatement, ReturnStatement
+
+class LineProfile:
+    """How often one line ran and how long it took altogether"""
+    def __init__(self, line: int, statement: str, count: int, time: float):
+        self.line = line
+        self.statement = statement
+        self.count = count
+        self.time = time
+
+class SubroutineProfile:
+    """The calls made to the subroutine at one label.  Inclusive time covers
+    everything that ran until it returned, exclusive time leaves out the time
+    spent in the subroutines it called."""
+    def __init__(self, label: str):
+        self.label = label
+        self.calls = 0
+        self.inclusive = 0.0
+        self.exclusive = 0.0
+
+class Profile:
+    """The result of profiling one run of a program"""
+    def __init__(self, lines: List[LineProfile], subroutines: List[SubroutineProfile], total_time: float):
+        self.lines = lines
+        self.subroutines = subroutines
+        self.total_time = total_time
+
+    def report(self, limit: Optional[int] = None) -> str:
+        """A text report, hottest lines first"""
+        lines = sorted(self.lines, key = lambda line: (-line.time, line.line))[:limit]
+        total = self.total_time or 1.0
+        steps = sum(line.count for line in self.lines)
+
+        report = [f'{steps} statements in {self.total_time:.6f}s', '']
+        report.append(f'{"Line":>6} {"Count":>10} {"Time (s)":>12} {"% time":>7}  Statement')
+        for line in lines:
+            report.append(
+                f'{line.line:>6} {line.count:>10} {line.time:>12.6f} '
+                f'{line.time / total * 100:>6.1f}%  {line.statement}')
+
+        if self.subroutines:
+            subroutines = sorted(self.subroutines, key = lambda subroutine: -subroutine.inclusive)
+            report.append('')
+            report.append(f'{"Subroutine":<16} {"Calls":>10} {"Inclusive (s)":>14} {"Exclusive (s)":>14}')
+            for subroutine in subroutines:
+                report.append(
+                    f'{subroutine.label:<16} {subroutine.calls:>10} '
+                    f'{subroutine.inclusive:>14.6f} {subroutine.exclusive:>14.6f}')
+
+        return '\n'.join(report)
+
+    def to_json(self) -> Dict[str, Any]:
+        """The profile as plain data, ready for json.dump()"""
+        return {
+            'total_time': self.total_time,
+            'lines': [vars(line) for line in self.lines],
+            'subroutines': [vars(subroutine) for subroutine in self.subroutines],
+        }
+
+    def dump(self, file: TextIO) -> None:
+        """Write the profile to a file as JSON"""
+        json.dump(self.to_json(), file, indent = 2)
+
+def profile(interpreter: GrinInterpreter) -> Profile:
+    """Run an interpreter's program the way GrinInterpreter.run() does,
+    timing every statement.  This is a run loop of its own, so that running
+    without the profiler costs nothing extra; superinstructions aren't used,
+    so that every line gets its own numbers."""
+    program = interpreter.compile()
+    statements = [labeled.statement for labeled in interpreter.statements]
+    # The label each GOSUB calls, and which statements are RETURNs
+    calls = [statement.target.text() if isinstance(statement, GosubStatement) else None
+             for statement in statements]
+    returns = [isinstance(statement, ReturnStatement) for statement in statements]
+
+    end = len(program)
+    counts = [0] * end
+    times = [0.0] * end
+    subroutines: Dict[str, SubroutineProfile] = {}
+    active: Dict[str, int] = {}  # How many calls to each label haven't returned
+    frames: List[List[Any]] = []  # [label, started, time spent in callees]
+    clock = time.perf_counter
+
+    def leave(now: float) -> None:
+        label, started, in_callees = frames.pop()
+        elapsed = now - started
+        subroutine = subroutines[label]
+        subroutine.exclusive += elapsed - in_callees
+        active[label] -= 1
+        if not active[label]:
+            subroutine.inclusive += elapsed  # Only the outermost of recursive calls
+        if frames:
+            frames[-1][2] += elapsed
+
+    started = clock()
+    pc = 0
+    try:
+        while pc < end:
+            before = clock()
+            target = program[pc]()
+            after = clock()
+            counts[pc] += 1
+            times[pc] += after - before
+
+            if target is None:
+                pc += 1
+                continue
+
+            label = calls[pc]
+            if label is not None:
+                if label not in subroutines:
+                    subroutines[label] = SubroutineProfile(label)
+                subroutines[label].calls += 1
+                active[label] = active.get(label, 0) + 1
+                frames.append([label, after, 0.0])
+            elif returns[pc] and frames:
+                leave(after)
+            pc = target
+    except Exception as e:
+        pc = interpreter.report_error(pc, e)
+    finally:
+        interpreter.output.flush()
+
+    finished = clock()
+    while frames:
+        leave(finished)  # Subroutines that never returned
+    interpreter.current_line = pc
+
+    lines = [LineProfile(interpreter.line_number(index), describe(statements[index]), counts[index], times[index])
+             for index in range(end) if counts[index]]
+    return Profile(lines, list(subroutines.values()), finished - started)
+
+__all__ = [
+    LineProfile.__name__,
+    SubroutineProfile.__name__,
+    Profile.__name__,
+    profile.__name__,
+]
@@ -0,0 +1,119 @@
+import collections
+import sys
+import threading
+from types import FrameType
+from typing import Counter, Optional, TextIO, Tuple
+from grin.interpreter import GrinInterpreter
+from grin.statements import GosubStatement
+
+# The run loop keeps the index of the running statement in a local called pc,
+# rather than in GrinInterpreter.current_line, which is only brought up to
+# date when it stops.  These are the loops the sampler knows to look in.
+_RUN_LOOPS = {
+    GrinInterpreter.step.__code__,
+}
+
+class SamplingProfiler:
+    """Samples where a running program is from a background thread, every
+    interval seconds, building up how often each stack of GOSUB labels and
+    line was seen.  Use it around GrinInterpreter.run() on the same thread
+    that calls start():
+
+        with SamplingProfiler(interpreter):
+            interpreter.run()
+
+    Each sample only copies the return stack and the index of the line, and
+    is added to samples once sampling stops, so that the thread holds the
+    GIL as briefly as it can."""
+    def __init__(self, interpreter: GrinInterpreter, interval: float = 0.01):
+        self.interpreter = interpreter
+        self.interval = interval
+        self.samples: Counter[Tuple[str, ...]] = collections.Counter()
+        # The return stack and index of each sample not yet in samples
+        self._raw: Counter[Tuple[Tuple[int, ...], int]] = collections.Counter()
+        # The frame of the run loop last found running the program
+        self._loop: Optional[FrameType] = None
+        self._thread_id: Optional[int] = None
+        self._sampler: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+
+    def start(self) -> None:
+        """Start sampling the program running on this thread"""
+        self._thread_id = threading.get_ident()
+        self._stopping.clear()
+        self._sampler = threading.Thread(target = self._sample_until_stopped, name = 'grin-sampler', daemon = True)
+        self._sampler.start()
+
+    def stop(self) -> None:
+        """Stop sampling"""
+        self._stopping.set()
+        if self._sampler is not None:
+            self._sampler.join()
+            self._sampler = None
+        self._loop = None
+        raw, self._raw = self._raw, collections.Counter()
+        for (return_stack, pc), count in raw.items():
+            self.samples[self._stack(return_stack, pc)] += count
+
+    def __enter__(self) -> 'SamplingProfiler':
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def _sample_until_stopped(self) -> None:
+        wait, raw, interpreter = self._stopping.wait, self._raw, self.interpreter
+        while not wait(self.interval):
+            pc = self._running_pc()
+            if pc is not None:
+                raw[tuple(interpreter.return_stack), pc] += 1
+
+    def _running_pc(self) -> Optional[int]:
+        # The frames above the run loop's are the closures it calls, so this
+        # is usually one or two frames up, and the frame found last time
+        # saves looking at its locals more than once to know it
+        frame: Optional[FrameType] = sys._current_frames().get(self._thread_id)
+        while frame is not None:
+            if frame is self._loop:
+                return frame.f_locals['pc']
+            if frame.f_code in _RUN_LOOPS:
+                f_locals = frame.f_locals
+                if f_locals.get('self') is self.interpreter:
+                    self._loop = frame
+                    return f_locals.get('pc')
+            frame = frame.f_back
+        return None
+
+    def sample(self) -> Optional[Tuple[str, ...]]:
+        """Where the program is right now: the labels of the GOSUBs that
+        haven't returned, outermost first, then the line.  None if it isn't
+        running.  Time spent in a superinstruction shows up on its first
+        line."""
+        pc = self._running_pc()
+        if pc is None:
+            return None
+        return self._stack(tuple(self.interpreter.return_stack), pc)
+
+    def _stack(self, return_stack: Tuple[int, ...], pc: int) -> Tuple[str, ...]:
+        interpreter = self.interpreter
+        statements = interpreter.statements
+        stack = []
+        for return_to in return_stack:
+            gosub = statements[return_to - 1].statement if 0 < return_to <= len(statements) else None
+            stack.append(gosub.target.text() if isinstance(gosub, GosubStatement) else '?')
+        stack.append(f'line {interpreter.line_number(pc)}')
+        return tuple(stack)
+
+    def collapsed(self) -> str:
+        """The samples in the collapsed stack format that flamegraph tools
+        read: one 'frame;frame;frame count' line per stack"""
+        return ''.join(f"{';'.join(stack)} {count}\n" for stack, count in sorted(self.samples.items()))
+
+    def write(self, file: TextIO) -> None:
+        """Write the samples to a file in the collapsed stack format"""
+        file.write(self.collapsed())
+
+__all__ = [
+    SamplingProfiler.__name__,
+]
@@ -0,0 +1,243 @@
+"""A faster lexer for GRIN, which gives the same tokens and errors as
+grin.lexing.to_tokens(), so that it can be used in its place:
+
+    from grin.scanner import to_tokens
+
+It finds every token on a line with one precompiled regular expression,
+rather than looking at each character in turn in Python.  scan() lexes a
+whole program at once the same way, into a TokenTable of compact arrays
+instead of a GrinToken for every token."""
+import array
+import functools
+import re
+from sys import intern
+from typing import Any, Callable, Dict, Iterable, Iterator, List
+from grin.lexing import GrinLexError, KEYWORDS, to_tokens as _to_tokens
+from grin.location import GrinLocation
+from grin.token import GrinToken, GrinTokenKind
+
+# Each token, after any whitespace, in the order the groups are numbered.
+# Anything it has no group for, including every character that isn't ASCII
+# and isn't whitespace, is an error here, and the line it is on is left to
+# grin.lexing, since str.isalpha() and str.isdigit() have no equivalent in a
+# regular expression.  Every character but whitespace starts a match, so
+# finditer() never skips any; whitespace at the end of the text matches
+# nothing and ends the search.
+_TOKEN = re.compile(r'''
+    [^\S\n]*
+    (?:
+        ([A-Za-z][A-Za-z0-9]*)     # 1: a keyword or identifier
+      | ("[^"\n]*")                # 2: a string
+      | (-?[0-9]+\.[0-9]*)         # 3: a float
+      | (-?[0-9]+)                 # 4: an integer
+      | (<>|<=|>=|[:.=<>])         # 5: punctuation or a comparison
+      | (\n)                       # 6: the end of a line
+      | (\S)                       # 7: the start of an error
+    )''', re.VERBOSE)
+
+_WORD, _STRING, _FLOAT, _INTEGER, _SYMBOL, _NEWLINE, _ERROR = range(1, 8)
+
+_KEYWORDS = {keyword: GrinTokenKind[keyword] for keyword in KEYWORDS}
+
+_SYMBOLS = {
+    ':': GrinTokenKind.COLON,
+    '.': GrinTokenKind.DOT,
+    '=': GrinTokenKind.EQUAL,
+    '<>': GrinTokenKind.NOT_EQUAL,
+    '<=': GrinTokenKind.LESS_THAN_OR_EQUAL,
+    '<': GrinTokenKind.LESS_THAN,
+    '>=': GrinTokenKind.GREATER_THAN_OR_EQUAL,
+    '>': GrinTokenKind.GREATER_THAN,
+}
+
+# Keyword and identifier text is interned, so that looking up variables by
+# name finds keys that are the same object, and the values of literals are
+# shared by the tokens with the same text, as long as they were seen lately
+_LITERALS = 4096
+_integer = functools.lru_cache(maxsize = _LITERALS)(int)
+_float = functools.lru_cache(maxsize = _LITERALS)(float)
+
+@functools.lru_cache(maxsize = _LITERALS)
+def _string(text: str) -> str:
+    return text[1:-1]
+
+def to_tokens(line: str, line_number: int) -> Iterable[GrinToken]:
+    """Given a line of Grin code and its line number, returns the GrinTokens
+    on it, which are the ones grin.lexing.to_tokens() would generate.
+
+    Like that, it raises a GrinLexError when there is a lexical error on the
+    line, once the tokens before the error have been iterated over."""
+    tokens: List[GrinToken] = []
+    append = tokens.append
+    for match in _TOKEN.finditer(line):
+        group = match.lastindex
+        if group >= _NEWLINE:
+            return _to_tokens(line, line_number)
+        text = match.group(group)
+        location = GrinLocation(line_number, match.start(group) + 1)
+        if group == _WORD:
+            text = intern(text)
+            append(GrinToken(
+                kind = _KEYWORDS.get(text, GrinTokenKind.IDENTIFIER), text = text, location = location, value = text))
+        elif group == _SYMBOL:
+            append(GrinToken(kind = _SYMBOLS[text], text = text, location = location))
+        elif group == _INTEGER:
+            append(GrinToken(
+                kind = GrinTokenKind.LITERAL_INTEGER, text = text, location = location, value = _integer(text)))
+        elif group == _STRING:
+            append(GrinToken(
+                kind = GrinTokenKind.LITERAL_STRING, text = text, location = location, value = _string(text)))
+        else:
+            append(GrinToken(
+                kind = GrinTokenKind.LITERAL_FLOAT, text = text, location = location, value = _float(text)))
+    return tokens
+
+def _raise_after(tokens: List[GrinToken], error: GrinLexError) -> Iterator[GrinToken]:
+    yield from tokens
+    raise error
+
+# The kind of each token in a TokenTable is stored as its index()
+_KINDS = {kind.index(): kind for kind in GrinTokenKind}
+_IDENTIFIER = GrinTokenKind.IDENTIFIER.index()
+_WORD_CODES = {text: kind.index() for text, kind in _KEYWORDS.items()}
+_SYMBOL_CODES = {text: kind.index() for text, kind in _SYMBOLS.items()}
+_GROUP_CODES = {
+    _STRING: GrinTokenKind.LITERAL_STRING.index(),
+    _FLOAT: GrinTokenKind.LITERAL_FLOAT.index(),
+    _INTEGER: GrinTokenKind.LITERAL_INTEGER.index(),
+}
+
+# How each kind of token's value comes from its text, for those that have
+# one.  A keyword or identifier's value is its text, interned.
+_VALUES: Dict[int, Callable[[str], Any]] = {code: intern for code in [_IDENTIFIER, *_WORD_CODES.values()]}
+_VALUES[GrinTokenKind.LITERAL_STRING.index()] = _string
+_VALUES[GrinTokenKind.LITERAL_FLOAT.index()] = _float
+_VALUES[GrinTokenKind.LITERAL_INTEGER.index()] = _integer
+
+class TokenTable:
+    """The tokens of a whole program, as scan() finds them, kept in parallel
+    arrays rather than as a GrinToken each.  For the token at index i,
+    kinds[i] is the index() of its GrinTokenKind, text[starts[i]:ends[i]] is
+    its text and lines[i] is the index of its line.  The tokens on the line
+    at index l are those from first_tokens[l] up to first_tokens[l + 1], and
+    errors has the GrinLexError of every line with one, after the tokens
+    before it.  GrinTokens, and their values, are made when asked for."""
+    def __init__(self, text: str, line_number: int = 1):
+        self.text = text
+        self.line_number = line_number  # Of the first line
+        # Offsets, line indices and token indices all fit in 32 bits for any
+        # text shorter than 4GiB
+        typecode = 'I' if len(text) < 2 ** 32 else 'Q'
+        self.kinds = array.array('B')
+        self.starts = array.array(typecode)
+        self.ends = array.array(typecode)
+        self.lines = array.array(typecode)
+        self.line_starts = array.array(typecode, [0])  # Where each line starts in text
+        self.first_tokens = array.array(typecode, [0])
+        self.errors: Dict[int, GrinLexError] = {}
+        # The line number of the last line token() made a GrinToken on, so
+        # that the tokens on a line share one, as they do from to_tokens()
+        self._line = -1
+        self._number = 0
+
+    def __len__(self) -> int:
+        return len(self.kinds)
+
+    @property
+    def line_count(self) -> int:
+        return len(self.line_starts)
+
+    def token_text(self, index: int) -> str:
+        return self.text[self.starts[index]:self.ends[index]]
+
+    def kind(self, index: int) -> GrinTokenKind:
+        return _KINDS[self.kinds[index]]
+
+    def value(self, index: int) -> Any:
+        """The value the token at an index would have as a GrinToken"""
+        convert = _VALUES.get(self.kinds[index])
+        return convert(self.token_text(index)) if convert is not None else None
+
+    def token(self, index: int) -> GrinToken:
+        """The token at an index, as a GrinToken"""
+        kind = self.kinds[index]
+        start = self.starts[index]
+        line = self.lines[index]
+        if line != self._line:
+            self._line, self._number = line, self.line_number + line
+        text = self.text[start:self.ends[index]]
+        value = None
+        convert = _VALUES.get(kind)
+        if convert is intern:
+            text = value = intern(text)
+        elif convert is not None:
+            value = convert(text)
+        return GrinToken(
+            kind = _KINDS[kind], text = text,
+            location = GrinLocation(self._number, start - self.line_starts[line] + 1), value = value)
+
+    def line_tokens(self, line: int) -> Iterable[GrinToken]:
+        """The tokens on the line at an index, as to_tokens() gives them,
+        raising its GrinLexError after them if it has one"""
+        tokens = [self.token(index) for index in range(self.first_tokens[line], self.first_tokens[line + 1])]
+        error = self.errors.get(line)
+        return tokens if error is None else _raise_after(tokens, error)
+
+def scan(text: str, line_number: int = 1) -> TokenTable:
+    """Lex a whole program at once, its lines separated by '\\n', into a
+    TokenTable.  Every line is lexed, even after an error, as to_tokens()
+    would lex it if it were given the line and its line number."""
+    table = TokenTable(text, line_number)
+    kinds, starts, ends, lines = table.kinds, table.starts, table.ends, table.lines
+    line = 0
+    relexed = False  # Whether grin.lexing has already lexed this line
+    for match in _TOKEN.finditer(text):
+        group = match.lastindex
+        if group == _NEWLINE:
+            line += 1
+            table.line_starts.append(match.end())
+            table.first_tokens.append(len(kinds))
+            relexed = False
+        elif relexed:
+            continue
+        elif group == _ERROR:
+            _relex(table, line)
+            relexed = True
+        else:
+            start, end = match.span(group)
+            if group == _WORD:
+                kinds.append(_WORD_CODES.get(text[start:end], _IDENTIFIER))
+            elif group == _SYMBOL:
+                kinds.append(_SYMBOL_CODES[text[start:end]])
+            else:
+                kinds.append(_GROUP_CODES[group])
+            starts.append(start)
+            ends.append(end)
+            lines.append(line)
+    table.first_tokens.append(len(kinds))
+    return table
+
+def _relex(table: TokenTable, line: int) -> None:
+    # Replace what was found on a line with what grin.lexing finds on it
+    first = table.first_tokens[line]
+    for column in (table.kinds, table.starts, table.ends, table.lines):
+        del column[first:]
+    start = table.line_starts[line]
+    end = table.text.find('\n', start)
+    if end < 0:
+        end = len(table.text)
+    try:
+        for token in _to_tokens(table.text[start:end], table.line_number + line):
+            token_start = start + token.location().column() - 1
+            table.kinds.append(token.kind().index())
+            table.starts.append(token_start)
+            table.ends.append(token_start + len(token.text()))
+            table.lines.append(line)
+    except GrinLexError as e:
+        table.errors[line] = e
+
+__all__ = [
+    to_tokens.__name__,
+    TokenTable.__name__,
+    scan.__name__,
+]
@@ -0,0 +1,340 @@
+import argparse
+import asyncio
+import concurrent.futures
+import json
+import os
+import sys
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple, Optional, Tuple
+from grin.cache import ProgramCache
+from grin.exceptions import GrinLimitError, OUTPUT_LIMIT
+from grin.input import ListInput
+from grin.output import OutputSink
+
+# Sends one response, as a dict ready for json.dumps(), to the client
+Send = Callable[[Dict[str, Any]], Awaitable[None]]
+
+class ServerLimits(NamedTuple):
+    """The most any one request may run for.  None means no limit; requests
+    can ask for less, but never more."""
+    max_steps: Optional[int] = 10_000_000
+    time_limit: Optional[float] = 10.0
+    max_depth: Optional[int] = 10_000
+    max_output: Optional[int] = 1_048_576  # Characters
+
+    def clamp(self, requested: Dict[str, Any]) -> 'ServerLimits':
+        """These limits, lowered to any a request asked for"""
+        limits = {}
+        for name, cap in self._asdict().items():
+            value = requested.get(name)
+            if value is not None and (not isinstance(value, (int, float)) or isinstance(value, bool) or value < 0):
+                raise ValueError(f'{name} must be a number that is at least 0')
+            limits[name] = value if cap is None or (value is not None and value < cap) else cap
+        return ServerLimits(**limits)
+
+class _StreamedOutput(OutputSink):
+    """Sends a program's output back while it runs, in pieces of whole
+    lines, by way of a queue the event loop empties.  It is written to from
+    the worker thread running the program, which never waits for the client:
+    if more than max_buffered characters are waiting to be sent, or the
+    program prints too much, the program is stopped with a GrinLimitError."""
+    def __init__(
+            self, loop: asyncio.AbstractEventLoop, queue: 'asyncio.Queue[str]', max_output: Optional[int],
+            max_buffered: int, chunk_size: int, interval: float):
+        self._loop = loop
+        self._queue = queue
+        self._max_output = max_output
+        self._max_buffered = max_buffered
+        self._chunk_size = chunk_size
+        self._interval = interval
+        self._parts: List[str] = []
+        self._size = self._total = 0
+        self._sent = time.monotonic()
+        self._stalled = False
+        # Characters handed to the event loop and not yet sent, which both
+        # threads change
+        self._buffered = 0
+        self._lock = threading.Lock()
+
+    def write(self, text: str) -> None:
+        if self._stalled:
+            raise GrinLimitError(OUTPUT_LIMIT, 'Output no longer being read')
+        self._total += len(text)
+        if self._max_output is not None and self._total > self._max_output:
+            raise GrinLimitError(OUTPUT_LIMIT, f'Output limit of {self._max_output} characters reached')
+        self._parts.append(text)
+        self._size += len(text)
+        if self._size >= self._chunk_size or time.monotonic() - self._sent >= self._interval:
+            self.flush()
+
+    def flush(self) -> None:
+        if self._parts and not self._stalled:
+            chunk = ''.join(self._parts)
+            self._parts.clear()
+            self._size = 0
+            with self._lock:
+                self._buffered += len(chunk)
+                buffered = self._buffered
+            if buffered > self._max_buffered:
+                self.abandon()
+                raise GrinLimitError(
+                    OUTPUT_LIMIT, f'Output not read: more than {self._max_buffered} characters waiting to be sent')
+            self._loop.call_soon_threadsafe(self._queue.put_nowait, chunk)
+            self._sent = time.monotonic()
+
+    def sent(self, chunk: str) -> None:
+        """Note that a chunk has been sent to the client"""
+        with self._lock:
+            self._buffered -= len(chunk)
+
+    def abandon(self) -> None:
+        """Stop sending, so that the program is stopped the next time it prints"""
+        self._stalled = True
+
+def _run_program(
+        cache: ProgramCache, source: List[str], input: List[str], limits: ServerLimits,
+        output: _StreamedOutput) -> Tuple[Optional[str], Optional[str]]:
+    """Load and run a program in a worker thread, returning the error that
+    stopped it, if any, and the kind of limit it was, if it was one.  As
+    with project3.py, errors in the program itself are part of its output."""
+    try:
+        program = cache.load(source)
+    except Exception as e:
+        return str(e), None
+    interpreter = program.interpreter(output, ListInput(input))
+    try:
+        interpreter.run(limits.max_steps, limits.time_limit, limits.max_depth)
+    except GrinLimitError as e:
+        return str(e), e.limit
+    return None, None
+
+def _read_request(request: Any) -> Tuple[List[str], List[str], Dict[str, Any]]:
+    """The source, input and limits of a request, checked"""
+    if not isinstance(request, dict):
+        raise ValueError('A request must be a JSON object')
+    source = request.get('source')
+    if isinstance(source, str):
+        source = source.splitlines()
+    input = request.get('input', [])
+    limits = request.get('limits', {})
+    if not isinstance(source, list) or not all(isinstance(line, str) for line in source):
+        raise ValueError('source must be a string or a list of lines')
+    if not isinstance(input, list) or not all(isinstance(line, str) for line in input):
+        raise ValueError('input must be a list of lines')
+    if not isinstance(limits, dict):
+        raise ValueError('limits must be a JSON object')
+    return [line.strip() for line in source if line.strip()], input, limits
+
+class GrinServer:
+    """Runs GRIN programs sent to it as JSON, a line per request, streaming
+    their output back as they run.  Programs run on a pool of worker threads
+    kept for the server's whole life, and are loaded through a ProgramCache,
+    so a program sent again isn't lexed or parsed again.
+
+    A request looks like {"id": 1, "source": "PRINT 1\\n.", "input": [],
+    "limits": {"max_steps": 1000}}; source may also be a list of lines, and
+    input and limits may be left out.  Its output comes back as any number of
+    {"id": 1, "output": "1\\n"}, followed by {"id": 1, "done": true, "error":
+    null, "limit": null, "time": 0.001}, where error says why the program
+    couldn't be loaded or was stopped, and limit which limit stopped it."""
+    def __init__(
+            self, workers: int = 4, limits: ServerLimits = ServerLimits(), cache: Optional[ProgramCache] = None,
+            max_pending: int = 16, max_running: Optional[int] = None, max_buffered: int = 1_048_576,
+            chunk_size: int = 8192, interval: float = 0.05, send_timeout: float = 10.0):
+        self.limits = limits
+        self.cache = cache if cache is not None else ProgramCache()
+        # How many requests a connection may have waiting or running before
+        # no more of its requests are read
+        self.max_pending = max_pending
+        # How many of them may be running at once; fewer than there are
+        # workers, so that one connection can't keep the others waiting
+        self.max_running = max_running if max_running is not None else max(1, workers - 1)
+        # How much of a program's output may wait for its client to read it
+        # before the program is stopped, rather than left waiting on a worker
+        self.max_buffered = max_buffered
+        self.chunk_size = chunk_size  # Output is sent in pieces of about this many characters
+        self.interval = interval  # or sooner, if this many seconds have passed
+        self.send_timeout = send_timeout  # How long a client has to take a response before it is dropped
+        self._pool = concurrent.futures.ThreadPoolExecutor(workers, thread_name_prefix = 'grin')
+
+    async def handle_request(self, request: Any, send: Send) -> None:
+        """Run one request, sending its output and then its result"""
+        id = request.get('id') if isinstance(request, dict) else None
+        start = time.perf_counter()
+        try:
+            source, input, requested = _read_request(request)
+            limits = self.limits.clamp(requested)
+        except ValueError as e:
+            await send({'id': id, 'done': True, 'error': str(e), 'limit': None, 'time': 0.0})
+            return
+
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue[str] = asyncio.Queue()
+        output = _StreamedOutput(loop, queue, limits.max_output, self.max_buffered, self.chunk_size, self.interval)
+        future = loop.run_in_executor(self._pool, _run_program, self.cache, source, input, limits, output)
+        try:
+            await self._forward(id, queue, output, future, send)
+        finally:
+            # If sending failed, stop the program rather than leave it running
+            # for a client that has gone
+            output.abandon()
+        error, limit = await future
+        await send({'id': id, 'done': True, 'error': error, 'limit': limit, 'time': time.perf_counter() - start})
+
+    async def _forward(
+            self, id: Any, queue: 'asyncio.Queue[str]', output: _StreamedOutput, future: 'asyncio.Future[Any]',
+            send: Send) -> None:
+        # Send output as it arrives, until the program has finished and
+        # everything it printed has been sent
+        while True:
+            getter = asyncio.ensure_future(queue.get())
+            done, _ = await asyncio.wait({getter, future}, return_when = asyncio.FIRST_COMPLETED)
+            if getter not in done:
+                getter.cancel()
+                break
+            chunk = getter.result()
+            await send({'id': id, 'output': chunk})
+            output.sent(chunk)
+        while not queue.empty():
+            await send({'id': id, 'output': queue.get_nowait()})
+
+    async def serve_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Serve the requests sent over one connection, several at a time,
+        until the client closes it"""
+        lock = asyncio.Lock()
+
+        async def send(response: Dict[str, Any]) -> None:
+            async with lock:
+                writer.write(json.dumps(response).encode('utf-8') + b'\n')
+                try:
+                    await asyncio.wait_for(writer.drain(), self.send_timeout)
+                except asyncio.TimeoutError:
+                    writer.transport.abort()
+                    raise ConnectionResetError('Client stopped reading responses')
+
+        async def readline() -> bytes:
+            try:
+                return await reader.readline()
+            except (ConnectionError, ValueError):  # ValueError is a line too long
+                return b''
+
+        try:
+            await self._serve(readline, send)
+        finally:
+            writer.close()
+
+    async def serve_stdio(self) -> None:
+        """Serve requests read from standard input, writing responses to
+        standard output, until standard input ends"""
+        lock = asyncio.Lock()
+
+        async def send(response: Dict[str, Any]) -> None:
+            async with lock:
+                sys.stdout.write(json.dumps(response) + '\n')
+                sys.stdout.flush()
+
+        async def readline() -> bytes:
+            return (await asyncio.to_thread(sys.stdin.readline)).encode('utf-8')
+
+        await self._serve(readline, send)
+
+    async def _serve(self, readline: Callable[[], Awaitable[bytes]], send: Send) -> None:
+        # Requests are read only while fewer than max_pending are waiting or
+        # running, which pushes back on a client sending them faster than they
+        # finish, and at most max_running of them are given to workers
+        pending = asyncio.Semaphore(self.max_pending)
+        running = asyncio.Semaphore(self.max_running)
+        tasks = set()
+
+        async def run(request: Any) -> None:
+            try:
+                async with running:
+                    await self.handle_request(request, send)
+            except ConnectionError:
+                pass
+            finally:
+                pending.release()
+
+        while True:
+            await pending.acquire()
+            line = await readline()
+            if not line:
+                pending.release()
+                break
+            if not line.strip():
+                pending.release()
+                continue
+            try:
+                request = json.loads(line)
+            except ValueError as e:
+                pending.release()
+                try:
+                    await send({'id': None, 'done': True, 'error': f'Invalid JSON: {e}', 'limit': None, 'time': 0.0})
+                except ConnectionError:
+                    break
+                continue
+            task = asyncio.ensure_future(run(request))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.wait(tasks)
+
+    async def serve_unix(self, path: str) -> None:
+        """Listen on a Unix socket at path until cancelled, removing it after"""
+        server = await asyncio.start_unix_server(self.serve_connection, path)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            if os.path.exists(path):
+                os.unlink(path)
+
+    def close(self) -> None:
+        """Stop the worker threads, once the requests they are running end"""
+        self._pool.shutdown()
+
+def configure(parser: argparse.ArgumentParser) -> None:
+    """Add the serve command's arguments to its parser"""
+    defaults = ServerLimits()
+    parser.add_argument('--socket', metavar = 'PATH',
+                        help = 'listen on a Unix socket at PATH (default: read standard input)')
+    parser.add_argument('-j', '--workers', type = int, default = 4,
+                        help = 'worker threads running programs (default: %(default)s)')
+    parser.add_argument('--max-steps', type = int, default = defaults.max_steps,
+                        help = 'the most steps any program may run (default: %(default)s)')
+    parser.add_argument('--time-limit', type = float, default = defaults.time_limit,
+                        help = 'the most seconds any program may run (default: %(default)s)')
+    parser.add_argument('--max-depth', type = int, default = defaults.max_depth,
+                        help = 'the deepest any program may GOSUB (default: %(default)s)')
+    parser.add_argument('--max-output', type = int, default = defaults.max_output,
+                        help = 'the most characters any program may print (default: %(default)s)')
+    parser.add_argument('--max-pending', type = int, default = 16,
+                        help = 'requests a client may have waiting or running at once (default: %(default)s)')
+    parser.add_argument('--max-running', type = int,
+                        help = 'requests a client may have running at once (default: one fewer than the workers)')
+    parser.add_argument('--send-timeout', type = float, default = 10.0,
+                        help = 'seconds to wait for a client to read before giving up on it (default: %(default)s)')
+    parser.set_defaults(handler = main)
+
+def main(arguments: argparse.Namespace) -> int:
+    """Serve requests from the command line"""
+    limits = ServerLimits(arguments.max_steps, arguments.time_limit, arguments.max_depth, arguments.max_output)
+    server = GrinServer(
+        arguments.workers, limits, max_pending = arguments.max_pending, max_running = arguments.max_running,
+        send_timeout = arguments.send_timeout)
+    try:
+        if arguments.socket:
+            asyncio.run(server.serve_unix(arguments.socket))
+        else:
+            asyncio.run(server.serve_stdio())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+    return 0
+
+__all__ = [
+    ServerLimits.__name__,
+    GrinServer.__name__,
+]
@@ -1,6 +1,92 @@
-from typing import Optional, Dict, Any
+import operator
+from typing import Optional, Dict, Any, Callable, List
+from grin.input import InputSource, ConsoleInput
+from grin.output import OutputSink, UnbufferedOutput
+from grin.symbols import UNDEFINED, SymbolTable, Variables
 from grin.token import GrinToken, GrinTokenKind
 
+# A compiled statement: a closure that does what execute() does, with every
+# decision that doesn't depend on the variables already made.  It reads and
+# writes variables through their slots in the program's symbol table, and
+# instead of a control flow string it returns the index of the next statement
+# to run, or None to continue with the one after it.
+CompiledStatement = Callable[[], Optional[int]]
+
+class StatementFault(Exception):
+    """
+    Raised by a closure that runs several statements at once when one after
+    the first fails, so that the error is reported against the right line
+    """
+    def __init__(self, offset: int, error: Exception):
+        super().__init__(str(error))
+        self.offset = offset
+        self.error = error
+
+class ProgramContext:
+    """
+    What a statement needs to know about the program it was loaded into in
+    order to compile itself: the label map, the number of statements, the
+    return stack shared by GOSUB and RETURN, the symbol table that gives
+    each variable its slot, the sink that PRINT writes to and the source
+    that INNUM and INSTR read from
+    """
+    def __init__(
+            self, label_map: Dict[str, int], count: int, return_stack: List[int],
+            symbols: Optional[SymbolTable] = None, output: Optional[OutputSink] = None,
+            input: Optional[InputSource] = None):
+        self.label_map = label_map
+        self.count = count
+        self.return_stack = return_stack
+        self.symbols = symbols if symbols is not None else SymbolTable()
+        self.output = output if output is not None else UnbufferedOutput()
+        self.input = input if input is not None else ConsoleInput()
+
+    def resolve_jump(self, target: str) -> int:
+        """Return the index of the statement a GOTO to target lands on"""
+        try:
+            line = int(target)
+        except ValueError:
+            if target not in self.label_map:
+                raise RuntimeError(f"Label '{target}' not found")
+            return self.label_map[target]
+
+        if line <= 0 or line > self.count + 1:
+            raise RuntimeError(f"Invalid GOTO target: {line}")
+        return line - 1  # Adjust for 0-based index
+
+    def compile_jump(self, target: str) -> CompiledStatement:
+        """Resolve a GOTO target now, returning a closure that jumps there (or
+        that raises the error the jump would have raised)"""
+        try:
+            destination = self.resolve_jump(target)
+        except RuntimeError as e:
+            message = str(e)
+
+            def invalid_jump() -> int:
+                raise RuntimeError(message)
+
+            return invalid_jump
+
+        return lambda: destination
+
+    def follow(self, index: int, result: str) -> int:
+        """Return the index to continue at after the statement at index
+        returned the control flow string result from execute()"""
+        if result == "END":
+            return self.count  # Force program end
+        elif result == "RETURN":
+            if not self.return_stack:
+                raise RuntimeError("RETURN without GOSUB")
+            return self.return_stack.pop()
+        elif result.startswith("GOSUB:"):
+            label = result[6:]
+            if label not in self.label_map:
+                raise RuntimeError(f"Label '{label}' not found")
+            self.return_stack.append(index + 1)
+            return self.label_map[label]
+        else:  # GOTO
+            return self.resolve_jump(result)
+
 class Statement:
     """Base class for all GRIN statements"""
     def execute(self, variables: Dict[str, Any]) -> Optional[str]:
@@ -15,6 +101,41 @@ class Statement:
         """
         raise NotImplementedError()
 
+    def compile(self, index: int, context: ProgramContext) -> CompiledStatement:
+        """
+        Return a closure that behaves exactly like execute(), but with the
+        token inspection and jump resolution done once here rather than every
+        time it runs.  index is where this statement sits in the program.
+        """
+        execute = self.execute
+        variables = Variables(context.symbols)
+
+        def execute_and_follow() -> Optional[int]:
+            result = execute(variables)
+            if result is None:
+                return None
+            return context.follow(index, result)
+
+        return execute_and_follow
+
+def _compile_fetch(token: GrinToken, symbols: SymbolTable) -> Callable[[], Any]:
+    """Return a function that fetches the value of an operand token"""
+    if token.kind() == GrinTokenKind.IDENTIFIER:
+        name = token.text()
+        slot = symbols.slot(name)
+        values = symbols.values
+
+        def fetch_variable() -> Any:
+            value = values[slot]
+            if value is UNDEFINED:
+                raise RuntimeError(f"Variable '{name}' not defined")
+            return value
+
+        return fetch_variable
+    else:
+        value = token.value()
+        return lambda: value
+
 class LabeledStatement:
     """A statement that may have a label"""
     def __init__(self, label: Optional[str], statement: Statement):
@@ -36,6 +157,29 @@ class LetStatement(Statement):
             variables[self.variable.text()] = self.value.value()
         return None
 
+    def compile(self, index: int, context: ProgramContext) -> CompiledStatement:
+        values = context.symbols.values
+        target = context.symbols.slot(self.variable.text())
+
+        if self.value.kind() == GrinTokenKind.IDENTIFIER:
+            name = self.value.text()
+            source = context.symbols.slot(name)
+
+            def let_variable() -> None:
+                value = values[source]
+                if value is UNDEFINED:
+                    raise RuntimeError(f"Variable '{name}' not defined")
+                values[target] = value
+
+            return let_variable
+        else:
+            value = self.value.value()
+
+            def let_literal() -> None:
+                values[target] = value
+
+            return let_literal
+
 class PrintStatement(Statement):
     """Prints a value"""
     def __init__(self, value: GrinToken):
@@ -50,6 +194,29 @@ class PrintStatement(Statement):
             print(self.value.value())
         return None
 
+    def compile(self, index: int, context: ProgramContext) -> CompiledStatement:
+        if self.value.kind() == GrinTokenKind.IDENTIFIER:
+            name = self.value.text()
+            slot = context.symbols.slot(name)
+            values = context.symbols.values
+            write = context.output.write
+
+            def print_variable() -> None:
+                value = values[slot]
+                if value is UNDEFINED:
+                    raise RuntimeError(f"Variable '{name}' not defined")
+                write(f'{value}\n')
+
+            return print_variable
+        else:
+            text = f'{self.value.value()}\n'
+            write = context.output.write
+
+            def print_literal() -> None:
+                write(text)
+
+            return print_literal
+
 class InNumStatement(Statement):
     """Reads a number from input"""
     def __init__(self, variable: GrinToken):
@@ -63,6 +230,21 @@ class InNumStatement(Statement):
         except ValueError:
             raise RuntimeError("Invalid numeric input")
 
+    def compile(self, index: int, context: ProgramContext) -> CompiledStatement:
+        slot = context.symbols.slot(self.variable.text())
+        values = context.symbols.values
+        flush = context.output.flush
+        readline = context.input.readline
+
+        def innum() -> None:
+            flush()  # So that any prompt is seen before waiting
+            try:
+                values[slot] = float(readline())
+            except ValueError:
+                raise RuntimeError("Invalid numeric input")
+
+        return innum
+
 class InStrStatement(Statement):
     """Reads a string from input"""
     def __init__(self, variable: GrinToken):
@@ -72,6 +254,18 @@ class InStrStatement(Statement):
         variables[self.variable.text()] = input()
         return None
 
+    def compile(self, index: int, context: ProgramContext) -> CompiledStatement:
+        slot = context.symbols.slot(self.variable.text())
+        values = context.symbols.values
+        flush = context.output.flush
+        readline = context.input.readline
+
+        def instr() -> None:
+            flush()
+            values[slot] = readline()
+
+        return instr
+
 class ArithmeticStatement(Statement):
     """Performs arithmetic operations"""
     def __init__(self, operation: str, variable: GrinToken, value: GrinToken):
@@ -102,6 +296,53 @@ class ArithmeticStatement(Statement):
             variables[self.variable.text()] /= operand
         return None
 
+    def compile(self, index: int, context: ProgramContext) -> CompiledStatement:
+        name = self.variable.text()
+        slot = context.symbols.slot(name)
+        values = context.symbols.values
+        fetch = _compile_fetch(self.value, context.symbols)
+
+        if self.operation == 'DIV':
+            def divide() -> None:
+                if values[slot] is UNDEFINED:
+                    raise RuntimeError(f"Variable '{name}' not defined")
+                operand = fetch()
+                if operand == 0:
+                    raise RuntimeError("Division by zero")
+                values[slot] /= operand
+
+            return divide
+
+        # The in-place operators keep the error messages of the original
+        # augmented assignments (e.g. "unsupported operand type(s) for -=")
+        apply = _ARITHMETIC_OPERATIONS.get(self.operation)
+
+        if apply is not None and self.value.kind() != GrinTokenKind.IDENTIFIER:
+            operand = self.value.value()
+
+            def arithmetic_literal() -> None:
+                value = values[slot]
+                if value is UNDEFINED:
+                    raise RuntimeError(f"Variable '{name}' not defined")
+                values[slot] = apply(value, operand)
+
+            return arithmetic_literal
+
+        def arithmetic() -> None:
+            if values[slot] is UNDEFINED:
+                raise RuntimeError(f"Variable '{name}' not defined")
+            operand = fetch()
+            if apply is not None:
+                values[slot] = apply(values[slot], operand)
+
+        return arithmetic
+
+_ARITHMETIC_OPERATIONS = {
+    'ADD': operator.iadd,
+    'SUB': operator.isub,
+    'MULT': operator.imul,
+}
+
 class GotoStatement(Statement):
     """Jumps to a label or line number, optionally with a condition"""
     def __init__(self, target: GrinToken, condition: Optional[str] = None, left: Optional[GrinToken] = None, right: Optional[GrinToken] = None):
@@ -141,6 +382,110 @@ class GotoStatement(Statement):
         else:
             raise RuntimeError(f"Invalid GOTO target: {target}")
 
+    def compile(self, index: int, context: ProgramContext) -> CompiledStatement:
+        jump = self._compile_target(context)
+
+        if not self.condition:
+            return jump
+
+        left = self._compile_operand(self.left, context.symbols)
+        right = self._compile_operand(self.right, context.symbols)
+        compare = _COMPARISONS.get(self.condition)
+
+        if compare is None:
+            # Conditions other than <, > and = never jump, but their operands
+            # are still evaluated (and can still fail)
+            def goto_never() -> None:
+                left()
+                right()
+
+            return goto_never
+
+        if self.left.kind() == GrinTokenKind.IDENTIFIER \
+                and self.right.kind() != GrinTokenKind.IDENTIFIER:
+            # The shape of almost every loop condition, so it gets its own
+            # closure without the extra calls
+            name = self.left.text()
+            slot = context.symbols.slot(name)
+            values = context.symbols.values
+            limit = self.right.value()
+
+            def goto_if_variable_literal() -> Optional[int]:
+                value = values[slot]
+                if value is UNDEFINED:
+                    raise KeyError(name)
+                if compare(value, limit):
+                    return jump()
+                return None
+
+            return goto_if_variable_literal
+
+        def goto_if() -> Optional[int]:
+            if compare(left(), right()):
+                return jump()
+            return None
+
+        return goto_if
+
+    @staticmethod
+    def _compile_operand(token: GrinToken, symbols: SymbolTable) -> Callable[[], Any]:
+        if token.kind() == GrinTokenKind.IDENTIFIER:
+            # Unlike every other statement, conditions read variables without
+            # checking them first, so an undefined one is a KeyError
+            name = token.text()
+            slot = symbols.slot(name)
+            values = symbols.values
+
+            def fetch_variable() -> Any:
+                value = values[slot]
+                if value is UNDEFINED:
+                    raise KeyError(name)
+                return value
+
+            return fetch_variable
+        else:
+            value = token.value()
+            return lambda: value
+
+    def _compile_target(self, context: ProgramContext) -> CompiledStatement:
+        if self.target.kind() == GrinTokenKind.IDENTIFIER:
+            # Only targets held in variables are resolved at run time
+            name = self.target.text()
+            slot = context.symbols.slot(name)
+            values = context.symbols.values
+            resolve_jump = context.resolve_jump
+
+            def dynamic_jump() -> int:
+                target = values[slot]
+                if target is UNDEFINED:
+                    raise RuntimeError(f"Variable '{name}' not defined")
+                elif isinstance(target, int):
+                    return resolve_jump(str(target))
+                elif isinstance(target, str):
+                    return resolve_jump(target)
+                else:
+                    raise RuntimeError(f"Invalid GOTO target: {target}")
+
+            return dynamic_jump
+
+        target = self.target.value()
+
+        if isinstance(target, int):
+            return context.compile_jump(str(target))
+        elif isinstance(target, str):
+            return context.compile_jump(target)
+        else:
+            def invalid_target() -> int:
+                raise RuntimeError(f"Invalid GOTO target: {target}")
+
+            return invalid_target
+
+_COMPARISONS = {
+    '<': operator.lt,
+    '>': operator.gt,
+    '=': operator.eq,
+}
+
 class GosubStatement(Statement):
     """Calls a subroutine"""
     def __init__(self, target: GrinToken):
@@ -149,12 +494,63 @@ class GosubStatement(Statement):
     def execute(self, variables: Dict[str, Any]) -> str:
         return f"GOSUB:{self.target.text()}"
 
+    def compile(self, index: int, context: ProgramContext) -> CompiledStatement:
+        label = self.target.text()
+
+        if label not in context.label_map:
+            def missing_label() -> int:
+                raise RuntimeError(f"Label '{label}' not found")
+
+            return missing_label
+
+        destination = context.label_map[label]
+        return_stack = context.return_stack
+        push = return_stack.append
+        return_to = index + 1
+
+        def gosub() -> int:
+            push(return_to)
+            return destination
+
+        return gosub
+
 class ReturnStatement(Statement):
     """Returns from a subroutine"""
     def execute(self, variables: Dict[str, Any]) -> str:
         return "RETURN"
 
+    def compile(self, index: int, context: ProgramContext) -> CompiledStatement:
+        return_stack = context.return_stack
+
+        def return_() -> int:
+            if not return_stack:
+                raise RuntimeError("RETURN without GOSUB")
+            return return_stack.pop()
+
+        return return_
+
 class EndStatement(Statement):
     """Ends the program"""
     def execute(self, variables: Dict[str, Any]) -> str:
         return "END"
+
+    def compile(self, index: int, context: ProgramContext) -> CompiledStatement:
+        end = context.count
+        return lambda: end
+
+__all__ = [
+    'CompiledStatement',
+    StatementFault.__name__,
+    ProgramContext.__name__,
+    Statement.__name__,
+    LabeledStatement.__name__,
+    LetStatement.__name__,
+    PrintStatement.__name__,
+    InNumStatement.__name__,
+    InStrStatement.__name__,
+    ArithmeticStatement.__name__,
+    GotoStatement.__name__,
+    GosubStatement.__name__,
+    ReturnStatement.__name__,
+    EndStatement.__name__,
+]
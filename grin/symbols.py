@@ -0,0 +1,61 @@
+from typing import Any, Dict, Iterator, List
+from collections.abc import MutableMapping
+
+class _Undefined:
+    """The value held by a variable slot that hasn't been assigned yet"""
+    def __repr__(self) -> str:
+        return 'UNDEFINED'
+
+UNDEFINED = _Undefined()
+
+class SymbolTable:
+    """Gives every variable name a fixed integer slot in a list of values"""
+    def __init__(self):
+        self.slots: Dict[str, int] = {}
+        self.names: List[str] = []
+        self.values: List[Any] = []
+
+    def slot(self, name: str) -> int:
+        """Return the slot for a variable, allocating one if needed"""
+        slot = self.slots.get(name)
+        if slot is None:
+            slot = len(self.names)
+            self.slots[name] = slot
+            self.names.append(name)
+            self.values.append(UNDEFINED)
+        return slot
+
+class Variables(MutableMapping):
+    """A dict-compatible view of the variables held in a symbol table, for
+    debugging and for code that still thinks in terms of names"""
+    def __init__(self, symbols: SymbolTable):
+        self._symbols = symbols
+
+    def __getitem__(self, name: str) -> Any:
+        slot = self._symbols.slots.get(name)
+        if slot is None or self._symbols.values[slot] is UNDEFINED:
+            raise KeyError(name)
+        return self._symbols.values[slot]
+
+    def __setitem__(self, name: str, value: Any) -> None:
+        self._symbols.values[self._symbols.slot(name)] = value
+
+    def __delitem__(self, name: str) -> None:
+        self[name]  # Raises KeyError if it isn't defined
+        self._symbols.values[self._symbols.slots[name]] = UNDEFINED
+
+    def __iter__(self) -> Iterator[str]:
+        values = self._symbols.values
+        return (name for name, value in zip(self._symbols.names, values) if value is not UNDEFINED)
+
+    def __len__(self) -> int:
+        return sum(1 for value in self._symbols.values if value is not UNDEFINED)
+
+    def __repr__(self) -> str:
+        return repr(dict(self))
+
+__all__ = [
+    'UNDEFINED',
+    SymbolTable.__name__,
+    Variables.__name__,
+]
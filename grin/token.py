@@ -78,6 +78,8 @@ class GrinTokenKind(Enum):
 
 class GrinToken:
     """A single token in a Grin program"""
+    __slots__ = ('_kind', '_text', '_location', '_value')
+
     def __init__(
             self, *,
             kind: GrinTokenKind,
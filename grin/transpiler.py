@@ -0,0 +1,341 @@
+import itertools
+from types import TracebackType
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+from grin.cfg import build_cfg
+from grin.interpreter import GrinInterpreter
+from grin.statements import (
+    LabeledStatement, ProgramContext, LetStatement, PrintStatement, InNumStatement,
+    InStrStatement, ArithmeticStatement, GotoStatement, GosubStatement, ReturnStatement,
+    EndStatement
+)
+from grin.symbols import UNDEFINED, SymbolTable
+from grin.token import GrinToken, GrinTokenKind
+
+class TranslationError(Exception):
+    """Raised when a program uses something that can't be translated to
+    Python, such as a GOTO whose target is held in a variable"""
+    pass
+
+class Translation(NamedTuple):
+    """A GRIN program translated into the source of a Python function"""
+    source: str
+    # For each line of source, the index of the GRIN statement it came from
+    # (or None for the lines that hold the function together)
+    line_map: List[Optional[int]]
+
+# Each translated program gets its own file name, so that its frames can be
+# picked out of a traceback
+_FILENAMES = (f'<grin-{number}>' for number in itertools.count())
+
+_COMPARISONS = {
+    '<': '<',
+    '>': '>',
+    '=': '==',
+}
+
+_AUGMENTED_OPERATORS = {
+    'ADD': '+=',
+    'SUB': '-=',
+    'MULT': '*=',
+}
+
+# Leaves of the dispatch tree hold at most this many blocks
+_DISPATCH_LEAF_SIZE = 4
+
+class _Translator:
+    def __init__(self, statements: List[LabeledStatement], label_map: Dict[str, int], symbols: SymbolTable):
+        self._labeled = statements
+        self._statements = [labeled.statement for labeled in statements]
+        self._context = ProgramContext(label_map, len(statements), [], symbols)
+        self._lines: List[str] = []
+        self._line_map: List[Optional[int]] = []
+        self._index: Optional[int] = None
+
+    def translate(self) -> Translation:
+        for statement in self._statements:
+            self._check(statement)
+
+        symbols = self._context.symbols
+        count = len(self._statements)
+        leaders = build_cfg(self._labeled, self._context.label_map).leaders()
+
+        self._emit(0, 'def _program(values, return_stack, write, flush, input, U):')
+        for slot in symbols.slots.values():
+            self._emit(1, f'v_{slot} = values[{slot}]')
+        self._emit(1, 'pc = 0')
+        self._emit(1, 'try:')
+        self._emit(2, 'while True:')
+        self._emit_dispatch(3, leaders, leaders + [count])
+        self._emit(1, 'finally:')
+        for slot in symbols.slots.values():
+            self._emit(2, f'values[{slot}] = v_{slot}')
+        if not symbols.slots:
+            self._emit(2, 'pass')
+
+        return Translation('\n'.join(self._lines) + '\n', self._line_map)
+
+    def _check(self, statement: Any) -> None:
+        kind = type(statement)
+
+        if kind is GotoStatement and statement.target.kind() == GrinTokenKind.IDENTIFIER:
+            raise TranslationError('GOTO target held in a variable')
+        elif kind is ArithmeticStatement and statement.operation not in _AUGMENTED_OPERATORS \
+                and statement.operation != 'DIV':
+            raise TranslationError(f'Unknown operation {statement.operation}')
+        elif kind not in _TRANSLATORS:
+            raise TranslationError(f'Cannot translate {kind.__name__}')
+
+        # Give every variable its slot up front, so they all become locals
+        for attribute in ('variable', 'value', 'left', 'right'):
+            token = getattr(statement, attribute, None)
+            if token is not None and token.kind() == GrinTokenKind.IDENTIFIER:
+                self._context.symbols.slot(token.text())
+
+    def _emit(self, indent: int, text: str, index: Optional[int] = None) -> None:
+        self._lines.append('    ' * indent + text)
+        self._line_map.append(index)
+
+    def _emit_statement(self, indent: int, text: str) -> None:
+        self._emit(indent, text, self._index)
+
+    def _emit_dispatch(self, indent: int, leaders: List[int], bounds: List[int]) -> None:
+        """Emit a binary search over pc that runs the block starting at each
+        leader; bounds[i] is where the block for leaders[i] ends"""
+        if len(leaders) <= _DISPATCH_LEAF_SIZE:
+            for position, leader in enumerate(leaders):
+                keyword = 'if' if position == 0 else 'elif'
+                self._emit(indent, f'{keyword} pc == {leader}:')
+                self._emit_block(indent + 1, leader, bounds[position + 1])
+            self._emit(indent, 'else:' if leaders else 'if True:')
+            self._emit(indent + 1, 'return pc')
+        else:
+            middle = len(leaders) // 2
+            self._emit(indent, f'if pc < {leaders[middle]}:')
+            self._emit_dispatch(indent + 1, leaders[:middle], bounds[:middle + 1])
+            self._emit(indent, 'else:')
+            self._emit_dispatch(indent + 1, leaders[middle:], bounds[middle:])
+
+    def _emit_block(self, indent: int, start: int, end: int) -> None:
+        for index in range(start, end):
+            self._index = index
+            statement = self._statements[index]
+            if _TRANSLATORS[type(statement)](self, indent, index, statement):
+                break
+        else:
+            self._emit(indent, f'pc = {end}')
+        self._index = None
+
+    def _local(self, name: str) -> str:
+        # Locals are named after slots, since a GRIN identifier needn't be a
+        # Python one, and Python would NFKC-normalize those that are
+        return f'v_{self._context.symbols.slot(name)}'
+
+    def _value(self, indent: int, token: GrinToken) -> str:
+        """Emit the check that an operand is defined, returning the Python
+        expression for its value"""
+        if token.kind() == GrinTokenKind.IDENTIFIER:
+            name = token.text()
+            local = self._local(name)
+            message = f"Variable '{name}' not defined"
+            self._emit_statement(indent, f'if {local} is U:')
+            self._emit_statement(indent + 1, f'raise RuntimeError({message!r})')
+            return local
+        return repr(token.value())
+
+    def _comparison_operand(self, indent: int, token: GrinToken) -> str:
+        """Like _value(), except that conditions read variables without
+        checking them, so an undefined one is a KeyError"""
+        if token.kind() == GrinTokenKind.IDENTIFIER:
+            name = token.text()
+            local = self._local(name)
+            self._emit_statement(indent, f'if {local} is U:')
+            self._emit_statement(indent + 1, f'raise KeyError({name!r})')
+            return local
+        return repr(token.value())
+
+    def _emit_jump(self, indent: int, target: str) -> None:
+        try:
+            self._emit_statement(indent, f'pc = {self._context.resolve_jump(target)}')
+        except RuntimeError as e:
+            self._emit_statement(indent, f'raise RuntimeError({str(e)!r})')
+
+    # Each of these emits one statement, returning True if it ends the block
+
+    def _let(self, indent: int, index: int, statement: LetStatement) -> bool:
+        value = self._value(indent, statement.value)
+        self._emit_statement(indent, f'{self._local(statement.variable.text())} = {value}')
+        return False
+
+    def _print(self, indent: int, index: int, statement: PrintStatement) -> bool:
+        if statement.value.kind() == GrinTokenKind.IDENTIFIER:
+            value = self._value(indent, statement.value)
+            self._emit_statement(indent, f"write(f'{{{value}}}\\n')")
+        else:
+            text = f'{statement.value.value()}\n'
+            self._emit_statement(indent, f'write({text!r})')
+        return False
+
+    def _innum(self, indent: int, index: int, statement: InNumStatement) -> bool:
+        self._emit_statement(indent, 'flush()')
+        self._emit_statement(indent, 'try:')
+        self._emit_statement(indent + 1, f'{self._local(statement.variable.text())} = float(input())')
+        self._emit_statement(indent, 'except ValueError:')
+        self._emit_statement(indent + 1, 'raise RuntimeError("Invalid numeric input")')
+        return False
+
+    def _instr(self, indent: int, index: int, statement: InStrStatement) -> bool:
+        self._emit_statement(indent, 'flush()')
+        self._emit_statement(indent, f'{self._local(statement.variable.text())} = input()')
+        return False
+
+    def _arithmetic(self, indent: int, index: int, statement: ArithmeticStatement) -> bool:
+        variable = self._value(indent, statement.variable)
+        operand = self._value(indent, statement.value)
+
+        if statement.operation == 'DIV':
+            self._emit_statement(indent, f'if {operand} == 0:')
+            self._emit_statement(indent + 1, 'raise RuntimeError("Division by zero")')
+            self._emit_statement(indent, f'{variable} /= {operand}')
+        else:
+            self._emit_statement(indent, f'{variable} {_AUGMENTED_OPERATORS[statement.operation]} {operand}')
+        return False
+
+    def _goto(self, indent: int, index: int, statement: GotoStatement) -> bool:
+        target = statement.target.value()
+
+        if isinstance(target, int):
+            target = str(target)
+        elif not isinstance(target, str):
+            target = None
+
+        if statement.condition:
+            left = self._comparison_operand(indent, statement.left)
+            right = self._comparison_operand(indent, statement.right)
+            comparison = _COMPARISONS.get(statement.condition)
+
+            if comparison is None:
+                self._emit_statement(indent, f'pc = {index + 1}')
+                return True
+
+            self._emit_statement(indent, f'if {left} {comparison} {right}:')
+            indent += 1
+
+        if target is None:
+            message = f"Invalid GOTO target: {statement.target.value()}"
+            self._emit_statement(indent, f'raise RuntimeError({message!r})')
+        else:
+            self._emit_jump(indent, target)
+
+        if statement.condition:
+            self._emit_statement(indent - 1, 'else:')
+            self._emit_statement(indent, f'pc = {index + 1}')
+        return True
+
+    def _gosub(self, indent: int, index: int, statement: GosubStatement) -> bool:
+        label = statement.target.text()
+
+        if label not in self._context.label_map:
+            message = f"Label '{label}' not found"
+            self._emit_statement(indent, f'raise RuntimeError({message!r})')
+        else:
+            self._emit_statement(indent, f'return_stack.append({index + 1})')
+            self._emit_statement(indent, f'pc = {self._context.label_map[label]}')
+        return True
+
+    def _return(self, indent: int, index: int, statement: ReturnStatement) -> bool:
+        self._emit_statement(indent, 'if not return_stack:')
+        self._emit_statement(indent + 1, 'raise RuntimeError("RETURN without GOSUB")')
+        self._emit_statement(indent, 'pc = return_stack.pop()')
+        return True
+
+    def _end(self, indent: int, index: int, statement: EndStatement) -> bool:
+        self._emit_statement(indent, f'return {len(self._statements)}')
+        return True
+
+_TRANSLATORS: Dict[type, Callable[..., bool]] = {
+    LetStatement: _Translator._let,
+    PrintStatement: _Translator._print,
+    InNumStatement: _Translator._innum,
+    InStrStatement: _Translator._instr,
+    ArithmeticStatement: _Translator._arithmetic,
+    GotoStatement: _Translator._goto,
+    GosubStatement: _Translator._gosub,
+    ReturnStatement: _Translator._return,
+    EndStatement: _Translator._end,
+}
+
+def translate(
+        statements: List[LabeledStatement], label_map: Dict[str, int],
+        symbols: Optional[SymbolTable] = None) -> Translation:
+    """Translate a GRIN program into Python source, giving each variable a slot
+    in the symbol table.  Raises TranslationError if it can't be done."""
+    return _Translator(statements, label_map, symbols if symbols is not None else SymbolTable()).translate()
+
+class CompiledProgram(NamedTuple):
+    """A translated program, compiled by CPython and ready to run"""
+    function: Callable[..., int]
+    filename: str
+    line_map: List[Optional[int]]
+
+    def statement_index(self, traceback: Optional[TracebackType]) -> Optional[int]:
+        """Find the GRIN statement that was running when an exception with this
+        traceback was raised"""
+        index = None
+        while traceback is not None:
+            if traceback.tb_frame.f_code.co_filename == self.filename:
+                index = self.line_map[traceback.tb_lineno - 1]
+            traceback = traceback.tb_next
+        return index
+
+def compile_program(
+        statements: List[LabeledStatement], label_map: Dict[str, int],
+        symbols: Optional[SymbolTable] = None) -> CompiledProgram:
+    """Translate a GRIN program and compile the result once with compile().
+    Raises TranslationError if CPython can't compile what it translates to."""
+    translation = translate(statements, label_map, symbols)
+    filename = next(_FILENAMES)
+    namespace: Dict[str, Any] = {}
+    try:
+        code = compile(translation.source, filename, 'exec')
+    except (SyntaxError, ValueError, RecursionError, MemoryError) as e:
+        raise TranslationError(f"Couldn't compile the translation: {e}") from e
+    exec(code, namespace)
+    return CompiledProgram(namespace['_program'], filename, translation.line_map)
+
+def run(interpreter: GrinInterpreter) -> bool:
+    """Run an interpreter's program as Python, falling back to
+    GrinInterpreter.run() when it can't be translated.  Returns whether the
+    translated version was the one that ran."""
+    if interpreter.return_stack:
+        # Only the return addresses its own GOSUBs push are dispatchable
+        interpreter.run()
+        return False
+
+    try:
+        program = compile_program(interpreter.statements, interpreter.label_map, interpreter.symbols)
+    except TranslationError:
+        interpreter.run()
+        return False
+
+    output = interpreter.output
+    try:
+        interpreter.current_line = program.function(
+            interpreter.symbols.values, interpreter.return_stack, output.write, output.flush,
+            interpreter.input.readline, UNDEFINED)
+    except Exception as e:
+        index = program.statement_index(e.__traceback__)
+        interpreter.current_line = index if index is not None else 0
+        output.write(f"Error at line {interpreter.line_number(interpreter.current_line)}: {str(e)}\n")
+    finally:
+        output.flush()
+
+    return True
+
+__all__ = [
+    TranslationError.__name__,
+    Translation.__name__,
+    CompiledProgram.__name__,
+    translate.__name__,
+    compile_program.__name__,
+    run.__name__,
+]
@@ -0,0 +1,275 @@
+import operator
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+from grin.interpreter import GrinInterpreter
+from grin.input import InputSource
+from grin.output import OutputSink
+from grin.symbols import UNDEFINED, SymbolTable
+from grin.statements import (
+    LabeledStatement, ProgramContext, LetStatement, PrintStatement, InNumStatement, InStrStatement,
+    ArithmeticStatement, GotoStatement, GosubStatement, ReturnStatement, EndStatement
+)
+from grin.token import GrinToken, GrinTokenKind
+
+# Opcodes.  Every instruction is a tuple (opcode, a, b, c); what a, b and c
+# mean depends on the opcode, as described next to each one.  Variables are
+# referred to by their slot in the program's symbol table.
+ARITH_CONST = 0     # a: variable, b: literal operand, c: in-place operator
+ARITH_VAR = 1       # a: variable, b: operand variable, c: in-place operator
+JUMP_IF_VAR_CONST = 2  # a: comparison, b: (left variable, right literal), c: target
+JUMP_IF_VAR_VAR = 3    # a: comparison, b: (left variable, right variable), c: target
+JUMP = 4            # a: target
+LET_CONST = 5       # a: variable, b: literal
+LET_VAR = 6         # a: variable, b: source variable
+PRINT_CONST = 7     # a: the literal's text, newline included
+PRINT_VAR = 8       # a: variable
+DIV = 9             # a: variable, b: whether the operand is a variable, c: operand
+GOSUB = 10          # a: target
+RETURN = 11
+END = 12
+INNUM = 13          # a: variable
+INSTR = 14          # a: variable
+FAIL = 15           # a: message of the RuntimeError to raise
+EXEC = 16           # a: compiled statement, returning the next pc or None
+
+_COMPARISONS = {
+    '<': operator.lt,
+    '>': operator.gt,
+    '=': operator.eq,
+}
+
+_ARITHMETIC_OPERATIONS = {
+    'ADD': operator.iadd,
+    'SUB': operator.isub,
+    'MULT': operator.imul,
+}
+
+Instruction = Tuple[int, Any, Any, Any]
+
+class Bytecode(NamedTuple):
+    """A GRIN program compiled into a flat instruction stream"""
+    code: Tuple[Instruction, ...]
+    return_stack: List[int]
+    symbols: SymbolTable
+    output: OutputSink
+    input: InputSource
+
+def _is_variable(token: GrinToken) -> bool:
+    return token.kind() == GrinTokenKind.IDENTIFIER
+
+def _slot(token: GrinToken, context: ProgramContext) -> int:
+    return context.symbols.slot(token.text())
+
+def _compile_jump(target: str, context: ProgramContext) -> Instruction:
+    """Resolve a literal GOTO target, returning either a JUMP or the FAIL that
+    the jump would raise"""
+    try:
+        return (JUMP, context.resolve_jump(target), None, None)
+    except RuntimeError as e:
+        return (FAIL, str(e), None, None)
+
+def _compile_goto(statement: GotoStatement, index: int, context: ProgramContext) -> Instruction:
+    if _is_variable(statement.target):
+        return (EXEC, statement.compile(index, context), None, None)
+
+    target = statement.target.value()
+
+    if isinstance(target, int):
+        jump = _compile_jump(str(target), context)
+    elif isinstance(target, str):
+        jump = _compile_jump(target, context)
+    else:
+        jump = (FAIL, f"Invalid GOTO target: {target}", None, None)
+
+    if not statement.condition:
+        return jump
+
+    compare = _COMPARISONS.get(statement.condition)
+
+    if jump[0] != JUMP or compare is None or not _is_variable(statement.left):
+        return (EXEC, statement.compile(index, context), None, None)
+    elif _is_variable(statement.right):
+        return (JUMP_IF_VAR_VAR, compare, (_slot(statement.left, context), _slot(statement.right, context)), jump[1])
+    else:
+        return (JUMP_IF_VAR_CONST, compare, (_slot(statement.left, context), statement.right.value()), jump[1])
+
+def _compile_statement(statement: Any, index: int, context: ProgramContext) -> Instruction:
+    kind = type(statement)
+
+    if kind is LetStatement:
+        if _is_variable(statement.value):
+            return (LET_VAR, _slot(statement.variable, context), _slot(statement.value, context), None)
+        return (LET_CONST, _slot(statement.variable, context), statement.value.value(), None)
+    elif kind is ArithmeticStatement:
+        if statement.operation == 'DIV':
+            if _is_variable(statement.value):
+                return (DIV, _slot(statement.variable, context), True, _slot(statement.value, context))
+            return (DIV, _slot(statement.variable, context), False, statement.value.value())
+        elif statement.operation not in _ARITHMETIC_OPERATIONS:
+            return (EXEC, statement.compile(index, context), None, None)
+
+        apply = _ARITHMETIC_OPERATIONS[statement.operation]
+        if _is_variable(statement.value):
+            return (ARITH_VAR, _slot(statement.variable, context), _slot(statement.value, context), apply)
+        return (ARITH_CONST, _slot(statement.variable, context), statement.value.value(), apply)
+    elif kind is GotoStatement:
+        return _compile_goto(statement, index, context)
+    elif kind is PrintStatement:
+        if _is_variable(statement.value):
+            return (PRINT_VAR, _slot(statement.value, context), None, None)
+        return (PRINT_CONST, f'{statement.value.value()}\n', None, None)
+    elif kind is GosubStatement:
+        label = statement.target.text()
+        if label not in context.label_map:
+            return (FAIL, f"Label '{label}' not found", None, None)
+        return (GOSUB, context.label_map[label], None, None)
+    elif kind is ReturnStatement:
+        return (RETURN, None, None, None)
+    elif kind is EndStatement:
+        return (END, None, None, None)
+    elif kind is InNumStatement:
+        return (INNUM, _slot(statement.variable, context), None, None)
+    elif kind is InStrStatement:
+        return (INSTR, _slot(statement.variable, context), None, None)
+    else:
+        return (EXEC, statement.compile(index, context), None, None)
+
+def compile_program(
+        statements: List[LabeledStatement], label_map: Dict[str, int],
+        return_stack: Optional[List[int]] = None,
+        symbols: Optional[SymbolTable] = None,
+        output: Optional[OutputSink] = None,
+        input: Optional[InputSource] = None) -> Bytecode:
+    """Compile a list of labeled statements into bytecode that will use the
+    given return stack, symbol table, output sink and input source (or new
+    ones)"""
+    if return_stack is None:
+        return_stack = []
+
+    context = ProgramContext(dict(label_map), len(statements), return_stack, symbols, output, input)
+    code = tuple(_compile_statement(labeled.statement, index, context)
+                 for index, labeled in enumerate(statements))
+    return Bytecode(code, return_stack, context.symbols, context.output, context.input)
+
+def execute(bytecode: Bytecode, line_map: Optional[List[int]] = None) -> int:
+    """Run bytecode, printing exactly what the interpreter would print.
+    Returns the pc execution stopped at.  If the program was optimized,
+    line_map gives each instruction's original index for error messages."""
+    code = bytecode.code
+    return_stack = bytecode.return_stack
+    values = bytecode.symbols.values
+    names = bytecode.symbols.names
+    write = bytecode.output.write
+    flush = bytecode.output.flush
+    readline = bytecode.input.readline
+    end = len(code)
+    pc = 0
+
+    try:
+        while pc < end:
+            op, a, b, c = code[pc]
+
+            if op == ARITH_CONST:
+                value = values[a]
+                if value is UNDEFINED:
+                    raise RuntimeError(f"Variable '{names[a]}' not defined")
+                values[a] = c(value, b)
+                pc += 1
+            elif op == JUMP_IF_VAR_CONST:
+                value = values[b[0]]
+                if value is UNDEFINED:
+                    raise KeyError(names[b[0]])
+                pc = c if a(value, b[1]) else pc + 1
+            elif op == JUMP_IF_VAR_VAR:
+                left, right = values[b[0]], values[b[1]]
+                if left is UNDEFINED:
+                    raise KeyError(names[b[0]])
+                if right is UNDEFINED:
+                    raise KeyError(names[b[1]])
+                pc = c if a(left, right) else pc + 1
+            elif op == ARITH_VAR:
+                value, operand = values[a], values[b]
+                if value is UNDEFINED:
+                    raise RuntimeError(f"Variable '{names[a]}' not defined")
+                if operand is UNDEFINED:
+                    raise RuntimeError(f"Variable '{names[b]}' not defined")
+                values[a] = c(value, operand)
+                pc += 1
+            elif op == JUMP:
+                pc = a
+            elif op == LET_CONST:
+                values[a] = b
+                pc += 1
+            elif op == LET_VAR:
+                value = values[b]
+                if value is UNDEFINED:
+                    raise RuntimeError(f"Variable '{names[b]}' not defined")
+                values[a] = value
+                pc += 1
+            elif op == PRINT_VAR:
+                value = values[a]
+                if value is UNDEFINED:
+                    raise RuntimeError(f"Variable '{names[a]}' not defined")
+                write(f'{value}\n')
+                pc += 1
+            elif op == PRINT_CONST:
+                write(a)
+                pc += 1
+            elif op == GOSUB:
+                return_stack.append(pc + 1)
+                pc = a
+            elif op == RETURN:
+                if not return_stack:
+                    raise RuntimeError("RETURN without GOSUB")
+                pc = return_stack.pop()
+            elif op == DIV:
+                if values[a] is UNDEFINED:
+                    raise RuntimeError(f"Variable '{names[a]}' not defined")
+                if b:
+                    operand = values[c]
+                    if operand is UNDEFINED:
+                        raise RuntimeError(f"Variable '{names[c]}' not defined")
+                else:
+                    operand = c
+                if operand == 0:
+                    raise RuntimeError("Division by zero")
+                values[a] /= operand
+                pc += 1
+            elif op == END:
+                pc = end
+            elif op == INNUM:
+                flush()
+                try:
+                    values[a] = float(readline())
+                except ValueError:
+                    raise RuntimeError("Invalid numeric input")
+                pc += 1
+            elif op == INSTR:
+                flush()
+                values[a] = readline()
+                pc += 1
+            elif op == FAIL:
+                raise RuntimeError(a)
+            else:
+                target = a()
+                pc = pc + 1 if target is None else target
+    except Exception as e:
+        line = pc if line_map is None else line_map[pc]
+        write(f"Error at line {line + 1}: {str(e)}\n")
+    finally:
+        flush()
+
+    return pc
+
+def run(interpreter: GrinInterpreter) -> None:
+    """Run an interpreter's program on the VM instead of GrinInterpreter.run()"""
+    bytecode = compile_program(
+        interpreter.statements, interpreter.label_map, interpreter.return_stack,
+        interpreter.symbols, interpreter.output, interpreter.input)
+    interpreter.current_line = execute(bytecode, interpreter.line_map)
+
+__all__ = [
+    Bytecode.__name__,
+    compile_program.__name__,
+    execute.__name__,
+    run.__name__,
+]
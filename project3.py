@@ -1,13 +1,24 @@
-from grin.lexing import to_tokens
+from grin.scanner import to_tokens
+from grin.cache import cache_path, read_cache, write_cache
+from grin.checkpoint import CHECKPOINT_INTERVAL, run_with_checkpoints
 from grin.interpreter import GrinInterpreter, create_statement
+from grin.input import InputSource, ConsoleInput, StreamInput
+from grin.output import UnbufferedOutput
+from grin.profiler import profile as profile_run
+from grin.sampling import SamplingProfiler
 from grin.statements import LabeledStatement
-from typing import List
+from grin.token import GrinTokenKind
+import argparse
+import sys
+from typing import List, Optional
 
-def read_program() -> List[str]:
+def read_program(source: Optional[InputSource] = None) -> List[str]:
     """Read program lines until a '.' is encountered"""
+    if source is None:
+        source = ConsoleInput()
     lines = []
     while True:
-        line = input().strip()
+        line = source.readline().strip()
         if line == '.':
             lines.append(line)
             break
@@ -24,8 +35,8 @@ def process_line(line: str, line_number: int, interpreter: GrinInterpreter) -> N
     
     # Handle labeled statements
     label = None
-    if len(tokens) >= 2 and tokens[1].kind == 'COLON':
-        label = tokens[0].text
+    if len(tokens) >= 2 and tokens[1].kind() == GrinTokenKind.COLON:
+        label = tokens[0].text()
         tokens = tokens[2:]  # Remove label and colon from tokens
     
     if tokens:  # Only create statement if there are tokens left
@@ -33,28 +44,159 @@ def process_line(line: str, line_number: int, interpreter: GrinInterpreter) -> N
         labeled_statement = LabeledStatement(label, statement)
         interpreter.add_statement(labeled_statement)
 
-def execute_program(lines: List[str]) -> None:
-    """Execute the GRIN program"""
-    interpreter = GrinInterpreter()
-    
+def stream_program(interpreter: GrinInterpreter, source: Optional[InputSource] = None) -> bool:
+    """Read a program up to its '.' line, loading each line into the
+    interpreter as soon as it has been read, so that no line is kept once it
+    has been turned into a statement.  As with read_program() followed by
+    load_program(), the whole program is read even when a line has an
+    error, after which the first one is printed and False returned."""
+    if source is None:
+        source = ConsoleInput()
+    error = None
+    line_number = 0
+    while True:
+        line = source.readline().strip()
+        if line == '.':
+            break
+        elif not line:
+            continue
+        line_number += 1
+        if error is None:
+            try:
+                process_line(line, line_number, interpreter)
+            except Exception as e:
+                error = f"Error on line {line_number}: {str(e)}"
+    if error is not None:
+        print(error)
+        return False
+    return True
+
+# What .grinc files written by load_program() are marked as made by, since it
+# doesn't check programs quite as grin.cache.load_program() does
+CACHE_LOADER = 'project3.process_line'
+
+def load_program(lines: List[str], interpreter: GrinInterpreter, cache: Optional[str] = None) -> bool:
+    """Load the program's lines into the interpreter, printing the first
+    error and returning False if there is one.  With a cache directory, a
+    program loaded before is read back from its .grinc file there, skipping
+    lexing and parsing, and one that isn't is written there once loaded."""
+    path = cache_path(cache, lines, CACHE_LOADER) if cache is not None else None
+    if path is not None:
+        statements = read_cache(path, lines, CACHE_LOADER)
+        if statements is not None:
+            for statement in statements:
+                interpreter.add_statement(statement)
+            return True
+
     for line_number, line in enumerate(lines, start=1):
         try:
             process_line(line, line_number, interpreter)
         except Exception as e:
             print(f"Error on line {line_number}: {str(e)}")
-            return
+            return False
+
+    if path is not None:
+        try:
+            write_cache(path, lines, interpreter.statements, CACHE_LOADER)
+        except OSError as e:
+            print(f"Couldn't cache the program: {e}", file = sys.stderr)
+    return True
+
+def execute_program(
+        lines: List[str], optimize: bool = False, unbuffered: bool = False,
+        source: Optional[InputSource] = None, profile: bool = False,
+        profile_json: Optional[str] = None, sample: Optional[str] = None,
+        sample_interval: float = 0.01, cache: Optional[str] = None, checkpoint: Optional[str] = None,
+        checkpoint_interval: int = CHECKPOINT_INTERVAL) -> None:
+    """Execute the GRIN program, optimizing it first if asked to.  INNUM and
+    INSTR read from source, which should be the one the program was read
+    from, so that the input after the '.' isn't lost.  When profiling, the
+    report goes to stderr and the JSON, if asked for, to profile_json.  When
+    sampling, collapsed stacks are written to sample.  With a cache
+    directory, the loaded program is kept there for next time.  With a
+    checkpoint file, where the program has got to is written there every
+    checkpoint_interval steps, and a run that was stopped carries on from
+    there."""
+    interpreter = GrinInterpreter(UnbufferedOutput() if unbuffered else None, source)
+    if load_program(lines, interpreter, cache):
+        run_program(
+            interpreter, optimize, profile, profile_json, sample, sample_interval, checkpoint, checkpoint_interval)
+
+def run_program(
+        interpreter: GrinInterpreter, optimize: bool = False, profile: bool = False,
+        profile_json: Optional[str] = None, sample: Optional[str] = None, sample_interval: float = 0.01,
+        checkpoint: Optional[str] = None, checkpoint_interval: int = CHECKPOINT_INTERVAL) -> None:
+    """Run a program already loaded into the interpreter, as
+    execute_program() does once it has loaded one"""
+    if optimize:
+        print(interpreter.optimize(), file = sys.stderr)
 
     try:
-        interpreter.run()
+        if profile or profile_json:
+            result = profile_run(interpreter)
+            if profile:
+                print(result.report(), file = sys.stderr)
+            if profile_json:
+                with open(profile_json, 'w', encoding = 'utf-8') as file:
+                    result.dump(file)
+        elif sample:
+            with SamplingProfiler(interpreter, sample_interval) as sampler:
+                interpreter.run()
+            with open(sample, 'w', encoding = 'utf-8') as file:
+                sampler.write(file)
+        elif checkpoint:
+            if run_with_checkpoints(interpreter, checkpoint, checkpoint_interval):
+                print(f"Carried on from the checkpoint in {checkpoint}", file = sys.stderr)
+        else:
+            interpreter.run()
     except Exception as e:
         print(f"Runtime error: {str(e)}")
 
-def main() -> None:
+def parse_arguments(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Parse the command line options"""
+    parser = argparse.ArgumentParser(description = 'Run a GRIN program read from standard input')
+    parser.add_argument('--optimize', action = 'store_true',
+                        help = 'optimize the program first, printing what was done to stderr')
+    parser.add_argument('--unbuffered', action = 'store_true',
+                        help = 'write each PRINT as soon as it happens')
+    parser.add_argument('--profile', action = 'store_true',
+                        help = 'time every line, printing a report to stderr')
+    parser.add_argument('--profile-json', metavar = 'PATH',
+                        help = 'time every line, writing the profile to PATH as JSON')
+    parser.add_argument('--sample', metavar = 'PATH',
+                        help = 'sample where the program is, writing collapsed stacks to PATH for a flamegraph')
+    parser.add_argument('--sample-interval', metavar = 'SECONDS', type = float, default = 0.01,
+                        help = 'how often to sample (default: %(default)s)')
+    parser.add_argument('--cache', metavar = 'DIRECTORY',
+                        help = 'keep loaded programs in DIRECTORY, so loading them again is quicker')
+    parser.add_argument('--checkpoint', metavar = 'PATH',
+                        help = 'save where the program has got to in PATH as it runs, '
+                               'and carry on from there if it was stopped')
+    parser.add_argument('--checkpoint-interval', metavar = 'STEPS', type = int, default = CHECKPOINT_INTERVAL,
+                        help = 'how often to save a checkpoint (default: every %(default)s steps)')
+    return parser.parse_args(argv)
+
+def main(argv: Optional[List[str]] = None) -> None:
     """Main entry point for the GRIN interpreter"""
+    arguments = parse_arguments(argv)
+    # A terminal gets input() and its line editing; anything piped in is
+    # read in large chunks
+    source = ConsoleInput() if sys.stdin.isatty() else StreamInput()
     try:
-        program_lines = read_program()
-        if program_lines:
-            execute_program(program_lines)
+        if arguments.cache is not None:
+            # Looking a program up in the cache takes all of its lines
+            program_lines = read_program(source)
+            if program_lines:
+                execute_program(
+                    program_lines, arguments.optimize, arguments.unbuffered, source,
+                    arguments.profile, arguments.profile_json, arguments.sample, arguments.sample_interval,
+                    arguments.cache, arguments.checkpoint, arguments.checkpoint_interval)
+        else:
+            interpreter = GrinInterpreter(UnbufferedOutput() if arguments.unbuffered else None, source)
+            if stream_program(interpreter, source):
+                run_program(
+                    interpreter, arguments.optimize, arguments.profile, arguments.profile_json,
+                    arguments.sample, arguments.sample_interval, arguments.checkpoint, arguments.checkpoint_interval)
     except KeyboardInterrupt:
         print("\nProgram terminated by user.")
     except Exception as e:
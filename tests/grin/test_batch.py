@@ -0,0 +1,80 @@
+import contextlib
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from grin.batch import BatchJob, find_jobs, read_manifest, run_job, run_batch
+from grin.__main__ import main
+
+class TestBatch(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def write(self, name: str, *lines: str) -> str:
+        path = os.path.join(self.directory, name)
+        with open(path, 'w', encoding = 'utf-8') as file:
+            file.write(''.join(f'{line}\n' for line in lines))
+        return path
+
+    def test_finding_programs_and_their_input(self):
+        first = self.write('first.grin', 'PRINT 1', '.')
+        first_input = self.write('first.in', '5')
+        second = self.write('second.grin', 'PRINT 2', '.')
+        self.write('notes.txt', 'not a program')
+        self.assertEqual(find_jobs(self.directory), [BatchJob(first, first_input), BatchJob(second, None)])
+
+    def test_reading_a_manifest(self):
+        manifest = self.write('jobs.txt', '# A comment', '', 'a.grin a.in', 'b.grin')
+        self.assertEqual(read_manifest(manifest), [
+            BatchJob(os.path.join(self.directory, 'a.grin'), os.path.join(self.directory, 'a.in')),
+            BatchJob(os.path.join(self.directory, 'b.grin'), None),
+        ])
+        with self.assertRaises(ValueError):
+            read_manifest(self.write('bad.txt', 'a.grin a.in extra'))
+
+    def test_running_a_job_reads_input_after_the_dot_then_the_input_file(self):
+        program = self.write('echo.grin', 'INSTR A', 'INNUM B', 'PRINT A', 'PRINT B', '.', 'first')
+        result = run_job(BatchJob(program, self.write('echo.in', '2')))
+        self.assertEqual((result.stdout, result.error), ('first\n2.0\n', None))
+        self.assertEqual(result.worker, os.getpid())
+
+    def test_program_errors_are_part_of_the_output(self):
+        result = run_job(BatchJob(self.write('bad.grin', 'PRINT Q', '.')))
+        self.assertEqual((result.stdout, result.error), ("Error at line 1: Variable 'Q' not defined\n", None))
+
+    def test_jobs_that_cannot_run_have_an_error(self):
+        result = run_job(BatchJob(self.write('unfinished.grin', 'PRINT 1')))
+        self.assertEqual(result.error, 'EOFError: EOF when reading a line')
+        result = run_job(BatchJob(os.path.join(self.directory, 'missing.grin')))
+        self.assertTrue(result.error.startswith('FileNotFoundError'))
+
+    def test_running_a_batch_across_workers(self):
+        jobs = [BatchJob(self.write(f'p{n}.grin', f'PRINT {n}', '.')) for n in range(6)]
+        results = list(run_batch(jobs, workers = 2))
+        self.assertEqual(sorted(result.stdout for result in results), [f'{n}\n' for n in range(6)])
+        self.assertNotIn(os.getpid(), {result.worker for result in results})
+
+    def test_command_line(self):
+        self.write('one.grin', 'LET A 1', 'ADD A 2', 'PRINT A', '.')
+        output = os.path.join(self.directory, 'results.jsonl')
+        with contextlib.redirect_stderr(io.StringIO()) as stderr:
+            self.assertEqual(main(['batch', self.directory, '-o', output, '-j', '1']), 0)
+        with open(output, encoding = 'utf-8') as file:
+            results = [json.loads(line) for line in file]
+        self.assertEqual([result['stdout'] for result in results], ['3\n'])
+        self.assertIn('Ran 1 program(s)', stderr.getvalue())
+
+    def test_importing_grin_leaves_the_commands_unloaded(self):
+        loaded = subprocess.run(
+            [sys.executable, '-c', 'import sys, grin; print(sorted({"asyncio", "grin.batch", "grin.server"} & '
+                                   'set(sys.modules)))'],
+            capture_output = True, text = True, check = True).stdout
+        self.assertEqual(loaded, '[]\n')
+
+if __name__ == '__main__':
+    unittest.main()
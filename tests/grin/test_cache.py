@@ -0,0 +1,238 @@
+import array
+import contextlib
+import io
+import marshal
+import os
+import tempfile
+import unittest
+from unittest import mock
+import grin.cache
+from grin.cache import (
+    cache_key, cache_path, read_cache, write_cache, encode, decode, load_program, statement_parts, CacheStats,
+    ProgramCache
+)
+from grin.generator import generate
+from grin.interpreter import GrinInterpreter, create_statement
+from grin.output import MemoryOutput
+from grin.parsing import GrinParseError, parse
+from grin.statements import LabeledStatement
+from tests.grin.test_interpreter import load
+from tests.grin.test_vm import PROGRAMS
+import project3
+
+EVERY_STATEMENT = [
+    'LET A 1', 'LET B 2.5', 'LET C "text"', 'LET D A', 'PRINT A', 'PRINT "hi"',
+    'INNUM E', 'INSTR F', 'ADD A 1', 'SUB A B', 'MULT A 2.0', 'DIV A 3',
+    'L: GOTO 2', 'GOTO "L"', 'GOTO -1 IF A < 3', 'GOTO "L" IF C = "text"', 'GOTO A IF 1 <= B',
+    'GOSUB L', 'M: RETURN', 'END',
+]
+
+class TestCache(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def assertSameStatements(self, decoded, original):
+        self.assertEqual(len(decoded), len(original))
+        for before, after in zip(original, decoded):
+            self.assertEqual(after.label, before.label)
+            self.assertIs(type(after.statement), type(before.statement))
+            self.assertEqual(vars(after.statement), vars(before.statement))
+
+    def test_every_kind_of_statement_survives_the_trip(self):
+        statements = load(*EVERY_STATEMENT).statements
+        self.assertSameStatements(decode(encode(statements)), statements)
+
+    def test_the_parts_of_a_statement(self):
+        statements = [labeled.statement for labeled in load('ADD A 2', 'GOTO "L" IF A < 3', 'END').statements]
+        self.assertEqual([(keyword, [token.text() for token in tokens])
+                          for keyword, tokens in map(statement_parts, statements)],
+                         [('ADD', ['A', '2']), ('GOTO', ['"L"', 'A', '3']), ('END', [])])
+        with self.assertRaises(ValueError):
+            statement_parts(object())
+
+    def test_reading_what_was_written(self):
+        path = cache_path(self.directory, EVERY_STATEMENT)
+        self.assertIsNone(read_cache(path, EVERY_STATEMENT))
+        statements = load(*EVERY_STATEMENT).statements
+        write_cache(path, EVERY_STATEMENT, statements)
+        self.assertSameStatements(read_cache(path, EVERY_STATEMENT), statements)
+
+    def test_a_different_source_is_a_miss(self):
+        path = os.path.join(self.directory, 'program.grinc')
+        write_cache(path, ['PRINT 1'], load('PRINT 1').statements)
+        self.assertIsNone(read_cache(path, ['PRINT 2']))
+        self.assertNotEqual(cache_key(['PRINT 1']), cache_key(['PRINT 2']))
+        self.assertNotEqual(cache_key(['PRINT 1', 'PRINT 2']), cache_key(['PRINT 1PRINT 2']))
+
+    def test_a_different_cache_version_is_a_miss(self):
+        path = os.path.join(self.directory, 'program.grinc')
+        write_cache(path, ['PRINT 1'], load('PRINT 1').statements)
+        with mock.patch('grin.cache.CACHE_VERSION', -1):
+            self.assertIsNone(read_cache(path, ['PRINT 1']))
+
+    def test_damaged_files_are_a_miss(self):
+        path = os.path.join(self.directory, 'program.grinc')
+        write_cache(path, ['PRINT 1'], load('PRINT 1').statements)
+        with open(path, 'rb') as file:
+            data = file.read()
+        for damaged in (b'', data[:10], data[:-3], data[:-3] + b'xyz'):
+            with self.subTest(damaged = damaged):
+                with open(path, 'wb') as file:
+                    file.write(damaged)
+                self.assertIsNone(read_cache(path, ['PRINT 1']))
+
+    def test_files_that_decode_badly_are_a_miss(self):
+        # Columns that don't fit together, with a checksum that matches them
+        path = os.path.join(self.directory, 'program.grinc')
+        columns = list(marshal.loads(encode(load('LET A 1', 'PRINT A').statements)))
+        damaged = {
+            'text': columns[:4] + [array.array('I', [99, 99, 99]).tobytes()] + columns[5:],
+            'keyword': columns[:1] + [bytes([200, 1])] + columns[2:],
+            'too few tokens': columns[:3] + [columns[3][:1]] + columns[4:],
+        }
+        for name, columns in damaged.items():
+            with self.subTest(damaged = name):
+                with mock.patch('grin.cache.encode', return_value = marshal.dumps(tuple(columns))):
+                    write_cache(path, ['PRINT 1'], [])
+                self.assertIsNone(read_cache(path, ['PRINT 1']))
+
+    def test_loaders_do_not_share_files(self):
+        lines = ['PRINT 1']
+        self.assertTrue(project3.load_program(lines, GrinInterpreter(), self.directory))
+        self.assertIsNone(read_cache(cache_path(self.directory, lines), lines))
+        ProgramCache(directory = self.directory).load(lines)
+        self.assertEqual(sorted(os.listdir(self.directory)), sorted([
+            os.path.basename(cache_path(self.directory, lines)),
+            os.path.basename(cache_path(self.directory, lines, project3.CACHE_LOADER))]))
+
+    def test_loading_from_the_cache_skips_lexing(self):
+        for name, lines in PROGRAMS.items():
+            with self.subTest(name = name):
+                first = GrinInterpreter()
+                self.assertTrue(project3.load_program(lines, first, self.directory))
+                second = GrinInterpreter()
+                with mock.patch('project3.to_tokens', side_effect = AssertionError('lexed')):
+                    self.assertTrue(project3.load_program(lines, second, self.directory))
+                self.assertSameStatements(second.statements, first.statements)
+                self.assertEqual(second.label_map, first.label_map)
+
+    def test_programs_that_fail_to_load_are_not_cached(self):
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            self.assertFalse(project3.load_program(['PRINT 1', 'JUMP 2'], GrinInterpreter(), self.directory))
+        self.assertEqual(output.getvalue(), 'Error on line 2: Unknown command: JUMP\n')
+        self.assertEqual(os.listdir(self.directory), [])
+
+def parse_program(lines):
+    """The statements of a program, made one line at a time from parse()"""
+    statements = []
+    for tokens in parse(lines):
+        label = None
+        if len(tokens) >= 2 and tokens[1].text() == ':':
+            label, tokens = tokens[0].text(), tokens[2:]
+        statements.append(LabeledStatement(label, create_statement(tokens)))
+    return statements
+
+class TestLoadProgram(unittest.TestCase):
+    assertSameStatements = TestCache.assertSameStatements
+
+    def test_the_same_statements_as_parsing(self):
+        programs = [EVERY_STATEMENT, EVERY_STATEMENT + ['.', 'PRINT "after"', '"'], generate(2000, 0).lines]
+        for lines in programs:
+            with self.subTest(lines = lines[:3]):
+                self.assertSameStatements(load_program(lines), parse_program(lines))
+
+    def test_only_unusual_lines_are_parsed(self):
+        lines = generate(2000, 0).lines + ['.']
+        with mock.patch('grin.cache._parse_line', wraps = grin.cache._parse_line) as parse_line:
+            load_program(lines)
+        self.assertEqual(parse_line.call_count, 1)  # The '.' at the end
+
+    def test_the_same_errors_as_parsing(self):
+        for lines in [
+                ['PRINT 1', 'LET A "x'], ['PRINT 1', 'PRINT -'], ['PRINT é'], ['JUMP 2'], ['PRINT 1', ''],
+                ['L:'], ['L: .'], ['A B'], ['LET 1 A'], ['GOSUB X IF A < 1'], ['GOTO 1 IF A'],
+                ['PRINT 1 2', 'JUMP 3'], ['PRINT 1\nPRINT 2'], ['LET: PRINT 1'], ['GOTO 1.5'], []]:
+            with self.subTest(lines = lines):
+                try:
+                    expected = parse_program(lines)
+                except Exception as e:
+                    with self.assertRaises(type(e)) as error:
+                        load_program(lines)
+                    self.assertEqual(str(error.exception), str(e))
+                else:
+                    self.assertSameStatements(load_program(lines), expected)
+
+class TestProgramCache(unittest.TestCase):
+    def test_hits_and_misses(self):
+        cache = ProgramCache()
+        first = cache.load(['LET A 1', 'PRINT A', '.'])
+        self.assertIs(cache.load(['LET A 1', 'PRINT A', '.']), first)
+        self.assertIsNot(cache.load(['PRINT 2', '.']), first)
+        self.assertEqual(cache.stats(), CacheStats(1, 2, 0, 2, first.size + cache.load(['PRINT 2', '.']).size))
+
+    def test_least_recently_used_are_evicted_first(self):
+        cache = ProgramCache(max_entries = 2)
+        one, two = cache.load(['PRINT 1']), cache.load(['PRINT 2'])
+        cache.load(['PRINT 1'])
+        cache.load(['PRINT 3'])
+        self.assertEqual((len(cache), cache.stats().evictions), (2, 1))
+        self.assertIs(cache.load(['PRINT 1']), one)
+        self.assertIsNot(cache.load(['PRINT 2']), two)
+
+    def test_memory_limit(self):
+        size = ProgramCache().load(['PRINT 1']).size
+        cache = ProgramCache(max_bytes = size * 2)
+        for n in range(5):
+            cache.load([f'PRINT {n}'])
+        self.assertEqual(len(cache), 2)
+        self.assertLessEqual(cache.stats().size, size * 2)
+        cache.load(['PRINT 1'] * 10)  # Too big to keep at all
+        self.assertEqual(len(cache), 2)
+
+    def test_programs_that_fail_to_load_are_not_cached(self):
+        cache = ProgramCache()
+        with self.assertRaises(GrinParseError):
+            cache.load(['PRINT'])
+        self.assertEqual((len(cache), cache.stats().misses), (0, 1))
+
+    def test_loaded_programs_cannot_be_changed(self):
+        program = ProgramCache().load(['L: PRINT 1'])
+        with self.assertRaises(TypeError):
+            program.label_map['M'] = 0
+        with self.assertRaises(AttributeError):
+            program.statements.append(None)
+
+    def test_every_run_starts_afresh(self):
+        program = ProgramCache().load(['L: ADD A 1', 'PRINT A', 'GOSUB M', 'END', 'M: RETURN'])
+        first, second = program.interpreter(MemoryOutput()), program.interpreter(MemoryOutput())
+        first.variables = {'A': 10}
+        first.run()
+        second.run()
+        self.assertEqual(first.output.getvalue(), '11\n')
+        self.assertEqual(second.output.getvalue(), "Error at line 1: Variable 'A' not defined\n")
+        self.assertIsNot(first.return_stack, second.return_stack)
+        first.optimize()
+        self.assertEqual(len(program.statements), 5)
+
+    def test_falling_back_to_grinc_files(self):
+        with tempfile.TemporaryDirectory() as directory:
+            ProgramCache(directory = directory).load(['PRINT 1'])
+            self.assertEqual(len(os.listdir(directory)), 1)
+            with mock.patch('grin.cache.load_program', side_effect = AssertionError('loaded')):
+                program = ProgramCache(directory = directory).load(['PRINT 1'])
+            self.assertEqual(len(program.statements), 1)
+
+    def test_a_directory_that_cannot_be_written_to(self):
+        with tempfile.TemporaryDirectory() as directory:
+            blocker = os.path.join(directory, 'blocker')
+            with open(blocker, 'w'):
+                pass
+            cache = ProgramCache(directory = os.path.join(blocker, 'cache'))
+            self.assertEqual(len(cache.load(['PRINT 1']).statements), 1)
+            self.assertEqual(os.listdir(directory), ['blocker'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,145 @@
+import contextlib
+import io
+import unittest
+from grin.cfg import (
+    build_cfg, find_superinstructions, Superinstruction,
+    ARITHMETIC_BRANCH, LET_ARITHMETIC, PRINT_RUN
+)
+from grin.exceptions import GrinLimitError, OUTPUT_LIMIT
+from grin.output import MemoryOutput
+from tests.grin.test_interpreter import load, run_output
+from tests.grin.test_vm import PROGRAMS
+
+def cfg_of(*lines):
+    interpreter = load(*lines)
+    return build_cfg(interpreter.statements, interpreter.label_map)
+
+class TestControlFlowGraph(unittest.TestCase):
+    def test_blocks_start_at_targets_and_after_jumps(self):
+        cfg = cfg_of(
+            'LET I 0', 'L: ADD I 1', 'GOTO "L" IF I < 3', 'GOSUB S', 'END',
+            'S: PRINT I', 'RETURN')
+        self.assertEqual(cfg.leaders(), [0, 1, 3, 4, 5])
+        self.assertEqual([len(block) for block in cfg.blocks], [1, 2, 1, 1, 2])
+
+    def test_successors_and_predecessors(self):
+        cfg = cfg_of(
+            'LET I 0', 'L: ADD I 1', 'GOTO "L" IF I < 3', 'GOSUB S', 'END',
+            'S: PRINT I', 'RETURN')
+        successors = {block.number: [successor.number for successor in block.successors]
+                      for block in cfg.blocks}
+        self.assertEqual(successors, {0: [1], 1: [1, 2], 2: [4], 3: [], 4: [3]})
+        self.assertEqual([block.number for block in cfg.blocks[1].predecessors], [0, 1])
+
+    def test_every_return_leads_after_every_gosub(self):
+        cfg = cfg_of(
+            'GOSUB A', 'GOSUB B', 'PRINT "after"', 'END',
+            'A: PRINT "a"', 'RETURN', 'B: GOSUB A', 'RETURN')
+        successors = {block.number: [successor.number for successor in block.successors]
+                      for block in cfg.blocks}
+        self.assertEqual(successors, {0: [3], 1: [4], 2: [], 3: [1, 2, 5], 4: [3], 5: [1, 2, 5]})
+        self.assertEqual([block.number for block in cfg.blocks[2].predecessors], [3, 5])
+        self.assertEqual([block.number for block in cfg.blocks[3].predecessors], [0, 4])
+        self.assertEqual(cfg.reachable(), {0, 1, 2, 3, 4, 5})
+
+    def test_falling_off_the_end(self):
+        cfg = cfg_of('PRINT 1', 'GOTO 1 IF 1 > 2')
+        self.assertTrue(cfg.blocks[0].falls_off_end)
+        self.assertFalse(cfg_of('END').blocks[0].falls_off_end)
+
+    def test_unreachable_blocks(self):
+        cfg = cfg_of('GOTO 3', 'PRINT "dead"', 'PRINT "live"')
+        self.assertEqual(cfg.reachable(), {0, 2})
+
+    def test_dynamic_jumps_make_every_statement_a_leader(self):
+        cfg = cfg_of('LET T 3', 'PRINT 1', 'GOTO T', 'PRINT 2')
+        self.assertTrue(cfg.has_dynamic_jumps)
+        self.assertEqual(cfg.leaders(), [0, 1, 2, 3])
+        self.assertEqual(cfg.reachable(), {0, 1, 2, 3})
+
+    def test_block_of(self):
+        cfg = cfg_of('LET I 0', 'L: ADD I 1', 'GOTO "L" IF I < 3', 'END')
+        self.assertEqual([cfg.block_of(index).number for index in range(4)], [0, 1, 1, 2])
+
+class TestSuperinstructions(unittest.TestCase):
+    def test_finds_common_pairs_and_print_runs(self):
+        cfg = cfg_of(
+            'LET I 0', 'ADD I 1', 'GOTO 2 IF I < 3', 'LET X I', 'MULT X 2',
+            'PRINT I', 'PRINT X', 'PRINT "done"')
+        self.assertEqual(find_superinstructions(cfg), [
+            Superinstruction(ARITHMETIC_BRANCH, 1, 2),
+            Superinstruction(LET_ARITHMETIC, 3, 2),
+            Superinstruction(PRINT_RUN, 5, 3),
+        ])
+
+    def test_let_arithmetic_needs_a_variable_and_no_division(self):
+        cfg = cfg_of('LET X 1', 'ADD X 2', 'LET Y X', 'DIV Y 2', 'LET Z 3', 'MULT Z Y', 'LET W Z', 'SUB W Z')
+        self.assertEqual(find_superinstructions(cfg), [
+            Superinstruction(LET_ARITHMETIC, 4, 2),
+            Superinstruction(LET_ARITHMETIC, 6, 2),
+        ])
+
+    def test_never_crosses_blocks(self):
+        cfg = cfg_of('PRINT 1', 'L: PRINT 2', 'GOTO "L" IF 1 > 2')
+        self.assertEqual(find_superinstructions(cfg), [])
+
+    def test_fused_programs_behave_the_same(self):
+        for name, lines in PROGRAMS.items():
+            with self.subTest(name = name):
+                unfused = load(*lines)
+                program = unfused.compile()
+                output = io.StringIO()
+                with contextlib.redirect_stdout(output):
+                    pc = 0
+                    try:
+                        while pc < len(program):
+                            target = program[pc]()
+                            pc = pc + 1 if target is None else target
+                    except Exception as e:
+                        unfused.output.write(f"Error at line {pc + 1}: {str(e)}\n")
+                    unfused.output.flush()
+                self.assertEqual(run_output(load(*lines)), output.getvalue())
+
+    def test_errors_inside_superinstructions_report_their_own_line(self):
+        self.assertEqual(
+            run_output(load('LET S "a"', 'ADD S "b"', 'GOTO 1 IF S < 1')),
+            "Error at line 3: '<' not supported between instances of 'str' and 'int'\n")
+        self.assertEqual(
+            run_output(load('PRINT 1', 'PRINT 2', 'PRINT Q', 'PRINT 4')),
+            "1\n2\nError at line 3: Variable 'Q' not defined\n")
+        self.assertEqual(
+            run_output(load('LET X 1', 'DIV X 0')),
+            "Error at line 2: Division by zero\n")
+        for lines, expected, x in (
+                (['LET S "a"', 'LET X S', 'SUB X 1'],
+                 "Error at line 3: unsupported operand type(s) for -=: 'str' and 'int'\n", 'a'),
+                (['LET S "a"', 'LET X S', 'SUB X S'],
+                 "Error at line 3: unsupported operand type(s) for -=: 'str' and 'str'\n", 'a'),
+                (['LET X 1', 'ADD X Q'], "Error at line 2: Variable 'Q' not defined\n", 1),
+                (['LET X Q', 'ADD X 1'], "Error at line 1: Variable 'Q' not defined\n", None)):
+            with self.subTest(lines = lines):
+                interpreter = load(*lines)
+                self.assertEqual(run_output(interpreter), expected)
+                self.assertEqual(interpreter.variables.get('X'), x)
+
+    def test_output_failing_inside_a_print_run(self):
+        class LimitedOutput(MemoryOutput):
+            def write(self, text):
+                if len(self.getvalue()) >= 4:
+                    raise GrinLimitError(OUTPUT_LIMIT, 'Output limit of 4 characters reached')
+                super().write(text)
+
+        interpreter = load('PRINT 1', 'PRINT 2', 'PRINT 3', 'PRINT 4')
+        interpreter.output = LimitedOutput()
+        with self.assertRaises(GrinLimitError) as error:
+            interpreter.run()
+        self.assertEqual((error.exception.limit, error.exception.line), (OUTPUT_LIMIT, 3))
+        self.assertEqual(interpreter.output.getvalue(), '1\n2\n')
+
+    def test_jumping_into_a_superinstruction(self):
+        self.assertEqual(
+            run_output(load('GOTO 3', 'PRINT 1', 'PRINT 2', 'PRINT 3')),
+            "2\n3\n")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+from grin.checkpoint import (
+    Checkpoint, program_hash, take_checkpoint, restore, write_checkpoint, read_checkpoint, run_with_checkpoints
+)
+from grin.exceptions import GrinLimitError
+from grin.input import ListInput
+from grin.interpreter import GrinInterpreter, RUNNING, FINISHED
+from grin.output import MemoryOutput
+from tests.grin.test_interpreter import load
+
+SUBROUTINES = [
+    'LET I 0', 'LET T 0',
+    'LOOP: GOSUB STEP', 'GOTO "LOOP" IF I < 50',
+    'PRINT T', 'END',
+    'STEP: ADD I 1', 'GOSUB ACCUMULATE', 'RETURN',
+    'ACCUMULATE: ADD T I', 'PRINT T', 'RETURN',
+]
+
+def load_with(lines, inputs = ()) -> GrinInterpreter:
+    interpreter = load(*lines)
+    interpreter.output, interpreter.input = MemoryOutput(), ListInput(inputs)
+    return interpreter
+
+class TestCheckpoint(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'run.grins')
+
+    def test_to_bytes_and_back(self):
+        checkpoint = Checkpoint(b'x' * 32, 3, 1000, 2, [4, 7], {'A': 1, 'B': 2.5, 'C': 'text'})
+        self.assertEqual(Checkpoint.from_bytes(checkpoint.to_bytes()), checkpoint)
+
+    def test_damaged_checkpoints_are_refused(self):
+        data = Checkpoint(b'x' * 32, 3, 1000, 2, [], {'A': 1}).to_bytes()
+        for damaged in (b'', data[:10], data[:-3], data[:-3] + b'xyz', b'not a checkpoint at all'):
+            with self.subTest(damaged = damaged):
+                with self.assertRaises(ValueError):
+                    Checkpoint.from_bytes(damaged)
+
+    def test_carrying_on_from_a_checkpoint_partway_through(self):
+        whole = load_with(SUBROUTINES)
+        whole.run()
+        for steps in (3, 7, 40, 101):
+            with self.subTest(steps = steps):
+                first = load_with(SUBROUTINES)
+                first.start()
+                self.assertEqual(first.step(steps), RUNNING)
+                checkpoint = Checkpoint.from_bytes(take_checkpoint(first).to_bytes())
+                self.assertTrue(checkpoint.return_stack)
+                second = load_with(SUBROUTINES)
+                restore(second, checkpoint)
+                self.assertEqual(second.step(10 ** 6), FINISHED)
+                self.assertEqual(first.output.getvalue() + second.output.getvalue(), whole.output.getvalue())
+                self.assertEqual(second.steps, whole.steps)
+
+    def test_only_the_same_program_can_be_restored(self):
+        checkpoint = take_checkpoint(load_with(SUBROUTINES))
+        self.assertEqual(checkpoint.program, program_hash(load(*SUBROUTINES)))
+        with self.assertRaises(ValueError):
+            restore(load_with(SUBROUTINES[:-1] + ['PRINT 0']), checkpoint)
+
+    def test_programs_differing_only_in_a_condition_are_different(self):
+        lines = ['LET A 1', 'ADD A 1', 'GOTO 2 IF A < 5', 'PRINT A']
+        changed = lines[:2] + ['GOTO 2 IF A > 5'] + lines[3:]
+        self.assertNotEqual(program_hash(load(*lines)), program_hash(load(*changed)))
+        with self.assertRaises(ValueError):
+            restore(load_with(changed), take_checkpoint(load_with(lines)))
+
+    def test_restored_steps_count_towards_the_limit(self):
+        first = load_with(['L: GOTO "L"'])
+        first.start()
+        first.step(60)
+        second = load_with(['L: GOTO "L"'])
+        restore(second, take_checkpoint(first), max_steps = 100)
+        with self.assertRaises(GrinLimitError) as error:
+            second.step(1000)
+        self.assertEqual(error.exception.steps, 100)
+
+    def test_reading_and_writing_files(self):
+        self.assertIsNone(read_checkpoint(self.path))
+        checkpoint = Checkpoint(b'x' * 32, 3, 1000, 2, [], {'A': 1})
+        write_checkpoint(self.path, checkpoint)
+        self.assertEqual(read_checkpoint(self.path), checkpoint)
+        self.assertEqual(os.listdir(os.path.dirname(self.path)), ['run.grins'])
+
+    def test_running_with_checkpoints_after_being_stopped(self):
+        lines = ['INNUM A', 'LET I 0', 'ADD I 1', 'GOTO 3 IF I < A', 'INSTR B', 'PRINT I', 'PRINT B']
+        inputs = ['300', 'done']
+        first = load_with(lines, inputs)
+        first.start()
+        first.step(100, wait = True)  # ...and then the process was killed
+        write_checkpoint(self.path, take_checkpoint(first))
+
+        second = load_with(lines, inputs)
+        self.assertTrue(run_with_checkpoints(second, self.path, interval = 50))
+        self.assertEqual(second.output.getvalue(), '300\ndone\n')
+        self.assertFalse(os.path.exists(self.path))
+
+        third = load_with(lines, inputs)
+        self.assertFalse(run_with_checkpoints(third, self.path, interval = 50))
+        self.assertEqual(third.output.getvalue(), '300\ndone\n')
+
+    def test_checkpoints_are_written_as_it_runs(self):
+        interpreter = load_with(['L: GOTO "L"'])
+        with self.assertRaises(GrinLimitError):
+            run_with_checkpoints(interpreter, self.path, interval = 10, max_steps = 35)
+        self.assertFalse(os.path.exists(self.path))
+
+        written = []
+        interpreter = load_with(['L: GOTO "L"'])
+        with mock.patch('grin.checkpoint.write_checkpoint', lambda path, checkpoint: written.append(checkpoint)):
+            with self.assertRaises(GrinLimitError):
+                run_with_checkpoints(interpreter, self.path, interval = 10, max_steps = 35)
+        self.assertEqual([checkpoint.steps for checkpoint in written], [10, 20, 30])
+
+if __name__ == '__main__':
+    unittest.main()
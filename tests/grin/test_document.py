@@ -0,0 +1,135 @@
+import random
+import unittest
+from unittest import mock
+import grin.document
+from grin.cache import statement_parts
+from grin.document import GrinDocument
+from grin.generator import generate
+from grin.interpreter import GrinInterpreter
+from grin.lexing import GrinLexError
+from grin.output import MemoryOutput
+from grin.parsing import GrinParseError, parse
+from tests.grin.test_interpreter import load
+
+def texts(statement):
+    keyword, tokens = statement_parts(statement.statement)
+    return statement.label, keyword, [token.text() if token is not None else None for token in tokens]
+
+class TestDocument(unittest.TestCase):
+    def assertMatchesParse(self, document: GrinDocument, lines):
+        self.assertEqual(len(document), len(lines))
+        self.assertEqual([document[index] for index in range(len(document))], lines)
+        expected = load(*lines)
+        interpreter = GrinInterpreter()
+        document.load(interpreter)
+        self.assertEqual([texts(statement) for statement in interpreter.statements],
+                         [texts(statement) for statement in expected.statements])
+        self.assertEqual(interpreter.label_map, expected.label_map)
+        for index, tokens in enumerate(parse(lines)):
+            self.assertEqual(document.tokens(index), tokens)
+
+    def test_a_new_document(self):
+        lines = ['LET A 1', 'L: ADD A 1', 'PRINT A', 'GOTO "L" IF A < 5', '.', 'M: PRINT "after"']
+        document = GrinDocument(lines)
+        self.assertMatchesParse(document, lines)
+        self.assertEqual((document.end, document.label_map), (4, {'L': 1}))
+
+    def test_random_edits(self):
+        for seed in range(3):
+            with self.subTest(seed = seed):
+                choose = random.Random(seed)
+                lines = generate(200, seed).lines[:-1]
+                document = GrinDocument(lines)
+                for _ in range(100):
+                    start = choose.randrange(len(lines) + 1)
+                    end = min(len(lines), start + choose.randrange(4))
+                    # Lines from elsewhere in the program, so that labels
+                    # move and are duplicated, and now and then the end
+                    new = ['.' if choose.random() < 0.05 else choose.choice(lines) for _ in range(choose.randrange(4))]
+                    if not new and end - start == len(lines):
+                        continue
+                    lines[start:end] = new
+                    document.edit(start, end, new)
+                self.assertMatchesParse(document, lines)
+
+    def test_the_last_use_of_a_label_is_the_one_jumped_to(self):
+        document = GrinDocument(['L: PRINT 1', 'L: PRINT 2', 'PRINT 3'])
+        self.assertEqual(document.label_map, {'L': 1})
+        document.edit(1, 2, [])
+        self.assertEqual(document.label_map, {'L': 0})
+        document.edit(0, 1, ['PRINT 0'])
+        self.assertEqual(document.label_map, {})
+
+    def test_the_program_ends_at_the_first_dot(self):
+        document = GrinDocument(['PRINT 1', 'L: PRINT 2', '.', 'M: PRINT 3'])
+        document.edit(1, 1, ['.'])
+        self.assertEqual((document.end, document.label_map), (1, {}))
+        document.edit(1, 2, [])
+        self.assertEqual((document.end, document.label_map), (2, {'L': 1}))
+        document.edit(2, 3, [])
+        self.assertEqual((document.end, document.label_map), (3, {'L': 1, 'M': 2}))
+
+    def test_replacing_the_end_with_another_at_the_same_index(self):
+        document = GrinDocument(['PRINT 0', '.', 'A: PRINT 1', '.'])
+        document.edit(0, 2, [])
+        self.assertEqual((document.end, document.label_map), (1, {'A': 0}))
+        document.edit(0, 1, ['.'])
+        self.assertEqual((document.end, document.label_map), (0, {}))
+        self.assertMatchesParse(document, ['.', '.'])
+
+    def test_errors(self):
+        document = GrinDocument(['PRINT 1', '', 'LET A "x', '.', 'PRINT'])
+        self.assertEqual([index for index, _ in document.errors()], [1, 2])
+        self.assertIsInstance(document.error(1), GrinParseError)
+        self.assertIsInstance(document.error(2), GrinLexError)
+        self.assertIsNone(document.error(0))
+        with self.assertRaises(GrinParseError) as error:
+            document.load(GrinInterpreter())
+        self.assertEqual(error.exception.location().line(), 2)
+        document.edit(0, 0, ['PRINT 0'])  # The errors move down a line
+        self.assertEqual(document.error(2).location().line(), 3)
+        with self.assertRaises(GrinLexError):
+            document.tokens(3)
+        document.edit(2, 4, ['PRINT 2'])
+        self.assertEqual(document.errors(), [])
+        interpreter = GrinInterpreter(MemoryOutput())
+        document.load(interpreter)
+        interpreter.run()
+        self.assertEqual(interpreter.output.getvalue(), '0\n1\n2\n')
+
+    def test_edits_only_read_the_lines_they_bring_in(self):
+        lines = generate(2000, 0).lines[:-1]
+        document = GrinDocument(lines)
+        with mock.patch('grin.document._parse_line', wraps = grin.document._parse_line) as parse_line:
+            document.edit(1000, 1001, ['LET Z 1'])
+            document.edit(0, 0, ['PRINT "new"', 'PRINT "lines"'])
+            document.edit(500, 503, [])
+            document.edit(10, 10, [lines[20]])  # Already read
+        self.assertEqual(parse_line.call_count, 3)
+
+    def test_edits_only_touch_the_lines_they_change(self):
+        lines = generate(5000, 0).lines[:-1]
+        document = GrinDocument(lines)
+        self.assertGreater(len(document.label_map), 500)
+        # Neither inserting and deleting lines before every label, nor a new
+        # end before them all, moves them along one at a time
+        with mock.patch('grin.document._update', wraps = grin.document._update) as update, \
+                mock.patch('grin.document._index', wraps = grin.document._index) as index:
+            document.edit(0, 0, ['L0: PRINT 1'])
+            document.edit(1, 1, ['.'])
+            document.edit(1, 2, [])
+            document.edit(2500, 2503, [])
+        self.assertLess(update.call_count, 1000)
+        self.assertLess(index.call_count, 100)
+        lines[0:0] = ['L0: PRINT 1']
+        del lines[2500:2503]
+        self.assertMatchesParse(document, lines)
+
+    def test_lines_out_of_range(self):
+        document = GrinDocument(['PRINT 1'])
+        for start, end in ((-1, 0), (1, 0), (0, 2)):
+            with self.assertRaises(IndexError):
+                document.edit(start, end, [])
+
+if __name__ == '__main__':
+    unittest.main()
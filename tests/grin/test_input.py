@@ -0,0 +1,104 @@
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+from unittest import mock
+from grin import vm, transpiler
+from grin.input import StreamInput, FileInput, ListInput, ChainedInput
+from grin.interpreter import GrinInterpreter
+from grin.output import MemoryOutput
+from tests.grin.test_interpreter import load
+import project3
+
+class TestStreamInput(unittest.TestCase):
+    def read_all(self, data: bytes, chunk_size: int):
+        return list(StreamInput(io.BytesIO(data), chunk_size = chunk_size))
+
+    def test_lines_split_across_chunks(self):
+        data = 'first\nsecond line\n\nfourth\n'.encode()
+        for chunk_size in (1, 2, 5, 64):
+            with self.subTest(chunk_size = chunk_size):
+                self.assertEqual(self.read_all(data, chunk_size), ['first', 'second line', '', 'fourth'])
+
+    def test_characters_split_across_chunks(self):
+        self.assertEqual(self.read_all('héllo\n€\n'.encode(), 1), ['héllo', '€'])
+
+    def test_last_line_without_a_newline(self):
+        self.assertEqual(self.read_all(b'a\nb', 1), ['a', 'b'])
+
+    def test_windows_line_endings(self):
+        self.assertEqual(self.read_all(b'a\r\nb\r\n', 3), ['a', 'b'])
+
+    def test_end_of_input(self):
+        source = StreamInput(io.BytesIO(b'only\n'))
+        self.assertEqual(source.readline(), 'only')
+        with self.assertRaises(EOFError):
+            source.readline()
+        with self.assertRaises(EOFError):
+            source.readline()
+
+    def test_file_input(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'in.txt')
+            with open(path, 'w', encoding = 'utf-8') as file:
+                file.write('1\n2\n')
+            source = FileInput(path, chunk_size = 1)
+            self.assertEqual(list(source), ['1', '2'])
+            source.close()
+
+    def test_chained_input(self):
+        source = ChainedInput([ListInput(['a', 'b']), ListInput([]), StreamInput(io.BytesIO(b'c\n'))])
+        self.assertEqual(list(source), ['a', 'b', 'c'])
+        with self.assertRaises(EOFError):
+            source.readline()
+
+class TestProgramInput(unittest.TestCase):
+    def test_every_runner_reads_from_the_source(self):
+        runners = (lambda interpreter: interpreter.run(), vm.run, transpiler.run)
+        for run in runners:
+            with self.subTest(run = run):
+                interpreter = load('INNUM X', 'INSTR S', 'PRINT X', 'PRINT S', 'INNUM Y')
+                interpreter.input = ListInput(['3', 'hi', 'no'])
+                interpreter.output = MemoryOutput()
+                run(interpreter)
+                self.assertEqual(interpreter.output.getvalue(), '3.0\nhi\nError at line 5: Invalid numeric input\n')
+
+    def test_running_out_of_input(self):
+        interpreter = load('INSTR S')
+        interpreter.input = ListInput([])
+        interpreter.output = MemoryOutput()
+        interpreter.run()
+        self.assertEqual(interpreter.output.getvalue(), 'Error at line 1: EOF when reading a line\n')
+
+    def test_program_and_input_share_one_source(self):
+        source = StreamInput(io.BytesIO(b'INNUM X\nINSTR S\nPRINT X\nPRINT S\n.\n4\nhello\n'), chunk_size = 4096)
+        lines = project3.read_program(source)
+        self.assertEqual(lines[-1], '.')
+        with contextlib.redirect_stdout(io.StringIO()) as output:
+            project3.execute_program(lines, source = source)
+        self.assertEqual(output.getvalue(), '4.0\nhello\n')
+
+    def test_streaming_a_program_in_as_it_is_read(self):
+        source = StreamInput(io.BytesIO(b'INNUM X\n\nL: PRINT X\n.\n4\n'), chunk_size = 4096)
+        interpreter = GrinInterpreter(MemoryOutput(), source)
+        with mock.patch('project3.to_tokens', wraps = project3.to_tokens) as to_tokens:
+            self.assertTrue(project3.stream_program(interpreter, source))
+        self.assertEqual(to_tokens.call_count, 2)  # Once a line, and not for the blank one
+        self.assertEqual(interpreter.label_map, {'L': 1})
+        interpreter.run()
+        self.assertEqual(interpreter.output.getvalue(), '4.0\n')
+
+    def test_streaming_reads_the_whole_program_before_reporting_an_error(self):
+        source = ListInput(['PRINT 1', 'JUMP 2', 'PRINT "not lexed"', '.', 'input'])
+        with contextlib.redirect_stdout(io.StringIO()) as output:
+            with mock.patch('project3.to_tokens', wraps = project3.to_tokens) as to_tokens:
+                self.assertFalse(project3.stream_program(GrinInterpreter(), source))
+        self.assertEqual(output.getvalue(), 'Error on line 2: Unknown command: JUMP\n')
+        self.assertEqual(to_tokens.call_count, 2)
+        self.assertEqual(source.readline(), 'input')
+        with self.assertRaises(EOFError):
+            project3.stream_program(GrinInterpreter(), ListInput(['PRINT 1']))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,8 +1,17 @@
+import contextlib
+import io
+import time
 import unittest
-from typing import List
-from grin.interpreter import GrinInterpreter, create_statement
+from typing import Any, Dict, List
+from grin.exceptions import GrinLimitError, STEP_LIMIT, TIME_LIMIT, DEPTH_LIMIT
+from grin.generator import generate
+from grin.input import ListInput
+from grin.interpreter import GrinInterpreter, create_statement, RUNNING, WAITING, FINISHED
+from grin.output import MemoryOutput
+from grin.parsing import parse
+from grin.symbols import UNDEFINED, Variables
 from grin.statements import (
-    LabeledStatement, LetStatement, PrintStatement, InNumStatement, InStrStatement,
+    ProgramContext, LabeledStatement, LetStatement, PrintStatement, InNumStatement, InStrStatement,
     ArithmeticStatement, GotoStatement, GosubStatement, ReturnStatement, EndStatement
 )
 from grin.token import GrinToken, GrinTokenKind
@@ -87,5 +96,346 @@ class TestCreateStatement(unittest.TestCase):
         with self.assertRaises(ValueError):
             create_statement(tokens)
 
+def load(*lines: str) -> GrinInterpreter:
+    """Build an interpreter for the given program lines"""
+    interpreter = GrinInterpreter()
+    for tokens in parse(lines):
+        label = None
+        if len(tokens) >= 2 and tokens[1].kind() == GrinTokenKind.COLON:
+            label = tokens[0].text()
+            tokens = tokens[2:]
+        interpreter.add_statement(LabeledStatement(label, create_statement(tokens)))
+    return interpreter
+
+def run_output(interpreter: GrinInterpreter) -> str:
+    """Run the interpreter and return everything it printed"""
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        interpreter.run()
+    return output.getvalue()
+
+class TestCompiledStatements(unittest.TestCase):
+    def assertCompilesLikeExecute(self, *lines: str) -> None:
+        interpreter = load(*lines)
+        interpreter.label_map["L"] = 1
+
+        for index, labeled in enumerate(interpreter.statements):
+            executed_variables = {"A": 3, "B": 2.5, "S": "x"}
+            return_stack = [7]
+            context = ProgramContext(interpreter.label_map, len(interpreter.statements), return_stack)
+            compiled = labeled.statement.compile(index, context)
+            compiled_variables = Variables(context.symbols)
+            compiled_variables.update(executed_variables)
+
+            with contextlib.redirect_stdout(io.StringIO()) as compiled_output:
+                compiled_result = compiled()
+            with contextlib.redirect_stdout(io.StringIO()) as executed_output:
+                executed_result = labeled.statement.execute(executed_variables)
+
+            if executed_result is None:
+                self.assertIsNone(compiled_result)
+            else:
+                interpreter.current_line = index
+                interpreter.return_stack = [7]
+                interpreter.handle_control_flow(executed_result)
+                self.assertEqual(compiled_result, interpreter.current_line)
+                self.assertEqual(return_stack, interpreter.return_stack)
+
+            self.assertEqual(dict(compiled_variables), executed_variables)
+            self.assertEqual(compiled_output.getvalue(), executed_output.getvalue())
+
+    def compile(self, line: str, variables: Dict[str, Any]):
+        context = ProgramContext({}, 1, [])
+        Variables(context.symbols).update(variables)
+        return load(line).statements[0].statement.compile(0, context)
+
+    def test_variable_updates_match_execute(self):
+        self.assertCompilesLikeExecute(
+            'LET X 5', 'LET X A', 'ADD A 1', 'ADD A B', 'SUB A 1.5',
+            'MULT S 3', 'DIV A 2', 'DIV B A', 'PRINT A', 'PRINT "hi"')
+
+    def test_jumps_match_execute(self):
+        self.assertCompilesLikeExecute(
+            'GOTO 3', 'GOTO "L"', 'GOTO 2 IF A < 4', 'GOTO 2 IF A > 4',
+            'GOTO 2 IF A = 3', 'GOTO 2 IF A <> 3', 'GOTO A', 'GOTO 1 IF S = "x"',
+            'GOSUB L', 'RETURN', 'END')
+
+    def test_undefined_variables_raise_the_same_errors(self):
+        for line in ('LET X Q', 'PRINT Q', 'ADD Q 1', 'ADD A Q', 'DIV A Q', 'GOTO Q'):
+            with self.subTest(line = line):
+                statement = load(line).statements[0].statement
+                with self.assertRaises(RuntimeError) as compiled_error:
+                    self.compile(line, {"A": 1})()
+                with self.assertRaises(RuntimeError) as executed_error:
+                    statement.execute({"A": 1})
+                self.assertEqual(str(compiled_error.exception), str(executed_error.exception))
+
+    def test_errors_from_operators_are_unchanged(self):
+        statement = load('SUB S 1').statements[0].statement
+        with self.assertRaises(TypeError) as compiled_error:
+            self.compile('SUB S 1', {"S": "x"})()
+        with self.assertRaises(TypeError) as executed_error:
+            statement.execute({"S": "x"})
+        self.assertEqual(str(compiled_error.exception), str(executed_error.exception))
+
+    def test_literal_jumps_are_resolved_when_compiled(self):
+        interpreter = load('GOTO "L"', 'GOTO 3', 'L: GOSUB L', 'END')
+        program = interpreter.compile()
+        self.assertEqual([statement() for statement in program], [2, 2, 2, 4])
+        self.assertEqual(interpreter.return_stack, [3])
+
+    def test_invalid_literal_jumps_fail_only_when_taken(self):
+        interpreter = load('GOTO 9 IF 1 > 2', 'GOTO "X" IF 1 > 2', 'GOTO 9', 'GOSUB X')
+        program = interpreter.compile()
+        self.assertIsNone(program[0]())
+        self.assertIsNone(program[1]())
+        for statement, message in zip(program[2:], ['Invalid GOTO target: 9', "Label 'X' not found"]):
+            with self.assertRaises(RuntimeError) as error:
+                statement()
+            self.assertEqual(str(error.exception), message)
+
+    def test_run_uses_compiled_statements(self):
+        interpreter = load(
+            'LET I 0', 'ADD I 1', 'PRINT I', 'GOTO 2 IF I < 3', 'DIV I 0')
+        self.assertEqual(run_output(interpreter), '1\n2\n3\nError at line 5: Division by zero\n')
+
+class TestVariableSlots(unittest.TestCase):
+    def test_every_identifier_gets_a_slot_when_compiled(self):
+        interpreter = load('LET A 1', 'ADD B A', 'GOTO 1 IF C < D', 'PRINT A')
+        interpreter.compile()
+        self.assertEqual(interpreter.symbols.slots, {'A': 0, 'B': 1, 'C': 2, 'D': 3})
+        self.assertEqual(interpreter.symbols.values, [UNDEFINED] * 4)
+
+    def test_variables_view_only_shows_defined_variables(self):
+        interpreter = load('LET A 1', 'LET B A', 'PRINT C')
+        run_output(interpreter)
+        self.assertEqual(interpreter.variables, {'A': 1, 'B': 1})
+        self.assertNotIn('C', interpreter.variables)
+        with self.assertRaises(KeyError):
+            interpreter.variables['C']
+
+    def test_variables_view_writes_through_to_slots(self):
+        interpreter = load('ADD A 1', 'PRINT A')
+        interpreter.variables['A'] = 41
+        self.assertEqual(run_output(interpreter), '42\n')
+        del interpreter.variables['A']
+        self.assertEqual(len(interpreter.variables), 0)
+
+    def test_variables_can_be_replaced(self):
+        interpreter = load('PRINT A')
+        interpreter.variables = {'A': 'x'}
+        self.assertEqual(run_output(interpreter), 'x\n')
+
+    def test_undefined_variables_are_still_errors(self):
+        self.assertEqual(run_output(load('LET A B')), "Error at line 1: Variable 'B' not defined\n")
+        self.assertEqual(run_output(load('GOTO 1 IF Q < 1')), "Error at line 1: 'Q'\n")
+
+class TestLimits(unittest.TestCase):
+    def run_limited(self, interpreter: GrinInterpreter, **limits) -> str:
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            interpreter.run(**limits)
+        return output.getvalue()
+
+    def assertLimitReached(self, lines, limit, **limits) -> GrinLimitError:
+        interpreter = load(*lines)
+        with self.assertRaises(GrinLimitError) as error:
+            self.run_limited(interpreter, **limits)
+        self.assertEqual(error.exception.limit, limit)
+        self.assertEqual(interpreter.current_line + 1, error.exception.line)
+        return error.exception
+
+    def test_programs_within_their_limits_run_as_usual(self):
+        from tests.grin.test_vm import PROGRAMS
+        for name, lines in PROGRAMS.items():
+            with self.subTest(name = name):
+                self.assertEqual(
+                    self.run_limited(load(*lines), max_steps = 1000, time_limit = 60, max_depth = 10),
+                    run_output(load(*lines)))
+
+    def test_step_limit(self):
+        error = self.assertLimitReached(['LET A 1', 'GOTO 1'], STEP_LIMIT, max_steps = 5)
+        self.assertEqual((error.line, error.steps), (2, 5))
+        self.assertEqual(str(error), 'Step limit of 5 reached at line 2')
+
+    def test_ending_with_the_last_step_allowed(self):
+        for lines in (['PRINT 1', 'END'], ['LET A 1', 'PRINT A'], ['GOTO 3', 'PRINT 1', 'PRINT 2']):
+            with self.subTest(lines = lines):
+                interpreter = load(*lines)
+                self.assertEqual(self.run_limited(interpreter, max_steps = 2), run_output(load(*lines)))
+                self.assertEqual(interpreter.steps, 2)
+        error = self.assertLimitReached(['GOTO 2', 'GOTO 3', 'PRINT 1'], STEP_LIMIT, max_steps = 2)
+        self.assertEqual((error.line, error.steps), (3, 2))
+
+    def test_fused_statements_each_count_as_a_step(self):
+        lines = ['LET I 0', 'ADD I 1', 'GOTO 2 IF I < 10', 'END']
+        error = self.assertLimitReached(lines, STEP_LIMIT, max_steps = 15)
+        self.assertEqual((error.line, error.steps), (2, 15))
+        error = self.assertLimitReached(lines, STEP_LIMIT, max_steps = 21)
+        self.assertEqual((error.line, error.steps), (4, 21))
+        interpreter = load(*lines)
+        self.run_limited(interpreter, max_steps = 22)
+        self.assertEqual(interpreter.steps, 22)
+
+    def test_step_limit_spanning_several_checks(self):
+        error = self.assertLimitReached(['LET I 0', 'ADD I 1', 'GOTO 2 IF I > 0'], STEP_LIMIT, max_steps = 10000)
+        self.assertEqual(error.steps, 10000)
+
+    def test_time_limit(self):
+        error = self.assertLimitReached(['GOTO 1'], TIME_LIMIT, time_limit = 0.05)
+        self.assertEqual(error.line, 1)
+        self.assertGreater(error.steps, 0)
+
+    def test_depth_limit(self):
+        interpreter = load('PRINT "in"', 'L: GOSUB L')
+        with self.assertRaises(GrinLimitError) as error:
+            self.run_limited(interpreter, max_depth = 10)
+        self.assertEqual(error.exception.limit, DEPTH_LIMIT)
+        self.assertEqual((error.exception.line, error.exception.steps), (2, 11))
+        self.assertEqual(len(interpreter.return_stack), 10)
+
+    def test_depth_limit_spanning_several_checks(self):
+        error = self.assertLimitReached(['LET N 0', 'L: ADD N 1', 'GOSUB L'], DEPTH_LIMIT, max_depth = 3000)
+        self.assertEqual((error.line, error.steps), (3, 6002))
+
+    def test_running_at_the_depth_limit(self):
+        lines = ['GOSUB A', 'END', 'A: GOSUB B', 'RETURN', 'B: LET I 0', 'ADD I 1', 'GOTO 6 IF I < 10000',
+                 'PRINT I', 'RETURN']
+        interpreter = load(*lines)
+        self.assertEqual(self.run_limited(interpreter, max_depth = 2), run_output(load(*lines)))
+        self.assertEqual(interpreter.steps, 10007)
+
+    def test_output_is_flushed_when_a_limit_is_reached(self):
+        interpreter = load('PRINT "before"', 'GOTO 2')
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output), self.assertRaises(GrinLimitError):
+            interpreter.run(max_steps = 100)
+        self.assertEqual(output.getvalue(), 'before\n')
+
+class TestStepping(unittest.TestCase):
+    def load(self, *lines: str) -> GrinInterpreter:
+        interpreter = load(*lines)
+        interpreter.output, interpreter.input = MemoryOutput(), ListInput([])
+        return interpreter
+
+    def test_running_a_few_steps_at_a_time(self):
+        interpreter = self.load('LET I 0', 'ADD I 1', 'PRINT I', 'GOTO 2 IF I < 3')
+        interpreter.start()
+        self.assertEqual(interpreter.step(3), RUNNING)
+        self.assertEqual((interpreter.current_line, interpreter.variables['I']), (3, 1))
+        self.assertEqual(interpreter.step(3), RUNNING)
+        self.assertEqual((interpreter.current_line, interpreter.variables['I']), (3, 2))
+        self.assertEqual(interpreter.step(), FINISHED)
+        self.assertEqual(interpreter.output.getvalue(), '1\n2\n3\n')
+
+    def test_stepping_once_finished(self):
+        interpreter = self.load('LET I 0', 'ADD I 1', 'PRINT I')
+        interpreter.run()
+        self.assertEqual(interpreter.step(), FINISHED)
+        self.assertEqual((interpreter.output.getvalue(), interpreter.steps), ('1\n', 3))
+        interpreter = self.load('PRINT 1', 'GOTO 1')
+        interpreter.start(max_steps = 3)
+        with self.assertRaises(GrinLimitError):
+            interpreter.step()
+        self.assertEqual(interpreter.step(), FINISHED)
+        self.assertEqual(interpreter.output.getvalue(), '1\n1\n')
+        interpreter.start()
+        self.assertEqual(interpreter.step(1), RUNNING)
+        self.assertEqual(interpreter.output.getvalue(), '1\n1\n1\n')
+
+    def test_waiting_for_input(self):
+        interpreter = self.load('PRINT "name?"', 'INSTR N', 'INNUM A', 'PRINT N', 'PRINT A')
+        interpreter.start()
+        self.assertEqual(interpreter.step(), WAITING)
+        self.assertEqual((interpreter.current_line, interpreter.output.getvalue()), (1, 'name?\n'))
+        self.assertEqual(interpreter.step(), WAITING)  # Still waiting
+        interpreter.feed('Boo')
+        self.assertEqual(interpreter.step(), WAITING)
+        self.assertEqual(interpreter.current_line, 2)
+        interpreter.feed('3')
+        self.assertEqual(interpreter.step(), FINISHED)
+        self.assertEqual(interpreter.output.getvalue(), 'name?\nBoo\n3.0\n')
+
+    def test_sessions(self):
+        interpreter = self.load('INNUM A', 'INNUM B', 'ADD A B', 'PRINT A')
+        session = interpreter.session()
+        self.assertEqual(next(session), WAITING)
+        self.assertEqual(session.send('1'), WAITING)
+        with self.assertRaises(StopIteration):
+            session.send('2')
+        self.assertEqual(interpreter.output.getvalue(), '3.0\n')
+
+    def test_throwing_into_a_waiting_session(self):
+        interpreter = self.load('PRINT 1', 'INNUM A')
+        session = interpreter.session()
+        next(session)
+        with self.assertRaises(StopIteration):
+            session.throw(EOFError('EOF when reading a line'))
+        self.assertEqual(interpreter.output.getvalue(), '1\nError at line 2: EOF when reading a line\n')
+
+    def test_many_sessions_take_turns(self):
+        program = ['LET I 0', 'ADD I 1', 'GOTO 2 IF I < 1000', 'INNUM A', 'PRINT A']
+        interpreters = [self.load(*program) for _ in range(100)]
+        sessions = {index: interpreter.session(100) for index, interpreter in enumerate(interpreters)}
+        statuses = {index: next(session) for index, session in sessions.items()}
+        finished = {}
+        turn = 1
+        while sessions:
+            for index, session in list(sessions.items()):
+                try:
+                    statuses[index] = session.send(str(index) if statuses[index] == WAITING else None)
+                except StopIteration:
+                    finished[index] = turn
+                    del sessions[index]
+            turn += 1
+        # Each had a turn every time round, so none got ahead of the others
+        self.assertGreater(turn, 10)
+        self.assertEqual(set(finished.values()), {turn - 1})
+        self.assertEqual([interpreter.output.getvalue() for interpreter in interpreters],
+                         [f'{float(index)}\n' for index in range(100)])
+
+    def test_limits_span_every_step(self):
+        interpreter = self.load('LET A 1', 'GOTO 1')
+        interpreter.start(max_steps = 25)
+        self.assertEqual([interpreter.step(10), interpreter.step(10)], [RUNNING, RUNNING])
+        with self.assertRaises(GrinLimitError) as error:
+            interpreter.step(10)
+        self.assertEqual((error.exception.limit, error.exception.steps), (STEP_LIMIT, 25))
+
+    def test_time_spent_waiting_for_input_does_not_count(self):
+        interpreter = self.load('INNUM A', 'GOTO 1')
+        interpreter.start(time_limit = 0.05)
+        self.assertEqual(interpreter.step(), WAITING)
+        time.sleep(0.1)
+        interpreter.feed('1')
+        self.assertEqual(interpreter.step(), WAITING)
+
+class TestGeneratedPrograms(unittest.TestCase):
+    def run_generated(self, workload) -> str:
+        from grin.input import ListInput
+        from grin.output import MemoryOutput
+        interpreter = load(*workload.lines)
+        interpreter.output, interpreter.input = MemoryOutput(), ListInput(workload.inputs)
+        interpreter.run(max_steps = 1000000, max_depth = 100)
+        with self.assertRaises(EOFError):
+            interpreter.input.readline()  # It read all of its input
+        return interpreter.output.getvalue()
+
+    def test_generated_programs_run_to_the_end_without_errors(self):
+        for seed in range(5):
+            for settings in [{}, {'gosub_depth': 0}, {'gosub_depth': 6, 'loop_trips': 3}, {'io_ratio': 0.5}]:
+                with self.subTest(seed = seed, **settings):
+                    workload = generate(300, seed, **settings)
+                    self.assertEqual(len(workload.lines), 300)
+                    self.assertNotIn('Error', self.run_generated(workload))
+
+    def test_the_same_seed_generates_the_same_program(self):
+        self.assertEqual(generate(300, 4), generate(300, 4))
+        self.assertNotEqual(generate(300, 4).lines, generate(300, 5).lines)
+
+    def test_too_small_a_size_is_an_error(self):
+        with self.assertRaises(ValueError):
+            generate(10)
+
 if __name__ == '__main__':
     unittest.main()
@@ -46,6 +46,11 @@ class TestGrinLocation(unittest.TestCase):
         self.assertEqual(repr(location), 'GrinLocation(11, 7)')
 
 
+    def test_has_no_attributes_but_its_own(self):
+        with self.assertRaises(AttributeError):
+            GrinLocation(11, 7).file = 'program.grin'
+
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,108 @@
+import contextlib
+import io
+import unittest
+from unittest import mock
+from grin import vm, transpiler
+from grin.optimizer import describe, optimize
+from tests.grin.test_interpreter import load, run_output
+from tests.grin.test_vm import PROGRAMS
+
+def optimized(*lines):
+    interpreter = load(*lines)
+    report = interpreter.optimize()
+    return interpreter, report
+
+def program_text(interpreter):
+    return [describe(labeled.statement) for labeled in interpreter.statements]
+
+class TestOptimizer(unittest.TestCase):
+    def test_output_is_unchanged(self):
+        for name, lines in PROGRAMS.items():
+            with self.subTest(name = name):
+                interpreter, _ = optimized(*lines)
+                self.assertEqual(run_output(interpreter), run_output(load(*lines)))
+
+    def test_constants_are_propagated_and_folded(self):
+        interpreter, report = optimized('LET A 7', 'LET B A', 'ADD A B', 'DIV A 2', 'PRINT A')
+        self.assertEqual(program_text(interpreter), ['LET A 7', 'LET B 7', 'LET A 14', 'LET A 7.0', 'PRINT 7.0'])
+        self.assertEqual([line for line, _, _ in report.folded], [3, 4])
+        self.assertEqual([line for line, _, _ in report.propagated], [2, 5])
+
+    def test_knowledge_does_not_cross_blocks(self):
+        interpreter, _ = optimized('LET I 0', 'L: ADD I 1', 'PRINT I', 'GOTO "L" IF I < 3')
+        self.assertEqual(program_text(interpreter), ['LET I 0', 'ADD I 1', 'PRINT I', 'GOTO "L" IF I < 3'])
+
+    def test_input_forgets_a_constant(self):
+        interpreter, _ = optimized('LET A 1', 'INNUM A', 'PRINT A')
+        self.assertEqual(program_text(interpreter), ['LET A 1', 'INNUM A', 'PRINT A'])
+
+    def test_failing_arithmetic_is_not_folded(self):
+        for lines in (['LET A 1', 'DIV A 0'], ['LET S "x"', 'SUB S 1']):
+            with self.subTest(lines = lines):
+                interpreter, report = optimized(*lines)
+                self.assertEqual(report.folded, [])
+                self.assertEqual(run_output(interpreter), run_output(load(*lines)))
+
+    def test_unreachable_statements_are_removed(self):
+        interpreter, report = optimized('PRINT 1', 'GOTO 4', 'PRINT "dead"', 'PRINT 2', 'END', 'PRINT "dead"')
+        self.assertEqual(program_text(interpreter), ['PRINT 1', 'GOTO 3', 'PRINT 2', 'END'])
+        self.assertEqual(report.removed, [(3, 'PRINT "dead"'), (6, 'PRINT "dead"')])
+
+    def test_labeled_targets_are_kept(self):
+        interpreter, report = optimized('GOTO "L"', 'PRINT "dead"', 'L: PRINT 1', 'GOSUB S', 'END', 'S: RETURN')
+        self.assertEqual(interpreter.label_map, {'L': 1, 'S': 4})
+        self.assertEqual(run_output(interpreter), '1\n')
+        self.assertEqual([line for line, _ in report.removed], [2])
+
+    def test_numeric_targets_are_renumbered(self):
+        lines = ['GOTO "5"', 'PRINT "dead"', 'GOTO 7 IF 1 < 2', 'END', 'GOTO 3', 'PRINT "dead"']
+        interpreter, _ = optimized(*lines)
+        self.assertEqual(program_text(interpreter), ['GOTO "4"', 'GOTO 5 IF 1 < 2', 'END', 'GOTO 2'])
+        self.assertEqual(run_output(interpreter), '')
+
+    def test_invalid_targets_stay_invalid(self):
+        interpreter, _ = optimized('GOTO 3', 'PRINT "dead"', 'GOTO 9')
+        self.assertEqual(program_text(interpreter), ['GOTO 2', 'GOTO 9'])
+        self.assertEqual(run_output(interpreter), 'Error at line 3: Invalid GOTO target: 9\n')
+
+    def test_errors_report_original_line_numbers(self):
+        lines = ['GOTO 3', 'PRINT "dead"', 'LET A 1', 'DIV A 0']
+        for run in (lambda interpreter: interpreter.run(), vm.run, transpiler.run):
+            with self.subTest(run = run):
+                interpreter, _ = optimized(*lines)
+                output = io.StringIO()
+                with contextlib.redirect_stdout(output):
+                    run(interpreter)
+                self.assertEqual(output.getvalue(), 'Error at line 4: Division by zero\n')
+
+    def test_nothing_is_removed_when_targets_are_dynamic(self):
+        interpreter, report = optimized('LET T 3', 'GOTO T', 'PRINT "dead"', 'END', 'PRINT "dead"')
+        self.assertEqual(len(interpreter.statements), 5)
+        self.assertEqual(report.removed, [])
+
+    def test_optimizing_twice(self):
+        interpreter, _ = optimized('GOTO 3', 'PRINT "dead"', 'LET A 1', 'GOTO 6', 'PRINT "dead"', 'DIV A 0')
+        interpreter.optimize()
+        self.assertEqual(run_output(interpreter), 'Error at line 6: Division by zero\n')
+
+    def test_report(self):
+        report = optimize(load('LET A 1', 'ADD A 2', 'END', 'PRINT A').statements, {}).report
+        self.assertEqual(str(report), '\n'.join([
+            'Removed 1 unreachable statement(s)',
+            '  line 4: PRINT A',
+            'Folded 1 statement(s)',
+            '  line 2: ADD A 2 -> LET A 3',
+            'Propagated constants into 0 statement(s)',
+        ]))
+
+    def test_input_programs(self):
+        lines = ['INNUM X', 'LET Y 2', 'MULT X Y', 'PRINT X']
+        with mock.patch('builtins.input', side_effect = ['4']):
+            expected = run_output(load(*lines))
+        interpreter, _ = optimized(*lines)
+        self.assertEqual(program_text(interpreter), ['INNUM X', 'LET Y 2', 'MULT X 2', 'PRINT X'])
+        with mock.patch('builtins.input', side_effect = ['4']):
+            self.assertEqual(run_output(interpreter), expected)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+from unittest import mock
+from grin import vm, transpiler
+from grin.output import BufferedOutput, UnbufferedOutput, MemoryOutput, FileOutput
+from tests.grin.test_interpreter import load
+
+def load_with(output, *lines):
+    interpreter = load(*lines)
+    interpreter.output = output
+    return interpreter
+
+RUNNERS = {
+    'closures': lambda interpreter: interpreter.run(),
+    'vm': vm.run,
+    'transpiler': transpiler.run,
+}
+
+class TestOutputSinks(unittest.TestCase):
+    def test_buffered_output_waits_for_flush(self):
+        stream = io.StringIO()
+        output = BufferedOutput(stream)
+        output.write('a\n')
+        output.write('b\n')
+        self.assertEqual(stream.getvalue(), '')
+        output.flush()
+        self.assertEqual(stream.getvalue(), 'a\nb\n')
+
+    def test_buffered_output_flushes_when_full(self):
+        stream = io.StringIO()
+        output = BufferedOutput(stream, buffer_size = 4)
+        output.write('ab\n')
+        self.assertEqual(stream.getvalue(), '')
+        output.write('cd\n')
+        self.assertEqual(stream.getvalue(), 'ab\ncd\n')
+
+    def test_unbuffered_output_writes_immediately(self):
+        stream = io.StringIO()
+        UnbufferedOutput(stream).write('a\n')
+        self.assertEqual(stream.getvalue(), 'a\n')
+
+    def test_file_output(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'out.txt')
+            output = FileOutput(path)
+            load_with(output, 'PRINT 1', 'PRINT "two"').run()
+            output.close()
+            with open(path, encoding = 'utf-8') as file:
+                self.assertEqual(file.read(), '1\ntwo\n')
+
+class TestProgramOutput(unittest.TestCase):
+    def test_every_runner_writes_to_the_sink(self):
+        for name, run in RUNNERS.items():
+            with self.subTest(runner = name):
+                output = MemoryOutput()
+                with contextlib.redirect_stdout(io.StringIO()) as stdout:
+                    run(load_with(output, 'LET A 1.5', 'PRINT A', 'PRINT "x"', 'PRINT 2', 'DIV A 0'))
+                self.assertEqual(output.getvalue(), '1.5\nx\n2\nError at line 5: Division by zero\n')
+                self.assertEqual(stdout.getvalue(), '')
+
+    def test_output_is_flushed_before_reading_input(self):
+        for name, run in RUNNERS.items():
+            with self.subTest(runner = name):
+                stream = io.StringIO()
+                seen = []
+
+                def read_input():
+                    seen.append(stream.getvalue())
+                    return '7'
+
+                interpreter = load_with(BufferedOutput(stream), 'PRINT "prompt"', 'INNUM X', 'PRINT X')
+                with mock.patch('builtins.input', side_effect = read_input):
+                    run(interpreter)
+                self.assertEqual(seen, ['prompt\n'])
+                self.assertEqual(stream.getvalue(), 'prompt\n7.0\n')
+
+    def test_output_is_flushed_when_the_program_stops(self):
+        for lines in (['PRINT 1', 'END', 'PRINT 2'], ['PRINT 1'], ['PRINT 1', 'RETURN']):
+            with self.subTest(lines = lines):
+                stream = io.StringIO()
+                load_with(BufferedOutput(stream), *lines).run()
+                self.assertTrue(stream.getvalue().startswith('1\n'))
+
+if __name__ == '__main__':
+    unittest.main()
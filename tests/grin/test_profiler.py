@@ -0,0 +1,84 @@
+import contextlib
+import io
+import json
+import os
+import tempfile
+import unittest
+from grin.profiler import profile
+from tests.grin.test_interpreter import load, run_output
+from tests.grin.test_vm import PROGRAMS
+import project3
+
+SUBROUTINES = [
+    'LET N 0', 'GOSUB A', 'GOTO 2 IF N < 5', 'PRINT N', 'END',
+    'A: ADD N 1', 'GOSUB B', 'RETURN',
+    'B: MULT N 1', 'RETURN',
+]
+
+def profile_output(interpreter):
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        result = profile(interpreter)
+    return result, output.getvalue()
+
+class TestProfiler(unittest.TestCase):
+    def test_runs_programs_like_run(self):
+        for name, lines in PROGRAMS.items():
+            with self.subTest(name = name):
+                _, output = profile_output(load(*lines))
+                self.assertEqual(output, run_output(load(*lines)))
+
+    def test_counts_every_line(self):
+        result, _ = profile_output(load(*SUBROUTINES))
+        counts = {line.line: line.count for line in result.lines}
+        self.assertEqual(counts, {1: 1, 2: 5, 3: 5, 4: 1, 5: 1, 6: 5, 7: 5, 8: 5, 9: 5, 10: 5})
+        self.assertEqual(result.lines[1].statement, 'GOSUB A')
+        self.assertTrue(all(line.time >= 0 for line in result.lines))
+
+    def test_subroutine_times(self):
+        result, _ = profile_output(load(*SUBROUTINES))
+        subroutines = {subroutine.label: subroutine for subroutine in result.subroutines}
+        self.assertEqual({label: subroutine.calls for label, subroutine in subroutines.items()}, {'A': 5, 'B': 5})
+        a, b = subroutines['A'], subroutines['B']
+        self.assertAlmostEqual(a.inclusive, a.exclusive + b.inclusive)
+        self.assertLessEqual(a.inclusive, result.total_time)
+
+    def test_recursive_calls_are_not_counted_twice(self):
+        result, _ = profile_output(load(
+            'LET N 0', 'GOSUB R', 'END', 'R: ADD N 1', 'GOTO 7 IF N > 3', 'GOSUB R', 'RETURN'))
+        recursive = result.subroutines[0]
+        self.assertEqual(recursive.calls, 4)
+        self.assertAlmostEqual(recursive.inclusive, recursive.exclusive)
+
+    def test_report_is_sorted_by_time(self):
+        result, _ = profile_output(load(*SUBROUTINES))
+        report = result.report().splitlines()
+        self.assertIn('Subroutine', report[-3])
+        times = [float(line.split()[2]) for line in report[3:13]]
+        self.assertEqual(times, sorted(times, reverse = True))
+
+    def test_json(self):
+        result, _ = profile_output(load(*SUBROUTINES))
+        data = json.loads(json.dumps(result.to_json()))
+        self.assertEqual(len(data['lines']), 10)
+        self.assertEqual(sorted(data['lines'][0]), ['count', 'line', 'statement', 'time'])
+        self.assertEqual(sorted(subroutine['label'] for subroutine in data['subroutines']), ['A', 'B'])
+
+    def test_errors_are_reported(self):
+        result, output = profile_output(load('LET A 1', 'DIV A 0'))
+        self.assertEqual(output, 'Error at line 2: Division by zero\n')
+        self.assertEqual([line.line for line in result.lines], [1])
+
+    def test_project3_profile(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'profile.json')
+            stderr = io.StringIO()
+            with contextlib.redirect_stdout(io.StringIO()) as output, contextlib.redirect_stderr(stderr):
+                project3.execute_program(SUBROUTINES + ['.'], profile = True, profile_json = path)
+            self.assertEqual(output.getvalue(), '5\n')
+            self.assertIn('Subroutine', stderr.getvalue())
+            with open(path, encoding = 'utf-8') as file:
+                self.assertEqual(len(json.load(file)['subroutines']), 2)
+
+if __name__ == '__main__':
+    unittest.main()
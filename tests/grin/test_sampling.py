@@ -0,0 +1,44 @@
+import collections
+import unittest
+from grin.sampling import SamplingProfiler
+from tests.grin.test_interpreter import load, run_output
+
+class TestSamplingProfiler(unittest.TestCase):
+    def test_nothing_is_sampled_when_nothing_is_running(self):
+        profiler = SamplingProfiler(load('PRINT 1'))
+        profiler.start()
+        profiler.stop()
+        self.assertIsNone(profiler.sample())
+
+    def test_samples_the_running_line(self):
+        interpreter = load('LET I 0', 'ADD I 1', 'GOTO 2 IF I < 200000', 'PRINT I')
+        with SamplingProfiler(interpreter, interval = 0.001) as profiler:
+            self.assertEqual(run_output(interpreter), '200000\n')
+        self.assertGreater(sum(profiler.samples.values()), 0)
+        self.assertLessEqual(set(profiler.samples), {('line 2',), ('line 3',), ('line 4',)})
+
+    def test_samples_include_the_gosub_labels(self):
+        interpreter = load(
+            'GOSUB OUTER', 'END',
+            'OUTER: GOSUB INNER', 'RETURN',
+            'INNER: ADD I 1', 'GOTO 5 IF I < 200000', 'RETURN')
+        interpreter.variables['I'] = 0
+        with SamplingProfiler(interpreter, interval = 0.001) as profiler:
+            run_output(interpreter)
+        self.assertGreater(sum(profiler.samples.values()), 0)
+        for stack in profiler.samples:
+            self.assertEqual(stack[:2], ('OUTER', 'INNER'))
+
+    def test_samples_run_loops_with_limits(self):
+        interpreter = load('LET I 0', 'ADD I 1', 'GOTO 2 IF I < 200000')
+        with SamplingProfiler(interpreter, interval = 0.001) as profiler:
+            interpreter.run(max_steps = 10 ** 9)
+        self.assertGreater(sum(profiler.samples.values()), 0)
+
+    def test_collapsed_stacks(self):
+        profiler = SamplingProfiler(load('PRINT 1'))
+        profiler.samples = collections.Counter({('A', 'B', 'line 9'): 3, ('line 2',): 5})
+        self.assertEqual(profiler.collapsed(), 'A;B;line 9 3\nline 2 5\n')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+import random
+import sys
+import unittest
+from grin import lexing, scanner
+from grin.generator import generate
+from grin.lexing import GrinLexError
+from grin.location import GrinLocation
+from grin.token import GrinToken, GrinTokenKind
+
+def lex(to_tokens, line, line_number = 1):
+    """The tokens on a line, and the message and location of the error after
+    them if there is one"""
+    tokens = []
+    try:
+        for token in to_tokens(line, line_number):
+            tokens.append((token.kind(), token.text(), token.location(), token.value(), type(token.value())))
+    except GrinLexError as e:
+        return tokens, (str(e), e.location())
+    return tokens, None
+
+# Characters that start or end tokens, or are on either side of where the
+# fast path hands over to grin.lexing
+_CHARACTERS = 'aZx09-.:=<>" \t\x0b\x1c\x1f!#_+@é٣  '
+
+class TestScanner(unittest.TestCase):
+    def assertLexesAlike(self, line, line_number = 1):
+        self.assertEqual(lex(scanner.to_tokens, line, line_number), lex(lexing.to_tokens, line, line_number), line)
+
+    def test_generated_programs(self):
+        for seed in range(5):
+            for line_number, line in enumerate(generate(2000, seed).lines, start = 1):
+                self.assertLexesAlike(line, line_number)
+
+    def test_every_kind_of_token_and_error(self):
+        for line in [
+                '', '   ', 'LET A 1', 'L: PRINT "hello there"', 'GOTO "L" IF A <> 3', 'X <= 1 >= 2 < 3 > 4 = 5',
+                '-12 -1.5 3. 0.25 007 1.2.3 12abc A1B2', 'PRINT ""', 'PRINT "a"b"c"', 'LET let Let LET1',
+                '.', '...', 'PRINT "unterminated', 'LET A -', 'LET A -x', 'LET A - 1', 'PRINT A!', 'PRINT #',
+                '99999999999999999999999 -0 -0.0', '\tLET\x0bA\x1c1\x1f', 'PRINT "café"', 'LET é 1',
+                'LET A ٣', 'LET A 1', 'PRINT A !']:
+            with self.subTest(line = line):
+                self.assertLexesAlike(line, 7)
+
+    def test_random_lines(self):
+        choose = random.Random(0)
+        for _ in range(20000):
+            self.assertLexesAlike(''.join(choose.choice(_CHARACTERS) for _ in range(choose.randrange(12))))
+
+    def test_scanning_a_whole_program(self):
+        choose = random.Random(1)
+        lines = generate(2000, 0).lines
+        for _ in range(2000):
+            lines.insert(choose.randrange(len(lines) + 1),
+                         ''.join(choose.choice(_CHARACTERS) for _ in range(choose.randrange(12))))
+        table = scanner.scan('\n'.join(lines), 5)
+        self.assertEqual(table.line_count, len(lines))
+        for index, line in enumerate(lines):
+            self.assertEqual(lex(lambda *_: table.line_tokens(index), line), lex(lexing.to_tokens, line, index + 5), line)
+        self.assertEqual(len(table), table.first_tokens[-1])
+        self.assertEqual(
+            list(table.lines),
+            [index for index in range(len(lines)) for _ in range(table.first_tokens[index], table.first_tokens[index + 1])])
+
+    def test_a_table_only_holds_arrays(self):
+        table = scanner.scan('L: LET A 1\nPRINT "x"')
+        self.assertEqual(table.kind(3), GrinTokenKind.IDENTIFIER)
+        self.assertEqual((table.token_text(4), table.value(4), table.value(6)), ('1', 1, 'x'))
+        self.assertEqual(list(table.first_tokens), [0, 5, 7])
+        self.assertEqual(table.token(6), GrinToken(
+            kind = GrinTokenKind.LITERAL_STRING, text = '"x"', location = GrinLocation(2, 7), value = 'x'))
+
+    def test_names_are_interned_and_literals_shared(self):
+        name = ''.join(['COUNT', 'ER'])  # Not the same object as any other
+        first = list(scanner.to_tokens(f'LET {name} "echo"', 1))
+        second = list(scanner.to_tokens(f'ADD {name} "echo"', 2))
+        table = scanner.scan(f'LET {name} 2.5\nPRINT 2.5')
+        self.assertIs(first[1].text(), sys.intern(name))
+        self.assertIs(first[1].value(), first[1].text())
+        self.assertIs(table.token(1).text(), sys.intern(name))
+        self.assertIs(first[2].value(), second[2].value())
+        self.assertIs(table.token(2).value(), table.token(4).value())
+
+    def test_tokens_before_an_error_come_first(self):
+        tokens = scanner.to_tokens('LET A "never closed', 1)
+        self.assertEqual(next(iter(tokens)).text(), 'LET')
+        with self.assertRaises(GrinLexError):
+            list(tokens)
+
+if __name__ == '__main__':
+    unittest.main()
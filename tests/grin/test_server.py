@@ -0,0 +1,143 @@
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+from typing import Any, Dict, List
+from grin.exceptions import OUTPUT_LIMIT, STEP_LIMIT
+from grin.server import GrinServer, ServerLimits
+
+LOOP = ['L: PRINT 1', 'GOTO "L"', '.']
+
+class TestServer(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.server = GrinServer(workers = 2, limits = ServerLimits(time_limit = 5.0))
+        self.addCleanup(self.server.close)
+        self.responses: List[Dict[str, Any]] = []
+
+    async def send(self, response: Dict[str, Any]) -> None:
+        self.responses.append(response)
+
+    def output(self, id: Any = None) -> str:
+        return ''.join(response.get('output', '') for response in self.responses if response['id'] == id)
+
+    def result(self, id: Any = None) -> Dict[str, Any]:
+        return next(response for response in self.responses if response['id'] == id and response.get('done'))
+
+    async def test_running_a_program(self):
+        await self.server.handle_request(
+            {'id': 7, 'source': 'INSTR A\nPRINT A\nPRINT 2\n.', 'input': ['hello']}, self.send)
+        self.assertEqual(self.output(7), 'hello\n2\n')
+        self.assertEqual((self.result(7)['error'], self.result(7)['limit']), (None, None))
+        self.assertIs(self.responses[-1], self.result(7))
+
+    def test_requests_cannot_ask_for_more_than_the_server_allows(self):
+        limits = ServerLimits(max_steps = 100, time_limit = None)
+        self.assertEqual(limits.clamp({'max_steps': 1000, 'time_limit': 2}), limits._replace(time_limit = 2))
+        self.assertEqual(limits.clamp({'max_steps': 10}).max_steps, 10)
+        with self.assertRaises(ValueError):
+            limits.clamp({'max_steps': 'many'})
+
+    async def test_output_is_streamed_while_the_program_runs(self):
+        self.server.chunk_size = 100
+        await self.server.handle_request({'id': 1, 'source': LOOP, 'limits': {'max_steps': 1000}}, self.send)
+        chunks = [response for response in self.responses if 'output' in response]
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(self.output(1), '1\n' * 500)
+        self.assertEqual(self.result(1)['limit'], STEP_LIMIT)
+        self.assertIn('Step limit of 1000 reached', self.result(1)['error'])
+
+    async def test_output_limit(self):
+        await self.server.handle_request({'id': 1, 'source': LOOP, 'limits': {'max_output': 10}}, self.send)
+        self.assertEqual(self.output(1), '1\n' * 5)
+        self.assertEqual(self.result(1)['limit'], OUTPUT_LIMIT)
+        self.assertIn('at line 1', self.result(1)['error'])
+
+    async def test_program_errors(self):
+        await self.server.handle_request({'id': 1, 'source': ['PRINT Q', '.']}, self.send)
+        await self.server.handle_request({'id': 2, 'source': ['JUMP 2', '.']}, self.send)
+        await self.server.handle_request({'id': 3, 'source': 12}, self.send)
+        self.assertEqual(self.output(1), "Error at line 1: Variable 'Q' not defined\n")
+        self.assertEqual(self.result(1)['error'], None)
+        self.assertIn('Error during parsing', self.result(2)['error'])
+        self.assertEqual(self.output(2), '')
+        self.assertEqual(self.result(3)['error'], 'source must be a string or a list of lines')
+
+    async def test_a_slow_program_does_not_hold_up_a_quick_one(self):
+        self.server.limits = ServerLimits(max_steps = None, time_limit = 5.0)
+        slow = asyncio.ensure_future(self.server.handle_request(
+            {'id': 'slow', 'source': ['L: GOTO "L"', '.'], 'limits': {'time_limit': 0.5}}, self.send))
+        await self.server.handle_request({'id': 'quick', 'source': ['PRINT 1', '.']}, self.send)
+        self.assertFalse(slow.done())
+        await slow
+        self.assertEqual(self.result('slow')['limit'], 'time')
+        self.assertLess(self.responses.index(self.result('quick')), self.responses.index(self.result('slow')))
+
+    async def test_a_client_that_stops_reading_does_not_hold_up_the_others(self):
+        self.server.max_buffered = 1000
+        stalled = asyncio.Event()
+
+        async def never_returns(response: Dict[str, Any]) -> None:
+            stalled.set()
+            await asyncio.Event().wait()
+
+        stuck = asyncio.ensure_future(self.server.handle_request(
+            {'id': 'stuck', 'source': LOOP, 'limits': {'max_steps': 100_000}}, never_returns))
+        await stalled.wait()
+        # The stuck program is stopped once its output backs up, rather
+        # than waiting on a worker for its client
+        await asyncio.gather(*(self.server.handle_request({'id': n, 'source': ['PRINT 1', '.']}, self.send)
+                               for n in range(4)))
+        self.assertEqual([self.output(n) for n in range(4)], ['1\n'] * 4)
+        stuck.cancel()
+
+    async def test_a_client_that_stops_reading_cannot_take_every_worker(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'grin.sock')
+            serving = asyncio.ensure_future(self.server.serve_unix(path))
+            while not os.path.exists(path):
+                await asyncio.sleep(0.01)
+            # One client asks for more programs than there are workers, each
+            # printing without end, and never reads what they print
+            _, greedy = await asyncio.open_unix_connection(path)
+            for n in range(4):
+                greedy.write(json.dumps({'id': n, 'source': LOOP}).encode() + b'\n')
+            await greedy.drain()
+            await asyncio.sleep(0.2)
+            reader, writer = await asyncio.open_unix_connection(path)
+            writer.write(json.dumps({'id': 'other', 'source': ['PRINT 1', '.']}).encode() + b'\n')
+            writer.write_eof()
+            self.responses = await asyncio.wait_for(self.read_all(reader), 2.0)
+            writer.close()
+            greedy.close()
+            serving.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await serving
+        self.assertEqual(self.output('other'), '1\n')
+        self.assertIsNone(self.result('other')['error'])
+
+    async def read_all(self, reader: asyncio.StreamReader) -> List[Dict[str, Any]]:
+        return [json.loads(line) async for line in reader]
+
+    async def test_serving_a_unix_socket(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'grin.sock')
+            serving = asyncio.ensure_future(self.server.serve_unix(path))
+            while not os.path.exists(path):
+                await asyncio.sleep(0.01)
+            reader, writer = await asyncio.open_unix_connection(path)
+            writer.write(b'not json\n')
+            for n in range(3):
+                writer.write(json.dumps({'id': n, 'source': [f'PRINT {n}', '.']}).encode() + b'\n')
+            writer.write_eof()
+            self.responses = [json.loads(line) async for line in reader]
+            writer.close()
+            serving.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await serving
+            self.assertFalse(os.path.exists(path))
+        self.assertTrue(self.result(None)['error'].startswith('Invalid JSON'))
+        self.assertEqual([self.output(n) for n in range(3)], ['0\n', '1\n', '2\n'])
+
+if __name__ == '__main__':
+    unittest.main()
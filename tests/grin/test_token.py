@@ -8,6 +8,7 @@
 # WHAT YOU NEED TO DO: Nothing, unless you make changes to grin.token
 # (which shouldn't be necessary).
 
+from grin.location import GrinLocation
 from grin.token import GrinTokenKind, GrinToken
 import unittest
 
@@ -20,5 +21,13 @@ class GrinTokenKindTest(unittest.TestCase):
 
 
 
+class GrinTokenTest(unittest.TestCase):
+    def test_has_no_attributes_but_its_own(self):
+        token = GrinToken(kind = GrinTokenKind.IDENTIFIER, text = 'A', location = GrinLocation(1, 1), value = 'A')
+        with self.assertRaises(AttributeError):
+            token.note = 'a variable'
+
+
+
 if __name__ == '__main__':
     unittest.main()
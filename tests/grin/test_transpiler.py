@@ -0,0 +1,65 @@
+import contextlib
+import io
+import unittest
+from unittest import mock
+from grin import transpiler
+from tests.grin.test_interpreter import load, run_output
+from tests.grin.test_vm import PROGRAMS
+
+class TestTranspiler(unittest.TestCase):
+    def assertSameOutput(self, lines, inputs = (), translated = True):
+        with mock.patch('builtins.input', side_effect = list(inputs)):
+            expected = run_output(load(*lines))
+
+        interpreter = load(*lines)
+        output = io.StringIO()
+        with mock.patch('builtins.input', side_effect = list(inputs)), \
+                contextlib.redirect_stdout(output):
+            self.assertEqual(transpiler.run(interpreter), translated)
+
+        self.assertEqual(output.getvalue(), expected)
+
+    def test_output_is_identical_to_the_interpreter(self):
+        for name, lines in PROGRAMS.items():
+            with self.subTest(name = name):
+                self.assertSameOutput(lines, translated = name not in ('dynamic targets', 'float target'))
+
+    def test_input_statements(self):
+        self.assertSameOutput(['INNUM X', 'INSTR S', 'PRINT X', 'PRINT S', 'INNUM Y'], ['3', 'hi', 'no'])
+
+    def test_errors_report_the_grin_line(self):
+        lines = ['LET A 1', 'GOSUB S', 'END', 'S: ADD A 1', 'PRINT A', 'DIV A 0', 'RETURN']
+        interpreter = load(*lines)
+        with contextlib.redirect_stdout(io.StringIO()) as output:
+            self.assertTrue(transpiler.run(interpreter))
+        self.assertEqual(output.getvalue(), '2\nError at line 6: Division by zero\n')
+        self.assertEqual(interpreter.current_line, 5)
+
+    def test_variables_are_written_back(self):
+        interpreter = load('LET I 0', 'ADD I 1', 'GOTO 2 IF I < 10', 'LET J I', 'END')
+        interpreter.variables['K'] = 'kept'
+        self.assertTrue(transpiler.run(interpreter))
+        self.assertEqual(interpreter.variables, {'I': 10, 'J': 10, 'K': 'kept'})
+        self.assertEqual(interpreter.current_line, 5)
+
+    def test_dynamic_goto_cannot_be_translated(self):
+        with self.assertRaises(transpiler.TranslationError):
+            transpiler.translate(load('LET T 1', 'GOTO T').statements, {})
+
+    def test_names_python_would_reject_or_merge(self):
+        # A² isn't a Python identifier, and Python would normalize ﬁ to fi
+        self.assertSameOutput(['LET A² 3', 'LET ﬁ 1', 'LET fi 2', 'PRINT ﬁ', 'PRINT fi', 'PRINT A²'])
+
+    def test_source_python_cannot_compile_falls_back(self):
+        broken = transpiler.Translation('def _program(:\n', [None])
+        with mock.patch('grin.transpiler.translate', return_value = broken):
+            with self.assertRaises(transpiler.TranslationError):
+                transpiler.compile_program([], {})
+            self.assertSameOutput(['LET A 1', 'PRINT A'], translated = False)
+
+    def test_large_programs_dispatch_through_a_tree(self):
+        lines = ['LET I 0'] + [f'GOTO {n + 2}' for n in range(1, 200)] + ['ADD I 1', 'GOTO 2 IF I < 3', 'PRINT I']
+        self.assertSameOutput(lines)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import contextlib
+import io
+import unittest
+from unittest import mock
+from grin import vm
+from tests.grin.test_interpreter import load, run_output
+
+PROGRAMS = {
+    "counting": ['LET I 0', 'ADD I 1', 'PRINT I', 'GOTO 2 IF I < 5', 'END'],
+    "arithmetic": [
+        'LET A 7', 'LET B 2', 'ADD A B', 'SUB A 1.5', 'MULT B A', 'DIV B 4',
+        'DIV A B', 'PRINT A', 'PRINT B', 'LET S "ab"', 'MULT S 3', 'ADD S "c"', 'PRINT S'],
+    "subroutines": [
+        'LET N 0', 'GOSUB TEN', 'GOSUB TEN', 'PRINT N', 'END',
+        'TEN: ADD N 10', 'GOTO 9 IF N > 15', 'RETURN', 'PRINT "deep"', 'RETURN'],
+    "dynamic targets": [
+        'LET T 4', 'GOTO T', 'PRINT "skipped"', 'LET L "X"', 'GOTO L', 'PRINT "skipped"',
+        'X: PRINT "landed"', 'LET T 11', 'GOTO T IF T = 11', 'PRINT "skipped"', 'PRINT "done"'],
+    "comparisons": [
+        'LET A 1', 'GOTO 4 IF A <> 2', 'PRINT "ne"', 'GOTO 6 IF 1 < A', 'PRINT "lt"',
+        'GOTO 7 IF A = 1.0', 'PRINT "eq"', 'GOTO 9 IF A >= 0', 'PRINT "ge"'],
+    "end past last line": ['PRINT 1', 'GOTO 4', 'PRINT 2'],
+    "undefined variable": ['LET A 1', 'ADD A B'],
+    "undefined comparison": ['GOTO 1 IF Q < 1'],
+    "division by zero": ['LET A 1', 'PRINT A', 'DIV A 0', 'PRINT A'],
+    "type error": ['LET S "x"', 'SUB S 1'],
+    "invalid target": ['PRINT 1', 'GOTO 9'],
+    "missing label": ['GOTO "NOWHERE"'],
+    "missing subroutine": ['GOSUB NOWHERE'],
+    "return without gosub": ['RETURN'],
+    "float target": ['LET T 1.5', 'GOTO T'],
+}
+
+class TestVM(unittest.TestCase):
+    def assertSameOutput(self, lines, inputs = ()):
+        with mock.patch('builtins.input', side_effect = list(inputs)):
+            expected = run_output(load(*lines))
+
+        interpreter = load(*lines)
+        output = io.StringIO()
+        with mock.patch('builtins.input', side_effect = list(inputs)), \
+                contextlib.redirect_stdout(output):
+            vm.run(interpreter)
+
+        self.assertEqual(output.getvalue(), expected)
+
+    def test_output_is_identical_to_the_interpreter(self):
+        for name, lines in PROGRAMS.items():
+            with self.subTest(name = name):
+                self.assertSameOutput(lines)
+
+    def test_input_statements(self):
+        self.assertSameOutput(['INNUM X', 'INSTR S', 'PRINT X', 'PRINT S', 'INNUM Y'], ['3', 'hi', 'no'])
+
+    def test_instructions_are_tuple_packed(self):
+        bytecode = vm.compile_program(load('LET I 0', 'ADD I 1', 'GOTO 2 IF I < 3').statements, {})
+        self.assertEqual(bytecode.code[0], (vm.LET_CONST, 0, 0, None))
+        self.assertEqual(bytecode.code[2][0], vm.JUMP_IF_VAR_CONST)
+        self.assertEqual(bytecode.code[2][3], 1)
+
+    def test_final_state_is_written_back(self):
+        interpreter = load('LET I 0', 'ADD I 1', 'GOTO 2 IF I < 3')
+        vm.run(interpreter)
+        self.assertEqual(interpreter.variables, {'I': 3})
+        self.assertEqual(interpreter.current_line, 3)
+
+if __name__ == '__main__':
+    unittest.main()